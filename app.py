@@ -36,10 +36,15 @@ db.init_app(app)
 
 # Import models here before creating tables
 import models  # noqa: F401
+# Keeps the full-text search documents in sync with model writes
+import search  # noqa: F401
 
 with app.app_context():
     # Create all tables
     db.create_all()
+    # create_all skips existing tables; migrations bring older schemas up to date.
+    import migrations
+    migrations.upgrade(db.engine)
 
     # Seed the public catalog only when it is empty. These records are useful
     # out of the box and can later be replaced by administrator-managed data.
@@ -52,6 +57,14 @@ with app.app_context():
         HealthService.seed_defaults()
     db.session.commit()
 
+# Time DB, template, AI and JSON work per request (Server-Timing header)
+import profiling
+profiling.init_app(app, db)
+
+# Prometheus request, pool and provider metrics (served at /metrics)
+import metrics
+metrics.init_app(app, db)
+
 # Register blueprints
 from routes.main import main_bp
 from routes.climate import climate_bp
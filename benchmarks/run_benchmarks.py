@@ -0,0 +1,333 @@
+"""End-to-end load test for the CommuniGrow blueprints.
+
+Drives a weighted mix of realistic requests through the Flask test client
+from several threads, with the AI provider replaced by the offline stub and
+Stripe answered by a local fake. Reports throughput, p50/p95/p99 latency and
+SQL statements per request for every scenario, and compares the run against
+``benchmarks/baseline.json``.
+
+    python benchmarks/run_benchmarks.py                      # run and compare
+    python benchmarks/run_benchmarks.py --save-baseline      # refresh the baseline
+    python benchmarks/run_benchmarks.py --requests 5000 --threads 16
+
+Every run uses a fresh SQLite database and cache in a temporary directory,
+so results do not depend on local data.
+"""
+import argparse
+import contextvars
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+WORKDIR = tempfile.mkdtemp(prefix="communigrow-bench-")
+
+# The app reads its configuration at import time, so the benchmark
+# environment has to be in place before it is imported.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(WORKDIR, "shared_cache.db"))
+os.environ.setdefault("AI_PROVIDERS", "stub")
+os.environ.setdefault("AI_STUB_LATENCY_MS", "50")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_benchmark")
+sys.path.insert(0, ROOT)
+
+import logging  # noqa: E402
+
+import stripe  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import FoodListing, HealthService  # noqa: E402
+import stub_provider  # noqa: E402
+
+
+CITIES = [
+    ("New Delhi", 28.6139, 77.2090), ("Mumbai", 19.0760, 72.8777),
+    ("Bengaluru", 12.9716, 77.5946), ("Chennai", 13.0827, 80.2707),
+    ("Kolkata", 22.5726, 88.3639), ("Hyderabad", 17.3850, 78.4867),
+    ("Pune", 18.5204, 73.8567), ("Jaipur", 26.9124, 75.7873),
+    ("Lucknow", 26.8467, 80.9462), ("Patna", 25.5941, 85.1376),
+]
+CHAT_MESSAGES = [
+    "How much water should I drink in hot weather?",
+    "I have a mild headache and feel tired",
+    "What are good sources of iron for pregnant women?",
+    "How can I sleep better?",
+    "Tips for managing stress at work",
+]
+SEARCH_QUERIES = ["fresh veg", "bench produce 12", "python", "farm", "kubernetes docker", "seasonal"]
+FACILITY_TYPES = ["hospital", "clinic", "pharmacy", "emergency"]
+
+
+class _FakeStripe(BaseHTTPRequestHandler):
+    """Answers POST /v1/checkout/sessions like Stripe's test mode."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        session_id = f"cs_test_{threading.get_ident()}_{time.monotonic_ns()}"
+        body = json.dumps({
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.com/c/pay/{session_id}",
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_stripe():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeStripe)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stripe.api_base = f"http://127.0.0.1:{server.server_address[1]}"
+    return server
+
+
+def seed(rng: random.Random, listings: int, facilities: int) -> list[int]:
+    """Add marketplace listings and facilities spread around Indian cities."""
+    with app.app_context():
+        for index in range(listings):
+            city = rng.choice(CITIES)[0]
+            db.session.add(FoodListing(
+                title=f"Bench produce {index}",
+                description="Fresh seasonal vegetables from a local farm.",
+                category=rng.choice(["marketplace", "marketplace", "sharing", "surplus"]),
+                price=round(rng.uniform(1, 50), 2),
+                quantity=f"{rng.randint(1, 20)} kg",
+                location=city,
+                contact_info="bench@example.com",
+            ))
+        for index in range(facilities):
+            _, lat, lng = rng.choice(CITIES)
+            db.session.add(HealthService(
+                name=f"Bench facility {index}",
+                service_type=rng.choice(FACILITY_TYPES),
+                address="Benchmark Road",
+                latitude=lat + rng.uniform(-0.5, 0.5),
+                longitude=lng + rng.uniform(-0.5, 0.5),
+                contact_info="000",
+                hours="24/7",
+                services_offered="General medical services",
+            ))
+        db.session.commit()
+        return [listing.id for listing in FoodListing.query.filter_by(
+            category="marketplace", is_available=True
+        ).with_entities(FoodListing.id)]
+
+
+def build_scenarios(listing_ids: list[int]):
+    """Return (name, weight, request function) for the traffic mix."""
+    def marketplace(client, rng):
+        return client.get("/food/marketplace")
+
+    def nearby_facilities(client, rng):
+        _, lat, lng = rng.choice(CITIES)
+        return client.get("/health/api/nearby-facilities", query_string={
+            "lat": lat, "lng": lng, "radius": rng.choice([5, 10, 25]),
+            "type": rng.choice(["all"] + FACILITY_TYPES),
+        })
+
+    def weather(client, rng):
+        return client.get(f"/climate/api/weather/{rng.choice(CITIES)[0]}")
+
+    def health_chat(client, rng):
+        return client.post("/health/api/health-chat", json={
+            "message": rng.choice(CHAT_MESSAGES), "type": "general",
+        })
+
+    def post_listing(client, rng):
+        return client.post("/food/post-listing", json={
+            "title": "Bench tomatoes", "description": "Ripe tomatoes",
+            "category": "sharing", "quantity": "5 kg",
+            "location": rng.choice(CITIES)[0], "contact_info": "bench@example.com",
+        })
+
+    def search(client, rng):
+        return client.get("/api/search", query_string={
+            "q": rng.choice(SEARCH_QUERIES), "type": rng.choice(["", "food", "course"]),
+        })
+
+    def checkout(client, rng):
+        return client.post("/payments/create-checkout-session", json={
+            "item_id": rng.choice(listing_ids),
+        })
+
+    return [
+        ("marketplace", 30, marketplace),
+        ("nearby_facilities", 25, nearby_facilities),
+        ("weather", 20, weather),
+        ("health_chat", 15, health_chat),
+        ("search", 10, search),
+        ("post_listing", 5, post_listing),
+        ("checkout", 5, checkout),
+    ]
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def run(scenarios, total_requests: int, threads: int, seed_value: int) -> dict:
+    # A context variable rather than a thread-local: async views run in a
+    # helper thread that inherits the request's context.
+    query_count = contextvars.ContextVar("query_count", default=None)
+    with app.app_context():
+        engine = db.engine
+
+    def count_query(*args):
+        counter = query_count.get()
+        if counter is not None:
+            counter[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count_query)
+
+    names = [name for name, _, _ in scenarios]
+    weights = [weight for _, weight, _ in scenarios]
+    handlers = {name: handler for name, _, handler in scenarios}
+    results = {name: {"latencies": [], "queries": [], "errors": 0} for name in names}
+    results_lock = threading.Lock()
+    remaining = [total_requests]
+
+    def worker(worker_index):
+        rng = random.Random(seed_value * 1000 + worker_index)
+        client = app.test_client()
+        while True:
+            with results_lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            name = rng.choices(names, weights)[0]
+            counter = [0]
+            query_count.set(counter)
+            started = time.perf_counter()
+            response = handlers[name](client, rng)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                entry = results[name]
+                entry["latencies"].append(elapsed)
+                entry["queries"].append(counter[0])
+                if response.status_code >= 400:
+                    entry["errors"] += 1
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    duration = time.perf_counter() - started
+    event.remove(engine, "before_cursor_execute", count_query)
+
+    endpoints = {}
+    for name, entry in results.items():
+        latencies = entry["latencies"]
+        if not latencies:
+            continue
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": entry["errors"],
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "queries_per_request": round(sum(entry["queries"]) / len(latencies), 2),
+        }
+    return {
+        "config": {
+            "requests": total_requests,
+            "threads": threads,
+            "seed": seed_value,
+            "stub_latency_ms": stub_provider.STUB_LATENCY_MS,
+        },
+        "duration_s": round(duration, 2),
+        "throughput_rps": round(total_requests / duration, 1),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    """Print a results table and return the regressions against ``baseline``."""
+    regressions = []
+    base_endpoints = (baseline or {}).get("endpoints", {})
+    print(f"\n{report['throughput_rps']} req/s over {report['duration_s']}s "
+          f"({report['config']['requests']} requests, {report['config']['threads']} threads)")
+    header = f"{'endpoint':<20}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in report["endpoints"].items():
+        line = (f"{name:<20}{stats['requests']:>6}{stats['errors']:>6}{stats['p50_ms']:>10}"
+                f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['queries_per_request']:>9}")
+        base = base_endpoints.get(name)
+        if base:
+            delta = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0
+            line += f"   p95 {delta:+.0%}"
+            if delta > tolerance:
+                regressions.append(f"{name}: p95 {base['p95_ms']} -> {stats['p95_ms']} ms")
+            if stats["queries_per_request"] > base["queries_per_request"] + 0.5:
+                regressions.append(
+                    f"{name}: queries/request {base['queries_per_request']} -> "
+                    f"{stats['queries_per_request']}"
+                )
+        print(line)
+    if baseline:
+        print(f"\nBaseline throughput: {baseline['throughput_rps']} req/s")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--listings", type=int, default=300, help="marketplace listings to seed")
+    parser.add_argument("--facilities", type=int, default=2000, help="health facilities to seed")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p95 slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--output", help="also write the results JSON here")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    stub_provider.reseed(args.seed)
+    start_fake_stripe()
+    rng = random.Random(args.seed)
+    listing_ids = seed(rng, args.listings, args.facilities)
+    report = run(build_scenarios(listing_ids), args.requests, args.threads, args.seed)
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH) and not args.save_baseline:
+        with open(BASELINE_PATH) as handle:
+            baseline = json.load(handle)
+    regressions = print_report(report, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as handle:
+            json.dump(report, handle, indent=2)
+            handle.write("\n")
+        print(f"\nBaseline written to {os.path.relpath(BASELINE_PATH, ROOT)}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Per-module concurrency limits (bulkheads) for AI-backed endpoints.
+
+Every AI endpoint shares the same workers, so a burst of career-plan requests
+could otherwise hold every thread and starve health chat. Each endpoint class
+(health, food, skills, climate) gets its own pool of concurrent slots and a
+bounded wait queue. When the queue is full, or a queued request waits too
+long, the endpoint answers 503 with Retry-After right away instead of adding
+latency for everyone. Limits apply per worker process.
+
+Pool sizes can be overridden with AI_BULKHEAD_<CLASS>_CONCURRENCY and
+AI_BULKHEAD_<CLASS>_QUEUE, e.g. AI_BULKHEAD_SKILLS_CONCURRENCY=4.
+"""
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+from flask import current_app, jsonify
+
+
+BULKHEAD_LIMITS = {
+    # name: (concurrent requests, queued requests)
+    "health": (16, 32),
+    "food": (8, 16),
+    "skills": (8, 16),
+    "climate": (8, 16),
+}
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get("AI_BULKHEAD_QUEUE_TIMEOUT_SECONDS", 10))
+RETRY_AFTER_SECONDS = int(os.environ.get("AI_BULKHEAD_RETRY_AFTER_SECONDS", 5))
+
+
+class BulkheadFull(Exception):
+    """Raised when a request cannot get a slot in its bulkhead."""
+
+
+class Bulkhead:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; raise ``BulkheadFull``."""
+        with self._cond:
+            if self.active < self.max_concurrent and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise BulkheadFull(f"{self.name} queue is full")
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        raise BulkheadFull(f"{self.name} queue wait timed out")
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active": self.active,
+                "queued": self.waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "peak_queued": self.peak_waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+
+_bulkheads: dict[str, Bulkhead] = {}
+_bulkheads_lock = threading.Lock()
+
+
+def get_bulkhead(name: str) -> Bulkhead:
+    with _bulkheads_lock:
+        bulkhead = _bulkheads.get(name)
+        if bulkhead is None:
+            concurrent, queue = BULKHEAD_LIMITS.get(name, (8, 16))
+            prefix = f"AI_BULKHEAD_{name.upper()}"
+            bulkhead = _bulkheads[name] = Bulkhead(
+                name,
+                int(os.environ.get(f"{prefix}_CONCURRENCY", concurrent)),
+                int(os.environ.get(f"{prefix}_QUEUE", queue)),
+            )
+        return bulkhead
+
+
+def _busy_response(exc: BulkheadFull):
+    logging.warning("Shedding AI request: %s", exc)
+    response = jsonify({
+        'success': False,
+        'error': 'Service is busy, please try again shortly'
+    })
+    response.status_code = 503
+    response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response
+
+
+def _finish(bulkhead: Bulkhead, rv):
+    """Release the slot now, or when a streamed response has been sent."""
+    try:
+        response = current_app.make_response(rv)
+    except BaseException:
+        bulkhead.release()
+        raise
+    if response.is_streamed:
+        response.call_on_close(bulkhead.release)
+    else:
+        bulkhead.release()
+    return response
+
+
+def bulkhead(name: str):
+    """Decorator that runs a view inside the named bulkhead.
+
+    Works for sync and async views. Streaming responses keep their slot until
+    the stream is closed.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                pool = get_bulkhead(name)
+                try:
+                    pool.acquire()
+                except BulkheadFull as exc:
+                    return _busy_response(exc)
+                try:
+                    rv = await view(*args, **kwargs)
+                except BaseException:
+                    pool.release()
+                    raise
+                return _finish(pool, rv)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            pool = get_bulkhead(name)
+            try:
+                pool.acquire()
+            except BulkheadFull as exc:
+                return _busy_response(exc)
+            try:
+                rv = view(*args, **kwargs)
+            except BaseException:
+                pool.release()
+                raise
+            return _finish(pool, rv)
+        return wrapper
+    return decorator
+
+
+def get_bulkhead_stats() -> dict:
+    """Return slot usage, queue depth and rejections for every bulkhead."""
+    for name in BULKHEAD_LIMITS:
+        get_bulkhead(name)
+    with _bulkheads_lock:
+        bulkheads = list(_bulkheads.values())
+    return {bulkhead.name: bulkhead.stats() for bulkhead in bulkheads}
@@ -0,0 +1,354 @@
+"""Shared, persistent key/value cache backed by SQLite.
+
+Gunicorn workers are separate processes, so a module-level dict is warmed once
+per worker and lost on every restart. This store keeps entries in one SQLite
+file under ``instance/`` that every worker on the host reads and writes. Each
+namespace has its own TTLs, an LRU size limit and hit/miss counters. A short
+event log lets one worker notify the others (see ``live_updates.py``).
+
+Reads never take the write lock themselves: each worker keeps hit/miss counts
+and access times in memory and writes them in one transaction at most every
+``ACCESS_FLUSH_SECONDS``, or with its next ``set``.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "instance", "shared_cache.db"
+)
+DEFAULT_MAX_ENTRIES = 5000
+EVENT_RETENTION_SECONDS = 300
+ACCESS_FLUSH_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS ix_cache_entries_lru
+    ON cache_entries (namespace, last_accessed);
+CREATE TABLE IF NOT EXISTS cache_leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    namespace TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    writes INTEGER NOT NULL DEFAULT 0,
+    evictions INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cache_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def make_key(*parts) -> str:
+    """Hash arbitrary JSON-serializable parts into a fixed-length cache key."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SharedCache:
+    """Namespaced TTL + LRU cache stored in a SQLite file.
+
+    Cache failures are never fatal: any SQLite error is logged and treated as
+    a miss so the caller falls through to the real work.
+    """
+
+    def __init__(self, path: str | None = None, max_entries: int | None = None):
+        self.path = path or os.environ.get("SHARED_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries or int(
+            os.environ.get("SHARED_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        )
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending_counts = Counter()
+        self._pending_access: dict[tuple[str, str], float] = {}
+        self._next_flush = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def _count(self, conn, namespace: str, column: str, amount: int = 1):
+        conn.execute(
+            f"INSERT INTO cache_stats (namespace, {column}) VALUES (?, ?) "
+            f"ON CONFLICT(namespace) DO UPDATE SET {column} = {column} + excluded.{column}",
+            (namespace, amount),
+        )
+
+    def _note(self, namespace: str, key: str | None, outcome: str | None, now: float):
+        """Queue an access time and/or a counter, flushing when the interval is up."""
+        with self._pending_lock:
+            if outcome is not None:
+                self._pending_counts[(namespace, outcome)] += 1
+            if key is not None:
+                self._pending_access[(namespace, key)] = now
+            due = time.monotonic() >= self._next_flush
+        if due:
+            self.flush()
+
+    def _take_pending(self):
+        with self._pending_lock:
+            counts, self._pending_counts = self._pending_counts, Counter()
+            access, self._pending_access = self._pending_access, {}
+            self._next_flush = time.monotonic() + ACCESS_FLUSH_SECONDS
+        return counts, access
+
+    def _restore_pending(self, counts: Counter, access: dict):
+        with self._pending_lock:
+            self._pending_counts.update(counts)
+            for entry, accessed in access.items():
+                self._pending_access[entry] = max(accessed, self._pending_access.get(entry, 0.0))
+
+    def _write_pending(self, conn, counts: Counter, access: dict):
+        if access:
+            conn.executemany(
+                "UPDATE cache_entries SET last_accessed = MAX(last_accessed, ?) "
+                "WHERE namespace = ? AND key = ?",
+                [(accessed, namespace, key) for (namespace, key), accessed in access.items()],
+            )
+        for (namespace, column), amount in counts.items():
+            self._count(conn, namespace, column, amount)
+
+    def flush(self):
+        """Write this worker's queued access times and counters."""
+        counts, access = self._take_pending()
+        if not counts and not access:
+            return
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_pending(conn, counts, access)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as exc:
+            logging.warning("Shared cache flush failed: %s", exc)
+            self._restore_pending(counts, access)
+
+    def get(self, namespace: str, key: str, record: bool = True):
+        """Return the cached value, or ``None`` when missing or expired.
+
+        ``record=False`` skips the hit/miss counters for internal re-checks.
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if record:
+                    self._note(namespace, None, "misses", now)
+                return None
+            value = json.loads(row[0])
+            self._note(namespace, key, "hits" if record else None, now)
+            return value
+        except (sqlite3.Error, ValueError) as exc:
+            logging.warning("Shared cache read failed for %s: %s", namespace, exc)
+            return None
+
+    def set(self, namespace: str, key: str, value, ttl: float, max_entries: int | None = None):
+        """Store ``value`` for ``ttl`` seconds and enforce the LRU size limit.
+
+        ``max_entries`` caps this namespace below the global limit.
+        """
+        if ttl <= 0:
+            return
+        now = time.time()
+        # The write lock is taken anyway, so queued reads go in the same transaction.
+        counts, access = self._take_pending()
+        try:
+            payload = json.dumps(value, default=str)
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_pending(conn, counts, access)
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries "
+                    "(namespace, key, value, expires_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                    (namespace, key, payload, now + ttl, now),
+                )
+                self._count(conn, namespace, "writes")
+                self._evict(conn, namespace, now, max_entries)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, TypeError, ValueError) as exc:
+            logging.warning("Shared cache write failed for %s: %s", namespace, exc)
+            self._restore_pending(counts, access)
+
+    def _evict(self, conn, namespace: str, now: float, max_entries: int | None = None):
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+            (namespace, now),
+        )
+        (size,) = conn.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        overflow = size - min(max_entries or self.max_entries, self.max_entries)
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE rowid IN ("
+                "SELECT rowid FROM cache_entries WHERE namespace = ? "
+                "ORDER BY last_accessed LIMIT ?)",
+                (namespace, overflow),
+            )
+            self._count(conn, namespace, "evictions", overflow)
+
+    def delete(self, namespace: str, key: str):
+        try:
+            self._connect().execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+        except sqlite3.Error as exc:
+            logging.warning("Shared cache delete failed for %s: %s", namespace, exc)
+
+    def clear(self, namespace: str | None = None):
+        with self._pending_lock:
+            for pending in (self._pending_counts, self._pending_access):
+                for entry in [entry for entry in pending if namespace in (None, entry[0])]:
+                    del pending[entry]
+        try:
+            conn = self._connect()
+            if namespace is None:
+                conn.execute("DELETE FROM cache_entries")
+                conn.execute("DELETE FROM cache_stats")
+            else:
+                conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+                conn.execute("DELETE FROM cache_stats WHERE namespace = ?", (namespace,))
+        except sqlite3.Error as exc:
+            logging.warning("Shared cache clear failed: %s", exc)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take the named lease unless another owner holds an unexpired one.
+
+        Leases are the cross-worker lock table: the row survives only until
+        ``expires_at``, so a crashed holder can never block others for good.
+        On SQLite errors the lease is granted so callers degrade to
+        uncoordinated work rather than stalling.
+        """
+        now = time.time()
+        try:
+            cursor = self._connect().execute(
+                "INSERT INTO cache_leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, "
+                "expires_at = excluded.expires_at "
+                "WHERE cache_leases.expires_at <= ? OR cache_leases.owner = excluded.owner",
+                (name, owner, now + ttl, now),
+            )
+            return cursor.rowcount > 0
+        except sqlite3.Error as exc:
+            logging.warning("Shared lease acquire failed for %s: %s", name, exc)
+            return True
+
+    def release_lease(self, name: str, owner: str):
+        try:
+            self._connect().execute(
+                "DELETE FROM cache_leases WHERE name = ? AND owner = ?", (name, owner)
+            )
+        except sqlite3.Error as exc:
+            logging.warning("Shared lease release failed for %s: %s", name, exc)
+
+    def publish(self, channel: str, payload):
+        """Append ``payload`` to the event log and drop events past retention."""
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO cache_events (channel, payload, created_at) VALUES (?, ?, ?)",
+                (channel, json.dumps(payload, default=str), now),
+            )
+            conn.execute("DELETE FROM cache_events WHERE created_at < ?", (now - EVENT_RETENTION_SECONDS,))
+        except (sqlite3.Error, TypeError, ValueError) as exc:
+            logging.warning("Shared event publish failed for %s: %s", channel, exc)
+
+    def events_since(self, last_id: int) -> list[tuple[int, str, object]]:
+        """Return (id, channel, payload) for every event after ``last_id``, oldest first."""
+        try:
+            rows = self._connect().execute(
+                "SELECT id, channel, payload FROM cache_events WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+            return [(event_id, channel, json.loads(payload)) for event_id, channel, payload in rows]
+        except (sqlite3.Error, ValueError) as exc:
+            logging.warning("Shared event read failed: %s", exc)
+            return []
+
+    def last_event_id(self) -> int:
+        try:
+            (last_id,) = self._connect().execute("SELECT COALESCE(MAX(id), 0) FROM cache_events").fetchone()
+            return last_id
+        except sqlite3.Error as exc:
+            logging.warning("Shared event read failed: %s", exc)
+            return 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size for every namespace."""
+        self.flush()
+        try:
+            conn = self._connect()
+            sizes = dict(conn.execute(
+                "SELECT namespace, COUNT(*) FROM cache_entries "
+                "WHERE expires_at > ? GROUP BY namespace",
+                (time.time(),),
+            ).fetchall())
+            result = {}
+            for namespace, hits, misses, writes, evictions in conn.execute(
+                "SELECT namespace, hits, misses, writes, evictions FROM cache_stats"
+            ):
+                lookups = hits + misses
+                result[namespace] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "writes": writes,
+                    "evictions": evictions,
+                    "entries": sizes.get(namespace, 0),
+                    "hit_ratio": round(hits / lookups, 4) if lookups else None,
+                }
+            return result
+        except sqlite3.Error as exc:
+            logging.warning("Shared cache stats failed: %s", exc)
+            return {}
+
+
+shared_cache = SharedCache()
+atexit.register(shared_cache.flush)
@@ -0,0 +1,197 @@
+"""Single-flight coalescing of identical concurrent calls.
+
+When many requests ask for the same thing at once (a heatwave sends everyone
+to the Delhi weather page), only one of them should call the AI provider.
+Within a worker, followers block on the leader's in-flight call and share
+its result. Across workers, leaders coordinate through the lease table in the
+shared cache: a worker that finds another worker's lease waits for it to be
+released, then runs its own call, which by then is normally a cache hit.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+
+from cache_store import make_key, shared_cache
+
+
+_OWNER_PREFIX = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome."""
+
+    def __init__(self, name: str, lease_seconds: float = 60, poll_interval: float = 0.05):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        # Async calls are collapsed per event loop; futures cannot be shared
+        # across loops.
+        self._async_calls = weakref.WeakKeyDictionary()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: str, fn, shared: bool = False):
+        """Return ``fn()``, collapsing concurrent calls for the same ``key``.
+
+        With ``shared=True`` the leader also takes a cross-worker lease so
+        only one worker at a time runs ``fn`` for this key. ``fn`` should then
+        consult a shared cache first so that later workers reuse the result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if shared:
+                call.result = self._run_with_lease(key, fn)
+            else:
+                call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _run_with_lease(self, key: str, fn):
+        lease_name = f"{self.name}:{key}"
+        owner = f"{_OWNER_PREFIX}:{threading.get_ident()}"
+        deadline = time.monotonic() + self.lease_seconds
+        while not shared_cache.acquire_lease(lease_name, owner, self.lease_seconds):
+            if time.monotonic() >= deadline:
+                logging.warning("Single-flight lease %s timed out; running anyway", lease_name)
+                return fn()
+            time.sleep(self.poll_interval)
+        try:
+            return fn()
+        finally:
+            shared_cache.release_lease(lease_name, owner)
+
+    async def do_async(self, key: str, coro_fn, shared: bool = False):
+        """Asyncio variant of ``do``; ``coro_fn`` returns a coroutine."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._async_calls.setdefault(loop, {})
+            future = calls.get(key)
+            leader = future is None
+            if leader:
+                future = calls[key] = loop.create_future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            if shared:
+                result = await self._arun_with_lease(key, coro_fn)
+            else:
+                result = await coro_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting.
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                calls.pop(key, None)
+
+    async def _arun_with_lease(self, key: str, coro_fn):
+        lease_name = f"{self.name}:{key}"
+        owner = f"{_OWNER_PREFIX}:{threading.get_ident()}:{id(asyncio.current_task())}"
+        deadline = time.monotonic() + self.lease_seconds
+        # SQLite calls can wait out a write lock; keep them off the event loop.
+        while not await asyncio.to_thread(shared_cache.acquire_lease, lease_name, owner, self.lease_seconds):
+            if time.monotonic() >= deadline:
+                logging.warning("Single-flight lease %s timed out; running anyway", lease_name)
+                return await coro_fn()
+            await asyncio.sleep(self.poll_interval)
+        try:
+            return await coro_fn()
+        finally:
+            await asyncio.to_thread(shared_cache.release_lease, lease_name, owner)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + sum(
+                    len(calls) for calls in self._async_calls.values()
+                ),
+                "leaders": self.leaders,
+                "followers": self.followers,
+            }
+
+
+_groups: dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_group(name: str) -> SingleFlight:
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
+
+
+def coalesced(name: str):
+    """Decorator that collapses concurrent calls with identical arguments."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(func.__qualname__, args, kwargs)
+            return get_group(name).do(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def coalesced_async(name: str):
+    """Decorator for coroutine functions; the async twin of ``coalesced``."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_key(func.__qualname__, args, kwargs)
+            return await get_group(name).do_async(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def get_coalescing_stats() -> dict:
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
@@ -0,0 +1,277 @@
+"""Offline vector index that links skill gaps to ``CourseListing`` rows.
+
+There is no network access for an embedding API, so text is embedded with
+signed feature hashing: every word and every character 3- and 4-gram of a
+word is hashed into one of ``DIMENSIONS`` buckets. Character n-grams let
+"kubernetes" match "Kubernetes Basics" and "data analyst" match "data
+analysis". Vectors are L2-normalised, so a dot product is the cosine
+similarity.
+
+The matrix lives in ``instance/course_index/`` as ``vectors-<generation>.npy``
+(float32, one row per course) next to ``ids-<generation>.npy``, and workers
+open it with ``mmap_mode="r"``. Every worker shares one copy in the page cache,
+and nothing is recomputed on restart. The current generation is stored in the
+shared cache.
+
+Committed ORM inserts, updates and deletes of courses are applied
+incrementally: only the changed courses are embedded, and the result is written
+as a new generation. If the matrix is missing, it is built from the database on
+the next query. Run ``python course_index.py --rebuild`` after bulk writes
+that skip ORM events.
+"""
+import argparse
+import functools
+import glob
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from cache_store import shared_cache
+from models import CourseListing
+
+
+DIMENSIONS = 1024
+NGRAM_SIZES = (3, 4)
+NGRAM_WEIGHT = 0.5
+TITLE_WEIGHT = 2.0
+MIN_SCORE = 0.1
+GENERATION_NAMESPACE = "course_index"
+GENERATION_TTL = 365 * 86400
+WRITE_LEASE_SECONDS = 30
+DEFAULT_INDEX_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "instance", "course_index"
+)
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+
+@functools.lru_cache(maxsize=50_000)
+def _features(word: str) -> tuple[np.ndarray, np.ndarray]:
+    """Hash buckets and signed weights of one word and its character n-grams."""
+    grams = [word]
+    padded = f"<{word}>"
+    for size in NGRAM_SIZES:
+        grams.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+    hashes = np.array([zlib.crc32(gram.encode()) for gram in grams], dtype=np.uint32)
+    weights = np.where(hashes & 0x80000000, -1.0, 1.0)
+    weights[1:] *= NGRAM_WEIGHT
+    return (hashes % DIMENSIONS).astype(np.intp), weights
+
+
+def _add(vector: np.ndarray, text: str | None, weight: float = 1.0):
+    for word in _WORD.findall((text or "").casefold()):
+        buckets, weights = _features(word)
+        np.add.at(vector, buckets, weights * weight)
+
+
+def _normalise(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed(text: str) -> np.ndarray:
+    """Unit-length hashed embedding of a free-text query."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float64)
+    _add(vector, text)
+    return _normalise(vector).astype(np.float32)
+
+
+def embed_course(course) -> np.ndarray:
+    vector = np.zeros(DIMENSIONS, dtype=np.float64)
+    _add(vector, course.title, TITLE_WEIGHT)
+    _add(vector, course.category)
+    _add(vector, course.description)
+    return _normalise(vector).astype(np.float32)
+
+
+class CourseIndex:
+    """Memory-mapped course embeddings, reloaded when the generation changes."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.environ.get("COURSE_INDEX_DIR", DEFAULT_INDEX_DIR)
+        self._lock = threading.RLock()
+        self._generation = None
+        self._ids: np.ndarray | None = None
+        self._vectors: np.ndarray | None = None
+        self.builds = 0
+        self.updates = 0
+        self.last_build_ms = None
+
+    def _files(self, generation: str) -> tuple[str, str]:
+        return (os.path.join(self.path, f"ids-{generation}.npy"),
+                os.path.join(self.path, f"vectors-{generation}.npy"))
+
+    def _open(self, generation: str | None) -> bool:
+        if generation is None:
+            return False
+        ids_path, vectors_path = self._files(generation)
+        try:
+            ids = np.load(ids_path)
+            vectors = np.load(vectors_path, mmap_mode="r") if len(ids) else np.zeros((0, DIMENSIONS), np.float32)
+        except (OSError, ValueError):
+            return False
+        self._ids, self._vectors, self._generation = ids, vectors, generation
+        return True
+
+    def _write(self, ids: np.ndarray, vectors: np.ndarray) -> str:
+        """Write a new generation, publish it and remove the older files."""
+        os.makedirs(self.path, exist_ok=True)
+        generation = uuid.uuid4().hex
+        ids_path, vectors_path = self._files(generation)
+        np.save(vectors_path, np.ascontiguousarray(vectors, dtype=np.float32))
+        np.save(ids_path, ids.astype(np.int64))
+        shared_cache.set(GENERATION_NAMESPACE, "generation", generation, GENERATION_TTL)
+        # Workers still reading an older generation keep their open mapping.
+        for stale in glob.glob(os.path.join(self.path, "*.npy")):
+            if generation not in os.path.basename(stale):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        return generation
+
+    def _with_write_lease(self, fn):
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        deadline = time.monotonic() + WRITE_LEASE_SECONDS
+        while not shared_cache.acquire_lease("course_index:write", owner, WRITE_LEASE_SECONDS):
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Timed out waiting for the course index write lease")
+            time.sleep(0.05)
+        try:
+            return fn()
+        finally:
+            shared_cache.release_lease("course_index:write", owner)
+
+    def rebuild(self, conn) -> int:
+        """Embed every course from ``conn`` into a new generation."""
+        def build():
+            started = time.perf_counter()
+            courses = conn.execute(select(
+                CourseListing.id, CourseListing.title, CourseListing.category, CourseListing.description
+            )).all()
+            vectors = np.array([embed_course(course) for course in courses], dtype=np.float32)
+            generation = self._write(np.array([course.id for course in courses], dtype=np.int64),
+                                     vectors.reshape(len(courses), DIMENSIONS))
+            self.builds += 1
+            self.last_build_ms = round((time.perf_counter() - started) * 1000, 1)
+            logging.info("Built course index over %d courses in %s ms", len(courses), self.last_build_ms)
+            return generation
+
+        with self._lock:
+            self._open(self._with_write_lease(build))
+        return len(self._ids)
+
+    def apply(self, upserts: dict[int, np.ndarray], deletes: set[int]):
+        """Replace the vectors of ``upserts`` (id -> embedding) and drop ``deletes``."""
+        def update():
+            current = shared_cache.get(GENERATION_NAMESPACE, "generation", record=False)
+            if (self._ids is None or current != self._generation) and not self._open(current):
+                # Nothing to update in place; the next query rebuilds from the database.
+                shared_cache.delete(GENERATION_NAMESPACE, "generation")
+                return None
+            keep = ~np.isin(self._ids, list(upserts) + list(deletes))
+            ids = np.concatenate([self._ids[keep], np.array(list(upserts), dtype=np.int64)])
+            added = np.array(list(upserts.values()), dtype=np.float32).reshape(len(upserts), DIMENSIONS)
+            vectors = np.concatenate([np.asarray(self._vectors)[keep], added])
+            self.updates += 1
+            return self._write(ids, vectors)
+
+        with self._lock:
+            generation = self._with_write_lease(update)
+            if generation:
+                self._open(generation)
+
+    def _current(self) -> tuple[np.ndarray, np.ndarray]:
+        generation = shared_cache.get(GENERATION_NAMESPACE, "generation", record=False)
+        if self._ids is None or generation != self._generation:
+            with self._lock:
+                if (self._ids is None or generation != self._generation) and not self._open(generation):
+                    self.rebuild(CourseListing.query.session.connection())
+        return self._ids, self._vectors
+
+    def search(self, text: str, limit: int = 3, exclude=()) -> list[tuple[int, float]]:
+        """Return (course id, cosine similarity) for the closest courses, best first."""
+        ids, vectors = self._current()
+        query = embed(text)
+        if not len(ids) or not query.any():
+            return []
+        scores = vectors @ query
+        if exclude:
+            scores[np.isin(ids, list(exclude))] = -1.0
+        best = np.argsort(-scores, kind="stable")[:limit]
+        return [(int(ids[row]), round(float(scores[row]), 4)) for row in best if scores[row] >= MIN_SCORE]
+
+    def stats(self) -> dict:
+        return {
+            "courses": int(len(self._ids)) if self._ids is not None else None,
+            "dimensions": DIMENSIONS,
+            "builds": self.builds,
+            "incremental_updates": self.updates,
+            "last_build_ms": self.last_build_ms,
+        }
+
+
+course_index = CourseIndex()
+
+
+def _mark_upsert(mapper, connection, target):
+    # Embed now: after_commit cannot load expired attributes.
+    changes = Session.object_session(target).info.setdefault("course_index_changes", {})
+    changes[target.id] = embed_course(target)
+
+
+def _mark_delete(mapper, connection, target):
+    changes = Session.object_session(target).info.setdefault("course_index_changes", {})
+    changes[target.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes = session.info.pop("course_index_changes", None)
+    if not changes:
+        return
+    try:
+        course_index.apply({course_id: vector for course_id, vector in changes.items() if vector is not None},
+                           {course_id for course_id, vector in changes.items() if vector is None})
+    except Exception as exc:
+        # The commit already succeeded; fall back to a full rebuild on the next query.
+        logging.warning("Incremental course index update failed, scheduling a rebuild: %s", exc)
+        shared_cache.delete(GENERATION_NAMESPACE, "generation")
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop("course_index_changes", None)
+
+
+event.listen(CourseListing, "after_insert", _mark_upsert)
+event.listen(CourseListing, "after_update", _mark_upsert)
+event.listen(CourseListing, "after_delete", _mark_delete)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the course recommendation index.")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed every course")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    from app import app, db
+
+    with app.app_context(), db.engine.connect() as conn:
+        print(f"Indexed {course_index.rebuild(conn)} courses")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
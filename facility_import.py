@@ -0,0 +1,523 @@
+"""Bulk import of health facilities from OSM extracts and government datasets.
+
+    python facility_import.py india-latest.osm.pbf
+    python facility_import.py hospitals.geojson
+    python facility_import.py nin_health_facilities.csv.gz --batch-size 5000
+    python facility_import.py facilities.csv --column name=Facility --column type=Kind
+    python facility_import.py facilities.geojsonseq --dry-run
+
+Inputs are read as a stream, one record at a time, so national extracts do not
+need to fit in memory:
+
+* ``.osm.pbf``: OpenStreetMap nodes and ways tagged ``amenity`` or
+  ``healthcare``. Reading these needs ``pyosmium`` (``pip install osmium``).
+* ``.geojson`` / ``.json``: a FeatureCollection, decoded one feature at a time.
+* ``.geojsonseq`` / ``.geojsonl`` / ``.ndjson`` / ``.jsonl``: one feature per
+  line, as written by ``osmium export -f geojsonseq``.
+* ``.csv``: government facility directories. Common column names are detected
+  automatically; ``--column`` maps any others.
+
+Any of these may be gzip-compressed (``.gz``). Facility types are normalised to
+the values the finder filters on (hospital, clinic, doctors, pharmacy, dentist)
+and records of any other kind are skipped. Records are deduplicated by name
+and coordinates (rounded to about 10 m), within the file and against existing
+rows. New facilities are inserted and known ones updated in batches, one
+transaction per batch.
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import sys
+import time
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from app import app, db
+from models import HealthService
+
+
+FACILITY_TYPES = ("hospital", "clinic", "doctors", "pharmacy", "dentist")
+COORDINATE_PRECISION = 4
+DEFAULT_BATCH_SIZE = 2000
+MISSING_ADDRESS = "Address not available"
+
+# Exact matches for OSM tag values and government facility categories.
+_TYPE_ALIASES = {
+    "hospital": "hospital", "hospitals": "hospital", "general hospital": "hospital",
+    "district hospital": "hospital", "sub district hospital": "hospital",
+    "medical college": "hospital", "community health centre": "hospital",
+    "community health center": "hospital", "chc": "hospital",
+    "clinic": "clinic", "centre": "clinic", "center": "clinic", "dispensary": "clinic",
+    "primary health centre": "clinic", "primary health center": "clinic", "phc": "clinic",
+    "sub centre": "clinic", "sub center": "clinic", "health and wellness centre": "clinic",
+    "mohalla clinic": "clinic", "polyclinic": "clinic",
+    "doctors": "doctors", "doctor": "doctors", "physician": "doctors",
+    "pharmacy": "pharmacy", "chemist": "pharmacy", "drugstore": "pharmacy",
+    "medical store": "pharmacy", "jan aushadhi kendra": "pharmacy",
+    "dentist": "dentist", "dental": "dentist", "dental clinic": "dentist",
+}
+# Fallback keyword search, most specific first.
+_TYPE_KEYWORDS = (
+    ("dental", "dentist"), ("dentist", "dentist"),
+    ("pharm", "pharmacy"), ("chemist", "pharmacy"), ("aushadhi", "pharmacy"),
+    ("medical store", "pharmacy"),
+    ("hospital", "hospital"), ("medical college", "hospital"),
+    ("community health", "hospital"),
+    ("clinic", "clinic"), ("dispensary", "clinic"), ("health cent", "clinic"),
+    ("sub cent", "clinic"), ("wellness", "clinic"),
+    ("doctor", "doctors"), ("physician", "doctors"),
+)
+
+# Candidate column names for tabular sources, compared after normalisation
+# (lower case, non-alphanumerics removed).
+_COLUMNS = {
+    "name": ("name", "hospitalname", "facilityname", "healthfacilityname", "nameofhospital"),
+    "type": ("servicetype", "type", "facilitytype", "hospitalcategory", "category", "amenity", "healthcare"),
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lng", "lon", "long"),
+    "coordinates": ("locationcoordinates", "coordinates", "latlong", "latlng"),
+    "address": ("address", "fulladdress", "location", "addrfull"),
+    "district": ("district", "districtname", "city", "town"),
+    "state": ("state", "statename"),
+    "pincode": ("pincode", "postcode", "pin"),
+    "phone": ("contactinfo", "phone", "telephone", "contact", "contactnumber", "mobilenumber", "emergencynum"),
+    "hours": ("hours", "openinghours", "timings"),
+    "services": ("servicesoffered", "specialties", "specialities", "services", "facilities", "hospitalcaretype"),
+}
+_EMPTY_VALUES = {"", "na", "n/a", "nan", "null", "none", "-", "0"}
+_FLOAT = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.read} read, {self.inserted} inserted, {self.updated} updated, "
+                f"{self.duplicates} duplicates, {self.skipped} skipped "
+                f"in {elapsed:.1f}s ({self.read / max(elapsed, 1e-9):.0f} records/s)")
+
+
+def normalise_type(value) -> str | None:
+    """Map a free-form facility category to one of ``FACILITY_TYPES``."""
+    text = re.sub(r"[^a-z]+", " ", str(value or "").lower()).strip()
+    if not text:
+        return None
+    if text in _TYPE_ALIASES:
+        return _TYPE_ALIASES[text]
+    for keyword, facility_type in _TYPE_KEYWORDS:
+        if keyword in text:
+            return facility_type
+    return None
+
+
+def dedupe_key(name: str, latitude: float, longitude: float) -> tuple:
+    return (" ".join(name.casefold().split()),
+            round(latitude, COORDINATE_PRECISION), round(longitude, COORDINATE_PRECISION))
+
+
+def _clean(value) -> str | None:
+    if value is None:
+        return None
+    text = " ".join(str(value).split())
+    return None if text.lower() in _EMPTY_VALUES else text
+
+
+def _coordinate(value, limit: float) -> float | None:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if -limit <= number <= limit else None
+
+
+def _facility(name, facility_type, latitude, longitude, address=None,
+              phone=None, hours=None, services=None) -> dict | None:
+    """Validate one record and shape it as a ``health_services`` row."""
+    facility_type = normalise_type(facility_type)
+    latitude, longitude = _coordinate(latitude, 90), _coordinate(longitude, 180)
+    if facility_type is None or latitude is None or longitude is None:
+        return None
+    if latitude == 0 and longitude == 0:
+        return None
+    name = _clean(name) or facility_type.capitalize()
+    return {
+        "name": name[:200],
+        "service_type": facility_type,
+        "address": _clean(address),
+        "latitude": latitude,
+        "longitude": longitude,
+        "contact_info": (_clean(phone) or "")[:200] or None,
+        "hours": (_clean(hours) or "")[:200] or None,
+        "services_offered": _clean(services),
+    }
+
+
+def _join_parts(*parts) -> str | None:
+    seen, joined = set(), []
+    for part in map(_clean, parts):
+        if part and part.lower() not in seen:
+            seen.add(part.lower())
+            joined.append(part)
+    return ", ".join(joined) or None
+
+
+# -- OpenStreetMap tags --------------------------------------------------------
+
+def _from_osm_tags(tags: dict, latitude, longitude) -> dict | None:
+    services = [tags.get("healthcare:speciality", "").replace(";", ", ")]
+    if tags.get("emergency") == "yes":
+        services.append("Emergency care")
+    address = tags.get("addr:full") or _join_parts(
+        " ".join(filter(None, (tags.get("addr:housenumber"), tags.get("addr:street")))),
+        tags.get("addr:suburb"), tags.get("addr:city"), tags.get("addr:district"),
+        tags.get("addr:state"), tags.get("addr:postcode"),
+    )
+    return _facility(
+        tags.get("name:en") or tags.get("name"),
+        tags.get("amenity") if normalise_type(tags.get("amenity")) else tags.get("healthcare"),
+        latitude, longitude, address,
+        tags.get("phone") or tags.get("contact:phone"),
+        tags.get("opening_hours"),
+        _join_parts(*services),
+    )
+
+
+def _is_osm_tags(properties: dict) -> bool:
+    return "amenity" in properties or "healthcare" in properties
+
+
+# -- Tabular rows (CSV and non-OSM GeoJSON properties) -------------------------
+
+def resolve_columns(headers, overrides: dict | None = None) -> dict:
+    """Map our field names to the matching header in ``headers``."""
+    by_key = {re.sub(r"[^a-z0-9]", "", header.lower()): header for header in headers}
+    columns = {}
+    for field, candidates in _COLUMNS.items():
+        for candidate in candidates:
+            if candidate in by_key:
+                columns[field] = by_key[candidate]
+                break
+    for field, header in (overrides or {}).items():
+        columns[field] = header
+    return columns
+
+
+def _from_row(row: dict, columns: dict, latitude=None, longitude=None) -> dict | None:
+    def value(field):
+        return row.get(columns[field]) if field in columns else None
+
+    if latitude is None or longitude is None:
+        latitude, longitude = value("latitude"), value("longitude")
+        if (latitude is None or longitude is None) and value("coordinates"):
+            numbers = _FLOAT.findall(str(value("coordinates")))
+            if len(numbers) >= 2:
+                latitude, longitude = numbers[0], numbers[1]
+    return _facility(
+        value("name"), value("type"), latitude, longitude,
+        _join_parts(value("address"), value("district"), value("state"), value("pincode")),
+        value("phone"), value("hours"), value("services"),
+    )
+
+
+# -- Readers -------------------------------------------------------------------
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+def detect_format(path: str) -> str:
+    name = path.lower().removesuffix(".gz")
+    if name.endswith(".pbf"):
+        return "pbf"
+    if name.endswith((".geojsonseq", ".geojsonl", ".ndjson", ".jsonl")):
+        return "geojsonseq"
+    if name.endswith((".geojson", ".json")):
+        return "geojson"
+    if name.endswith(".csv"):
+        return "csv"
+    raise ValueError(f"Cannot tell the format of {path}; pass --source-format")
+
+
+def iter_json_array(handle, key: str = "features", chunk_size: int = 1 << 20):
+    """Yield the items of the top-level ``key`` array without reading the whole file.
+
+    Only the array being decoded and one read chunk are held in memory at a
+    time, so a FeatureCollection of any size can be streamed.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position = "", 0
+
+    def fill() -> bool:
+        nonlocal buffer, position
+        chunk = handle.read(chunk_size)
+        buffer, position = buffer[position:] + chunk, 0
+        return bool(chunk)
+
+    marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    while True:
+        found = marker.search(buffer)
+        if found:
+            position = found.end()
+            break
+        # Keep a tail in case the marker spans two chunks.
+        position = max(len(buffer) - len(key) - 64, 0)
+        if not fill():
+            raise ValueError(f'No "{key}" array found')
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position >= len(buffer):
+            if not fill():
+                raise ValueError(f'Unterminated "{key}" array')
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if not fill():
+                raise
+            continue
+        position = end
+        yield item
+
+
+def _centroid(geometry: dict) -> tuple[float | None, float | None]:
+    """Return (lat, lng) for a GeoJSON geometry, averaging vertices for areas."""
+    coordinates = geometry.get("coordinates") if geometry else None
+    if not coordinates:
+        return None, None
+    if geometry.get("type") == "Point":
+        return coordinates[1], coordinates[0]
+    points = []
+
+    def collect(value):
+        if value and isinstance(value[0], (int, float)):
+            points.append(value)
+        else:
+            for item in value:
+                collect(item)
+
+    collect(coordinates)
+    if not points:
+        return None, None
+    return (sum(p[1] for p in points) / len(points), sum(p[0] for p in points) / len(points))
+
+
+def _features_to_facilities(features, overrides: dict):
+    columns_by_headers = {}
+    for feature in features:
+        properties = feature.get("properties") or {}
+        latitude, longitude = _centroid(feature.get("geometry"))
+        if _is_osm_tags(properties):
+            yield _from_osm_tags(properties, latitude, longitude)
+            continue
+        headers = tuple(properties)
+        if headers not in columns_by_headers:
+            columns_by_headers[headers] = resolve_columns(headers, overrides)
+        yield _from_row(properties, columns_by_headers[headers], latitude, longitude)
+
+
+def read_geojson(path: str, overrides: dict):
+    with _open_text(path) as handle:
+        yield from _features_to_facilities(iter_json_array(handle), overrides)
+
+
+def read_geojsonseq(path: str, overrides: dict):
+    def features(handle):
+        for line in handle:
+            line = line.strip().lstrip("\x1e")
+            if line:
+                yield json.loads(line)
+
+    with _open_text(path) as handle:
+        yield from _features_to_facilities(features(handle), overrides)
+
+
+def read_csv(path: str, overrides: dict):
+    with _open_text(path) as handle:
+        sample = handle.read(64 * 1024)
+        handle.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(handle, dialect=dialect)
+        columns = resolve_columns(reader.fieldnames or [], overrides)
+        if "name" not in columns or "type" not in columns:
+            raise ValueError(f"Could not find name and type columns in {reader.fieldnames}; use --column")
+        for row in reader:
+            yield _from_row(row, columns)
+
+
+def read_pbf(path: str, overrides: dict):
+    try:
+        import osmium
+    except ImportError:
+        raise RuntimeError("Reading .pbf extracts needs pyosmium: pip install osmium") from None
+
+    processor = (osmium.FileProcessor(path, osmium.osm.NODE | osmium.osm.WAY)
+                 .with_locations()
+                 .with_filter(osmium.filter.KeyFilter("amenity", "healthcare")))
+    for obj in processor:
+        tags = {tag.k: tag.v for tag in obj.tags}
+        if obj.is_node():
+            if not obj.location.valid():
+                continue
+            yield _from_osm_tags(tags, obj.location.lat, obj.location.lon)
+        else:
+            locations = [node.location for node in obj.nodes if node.location.valid()]
+            if not locations:
+                continue
+            yield _from_osm_tags(
+                tags,
+                sum(loc.lat for loc in locations) / len(locations),
+                sum(loc.lon for loc in locations) / len(locations),
+            )
+
+
+READERS = {
+    "pbf": read_pbf,
+    "geojson": read_geojson,
+    "geojsonseq": read_geojsonseq,
+    "csv": read_csv,
+}
+
+
+# -- Upsert --------------------------------------------------------------------
+
+def _existing_keys(connection) -> dict:
+    table = HealthService.__table__
+    rows = connection.execute(select(table.c.id, table.c.name, table.c.latitude, table.c.longitude))
+    return {
+        dedupe_key(name, latitude, longitude): row_id
+        for row_id, name, latitude, longitude in rows
+        if name and latitude is not None and longitude is not None
+    }
+
+
+def _write_batch(inserts: list, updates: list):
+    table = HealthService.__table__
+    with db.engine.begin() as connection:
+        if inserts:
+            connection.execute(insert(table), [
+                {**row, "address": row["address"] or MISSING_ADDRESS, "is_active": True}
+                for row in inserts
+            ])
+        if updates:
+            # Keep stored values for fields the source leaves empty.
+            connection.execute(
+                update(table).where(table.c.id == bindparam("row_id")).values(
+                    name=bindparam("name"),
+                    service_type=bindparam("service_type"),
+                    latitude=bindparam("latitude"),
+                    longitude=bindparam("longitude"),
+                    is_active=True,
+                    **{
+                        column: func.coalesce(bindparam(column), table.c[column])
+                        for column in ("address", "contact_info", "hours", "services_offered")
+                    },
+                ),
+                updates,
+            )
+
+
+def import_facilities(records, batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False,
+                      progress=None) -> ImportStats:
+    """Dedupe and upsert an iterable of facility rows (``None`` = unusable record)."""
+    stats = ImportStats()
+    with db.engine.connect() as connection:
+        existing = _existing_keys(connection)
+    seen = set()
+    inserts, updates = [], []
+
+    def flush():
+        if not dry_run:
+            _write_batch(inserts, updates)
+        stats.inserted += len(inserts)
+        stats.updated += len(updates)
+        inserts.clear()
+        updates.clear()
+        if progress:
+            progress(stats)
+
+    for record in records:
+        stats.read += 1
+        if record is None:
+            stats.skipped += 1
+            continue
+        key = dedupe_key(record["name"], record["latitude"], record["longitude"])
+        if key in seen:
+            stats.duplicates += 1
+            continue
+        seen.add(key)
+        if key in existing:
+            updates.append({**record, "row_id": existing[key]})
+        else:
+            inserts.append(record)
+        if len(inserts) + len(updates) >= batch_size:
+            flush()
+    flush()
+    return stats
+
+
+def _parse_overrides(pairs) -> dict:
+    overrides = {}
+    for pair in pairs or []:
+        field, sep, header = pair.partition("=")
+        if not sep or field not in _COLUMNS:
+            raise argparse.ArgumentTypeError(
+                f"--column expects FIELD=HEADER with FIELD one of {', '.join(_COLUMNS)}"
+            )
+        overrides[field] = header
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import health facilities into the finder.")
+    parser.add_argument("paths", nargs="+", help="PBF, GeoJSON, GeoJSON sequence or CSV files")
+    parser.add_argument("--source-format", choices=sorted(READERS),
+                        help="override detection from the file extension")
+    parser.add_argument("--column", action="append", metavar="FIELD=HEADER",
+                        help="map a CSV/GeoJSON property to a field (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="parse and dedupe without writing")
+    args = parser.parse_args(argv)
+
+    try:
+        overrides = _parse_overrides(args.column)
+    except argparse.ArgumentTypeError as exc:
+        parser.error(str(exc))
+
+    def progress(stats):
+        print(f"  ... {stats.summary()}", file=sys.stderr)
+
+    with app.app_context():
+        for path in args.paths:
+            if not os.path.exists(path):
+                parser.error(f"{path} does not exist")
+            try:
+                reader = READERS[args.source_format or detect_format(path)]
+                stats = import_facilities(reader(path, overrides), max(args.batch_size, 1),
+                                          args.dry_run, progress)
+            except (ValueError, RuntimeError) as exc:
+                print(f"{path}: {exc}", file=sys.stderr)
+                return 1
+            print(f"{path}: {stats.summary()}{' (dry run)' if args.dry_run else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
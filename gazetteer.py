@@ -0,0 +1,184 @@
+"""Canonical Indian places for location-keyed caches and AI prompts.
+
+``data/india_places.csv`` lists cities and district headquarters, states and
+union territories, and the agricultural regions offered on the food weather
+page. Each row has a latitude, a longitude and its old or alternative names.
+``resolve`` maps free text such as "NEW DELHI ", "delhi, india", "Bombay" or
+"Bengaluru, Karnataka" to one ``Place``, so they share one cache entry and
+one LLM call. Text that matches no place returns ``None`` and can be rejected
+before any provider is called.
+
+Lookup is a dict from normalised name to places. Misspellings fall back to a
+trigram index, and the closest name within a small edit distance is used
+("Banglore", "Hydrabad"). "lat,lng" input resolves to the nearest city.
+"""
+import csv
+import functools
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+from geo import haversine_km
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "india_places.csv")
+MAX_NEAREST_KM = 150
+MIN_FUZZY_LENGTH = 4
+_COUNTRY_WORDS = {"india", "bharat", "republic of india"}
+_FILLER_WORDS = {"city", "district", "dist", "the"}
+_COORDINATES = re.compile(r"^\s*(-?\d{1,2}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)\s*$")
+
+
+@dataclass(frozen=True)
+class Place:
+    id: str
+    name: str
+    kind: str
+    state: str
+    latitude: float
+    longitude: float
+
+    @property
+    def display_name(self) -> str:
+        """Unambiguous name for prompts, e.g. "Pune, Maharashtra, India"."""
+        if self.kind == "country":
+            return self.name
+        if self.kind == "city" and self.state and self.state != self.name:
+            return f"{self.name}, {self.state}, India"
+        return f"{self.name}, India"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "name": self.name, "kind": self.kind, "state": self.state or None,
+            "latitude": self.latitude, "longitude": self.longitude,
+        }
+
+
+def normalise(text: str) -> str:
+    """Lower-case ASCII words separated by single spaces."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().casefold()
+    words = re.sub(r"[^a-z0-9]+", " ", text).split()
+    return " ".join(word for word in words if word not in _FILLER_WORDS)
+
+
+def _trigrams(name: str) -> set[str]:
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or ``limit + 1`` once it is known to exceed ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class Gazetteer:
+    """Name, alias and trigram indexes over the bundled places."""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._places: dict[str, Place] | None = None
+        self.resolve = functools.lru_cache(maxsize=10_000)(self._resolve)
+
+    def _load(self):
+        places, names, trigrams = {}, defaultdict(list), defaultdict(set)
+        with open(self.path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                place = Place(row["id"], row["name"], row["kind"], row["state"],
+                              float(row["latitude"]), float(row["longitude"]))
+                places[place.id] = place
+                # Earlier rows win ambiguous names, so larger places come first.
+                for name in [row["name"], *filter(None, row["aliases"].split("|"))]:
+                    key = normalise(name)
+                    if place not in names[key]:
+                        names[key].append(place)
+                    for gram in _trigrams(key):
+                        trigrams[gram].add(key)
+        self._names, self._trigrams = dict(names), dict(trigrams)
+        self._cities = [place for place in places.values() if place.kind == "city"]
+        self._city_coordinates = np.array([(p.latitude, p.longitude) for p in self._cities])
+        self._places = places
+
+    def _ensure_loaded(self):
+        if self._places is None:
+            self._load()
+
+    def get(self, place_id: str) -> Place | None:
+        self._ensure_loaded()
+        return self._places.get(place_id)
+
+    def places(self) -> list[Place]:
+        self._ensure_loaded()
+        return list(self._places.values())
+
+    def nearest(self, latitude: float, longitude: float, max_km: float = MAX_NEAREST_KM) -> Place | None:
+        """The closest city within ``max_km``."""
+        self._ensure_loaded()
+        distances = haversine_km(latitude, longitude, self._city_coordinates[:, 0], self._city_coordinates[:, 1])
+        best = int(np.argmin(distances))
+        return self._cities[best] if distances[best] <= max_km else None
+
+    def _fuzzy(self, key: str) -> str | None:
+        if len(key) < MIN_FUZZY_LENGTH:
+            return None
+        overlap = defaultdict(int)
+        for gram in _trigrams(key):
+            for name in self._trigrams.get(gram, ()):
+                overlap[name] += 1
+        limit = 1 if len(key) <= 6 else 2
+        best, best_distance = None, limit + 1
+        for name in sorted(overlap, key=overlap.get, reverse=True)[:25]:
+            distance = _edit_distance(key, name, limit)
+            if distance < best_distance:
+                best, best_distance = name, distance
+        return best
+
+    def _lookup(self, key: str, fuzzy: bool) -> list[Place]:
+        matches = self._names.get(key)
+        if matches is None and fuzzy:
+            name = self._fuzzy(key)
+            matches = self._names.get(name) if name else None
+        return matches or []
+
+    def _resolve(self, text: str) -> Place | None:
+        """The place ``text`` names, or ``None`` when nothing matches closely."""
+        self._ensure_loaded()
+        if not text or not text.strip():
+            return None
+        coordinates = _COORDINATES.match(text)
+        if coordinates:
+            latitude, longitude = map(float, coordinates.groups())
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return self.nearest(latitude, longitude)
+            return None
+
+        whole = normalise(text)
+        parts = [part for part in map(normalise, text.split(",")) if part and part not in _COUNTRY_WORDS]
+        for fuzzy in (False, True):
+            # "Pune, Maharashtra" narrows on the state; "South India" is a name of its own.
+            candidates = self._lookup(whole, fuzzy) or (self._lookup(parts[0], fuzzy) if parts else [])
+            if not candidates and whole.endswith(" india"):
+                candidates = self._lookup(whole[:-len(" india")], fuzzy)
+            if candidates:
+                qualifiers = {state.state for part in parts[1:] for state in self._lookup(part, fuzzy)}
+                for place in candidates:
+                    if place.state in qualifiers:
+                        return place
+                return candidates[0]
+        return None
+
+
+gazetteer = Gazetteer()
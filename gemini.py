@@ -1,11 +1,22 @@
+import contextvars
+import functools
 import json
 import logging
 import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from google import genai
 from google.genai import types
 from groq import Groq
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr, ValidationError, conlist, create_model
+
+from cache_store import make_key, shared_cache
+from coalesce import coalesced, get_coalescing_stats, get_group
+import metrics
+import provider_health
+import stub_provider
 
 
 # AI providers are initialized lazily so the app can start even before keys are
@@ -14,6 +25,48 @@ gemini_client = None
 groq_client = None
 last_provider = None
 GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama-3.3-70b-versatile")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+# Providers are tried in this order unless routing demotes one (see
+# provider_health.route). SDK retries are disabled because the provider layer
+# does its own backoff and failover. AI_PROVIDERS=stub swaps in the offline
+# stub provider for load testing.
+KNOWN_PROVIDERS = ("groq", "gemini", "stub")
+PROVIDER_PRIORITY = tuple(
+    name.strip() for name in os.environ.get("AI_PROVIDERS", "groq,gemini").split(",")
+    if name.strip() in KNOWN_PROVIDERS
+) or ("groq", "gemini")
+PROVIDER_TIMEOUT_SECONDS = float(os.environ.get("AI_PROVIDER_TIMEOUT_SECONDS", 20))
+
+# Responses are cached per helper in the shared SQLite cache so every worker
+# reuses them. TTLs are in seconds and can be overridden with
+# AI_CACHE_TTL_<NAME> (e.g. AI_CACHE_TTL_WEATHER=600); 0 disables caching.
+AI_CACHE_NAMESPACE = "ai"
+AI_CACHE_TTLS = {
+    "health": 6 * 60 * 60,
+    "job_match": 24 * 60 * 60,
+    "nutrition": 24 * 60 * 60,
+    "weather": 15 * 60,
+    "disaster": 24 * 60 * 60,
+    "climate_advice": 6 * 60 * 60,
+    "agricultural_weather": 30 * 60,
+    "chat": 60 * 60,
+}
+
+# Latency-critical helpers race a second provider when the first has not
+# answered within its recent p90 (or AI_HEDGE_DELAY_MS when set). Override per
+# helper with AI_HEDGE_<HELPER>=1/0, e.g. AI_HEDGE_GET_HEALTH_ADVICE=0.
+AI_HEDGED_HELPERS = {
+    "get_health_advice": True,
+    "urgent_chat_response": True,
+    "get_climate_advice": False,
+}
+DEFAULT_HEDGE_DELAY_SECONDS = 2.0
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("AI_HEDGE_POOL_SIZE", 16)),
+    thread_name_prefix="ai-hedge",
+)
+_hedge_stats: dict[str, dict[str, int]] = {}
+_hedge_stats_lock = threading.Lock()
 
 
 def get_gemini_client():
@@ -22,7 +75,10 @@ def get_gemini_client():
     if not api_key:
         return None
     if gemini_client is None:
-        gemini_client = genai.Client(api_key=api_key)
+        gemini_client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(timeout=int(PROVIDER_TIMEOUT_SECONDS * 1000)),
+        )
     return gemini_client
 
 
@@ -32,15 +88,83 @@ def get_groq_client():
     if not api_key:
         return None
     if groq_client is None:
-        groq_client = Groq(api_key=api_key)
+        groq_client = Groq(
+            api_key=api_key, timeout=PROVIDER_TIMEOUT_SECONDS, max_retries=0
+        )
     return groq_client
 
 
 def get_last_provider():
-    """Return the provider used for the most recent successful AI request."""
+    """Return the provider used for the most recent successful AI request.
+
+    The value is process-wide; concurrent requests overwrite it. To know who
+    answered one call, read ``provider`` on the text it returned.
+    """
     return last_provider
 
 
+class ProviderText(str):
+    """Response text that remembers the provider that produced it."""
+
+    def __new__(cls, text: str, provider: str):
+        self = super().__new__(cls, text)
+        self.provider = provider
+        return self
+
+
+def _cache_ttl(cache_name: str | None) -> int:
+    if not cache_name or os.environ.get("AI_CACHE_ENABLED", "1") == "0":
+        return 0
+    override = os.environ.get(f"AI_CACHE_TTL_{cache_name.upper()}")
+    if override is not None:
+        return int(override)
+    return AI_CACHE_TTLS.get(cache_name, 0)
+
+
+def _hedging_enabled(helper: str | None) -> bool:
+    if not helper:
+        return False
+    override = os.environ.get(f"AI_HEDGE_{helper.upper()}")
+    if override is not None:
+        return override == "1"
+    return AI_HEDGED_HELPERS.get(helper, False)
+
+
+def _hedge_delay(provider_name: str) -> float:
+    override = os.environ.get("AI_HEDGE_DELAY_MS")
+    if override is not None:
+        return int(override) / 1000
+    p90 = provider_health.get_health(provider_name).percentile(0.9)
+    return p90 if p90 is not None else DEFAULT_HEDGE_DELAY_SECONDS
+
+
+def _count_hedge(helper: str, event: str):
+    with _hedge_stats_lock:
+        counters = _hedge_stats.setdefault(helper, {"requests": 0, "fired": 0, "won": 0})
+        counters[event] += 1
+
+
+def get_hedge_stats() -> dict:
+    """Return how many hedged requests were fired and won, per helper."""
+    with _hedge_stats_lock:
+        return {helper: dict(counters) for helper, counters in _hedge_stats.items()}
+
+
+def get_cache_stats() -> dict:
+    """Return hit/miss counters for the shared AI response cache."""
+    return shared_cache.stats().get(AI_CACHE_NAMESPACE, {})
+
+
+def get_inflight_stats() -> dict:
+    """Return leader/follower counts for coalesced AI calls in this worker."""
+    return get_coalescing_stats()
+
+
+def get_provider_stats() -> dict:
+    """Return circuit breaker state and recent latency for each provider."""
+    return provider_health.get_provider_stats()
+
+
 def _extract_json(text: str) -> str:
     """Remove optional markdown fences before parsing model JSON."""
     cleaned = text.strip()
@@ -51,16 +175,13 @@ def _extract_json(text: str) -> str:
     return cleaned.strip()
 
 
-def _generate_with_groq(
+def _groq_request(
     system_prompt: str,
     user_prompt: str,
     response_schema: type[BaseModel] | None = None,
     json_mode: bool = False,
-) -> str:
-    client = get_groq_client()
-    if client is None:
-        raise RuntimeError("GROQ_API_KEY is not configured")
-
+) -> dict:
+    """Build Groq chat-completion arguments; shared by the sync and async clients."""
     schema_instruction = ""
     if response_schema is not None:
         schema_instruction = (
@@ -78,23 +199,38 @@ def _generate_with_groq(
     }
     if json_mode or response_schema is not None:
         request["response_format"] = {"type": "json_object"}
+    return request
+
 
-    response = client.chat.completions.create(**request)
+def _groq_text(response) -> str:
     text = response.choices[0].message.content if response.choices else None
     if not text:
         raise ValueError("Empty response from Groq")
     return text
 
 
-def _generate_with_gemini(
+def _generate_with_groq(
     system_prompt: str,
     user_prompt: str,
     response_schema: type[BaseModel] | None = None,
+    json_mode: bool = False,
 ) -> str:
-    client = get_gemini_client()
+    client = get_groq_client()
     if client is None:
-        raise RuntimeError("GEMINI_API_KEY is not configured")
+        raise RuntimeError("GROQ_API_KEY is not configured")
+
+    response = client.chat.completions.create(
+        **_groq_request(system_prompt, user_prompt, response_schema, json_mode)
+    )
+    return _groq_text(response)
 
+
+def _gemini_request(
+    system_prompt: str,
+    user_prompt: str,
+    response_schema: type[BaseModel] | None = None,
+) -> dict:
+    """Build Gemini generate_content arguments; shared by the sync and async clients."""
     config_kwargs = {"system_instruction": system_prompt}
     if response_schema is not None:
         config_kwargs.update({
@@ -102,54 +238,324 @@ def _generate_with_gemini(
             "response_schema": response_schema,
         })
 
+    return {
+        "model": GEMINI_MODEL,
+        "contents": [types.Content(role="user", parts=[types.Part(text=user_prompt)])],
+        "config": types.GenerateContentConfig(**config_kwargs),
+    }
+
+
+def _generate_with_gemini(
+    system_prompt: str,
+    user_prompt: str,
+    response_schema: type[BaseModel] | None = None,
+) -> str:
+    client = get_gemini_client()
+    if client is None:
+        raise RuntimeError("GEMINI_API_KEY is not configured")
+
     response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[types.Content(role="user", parts=[types.Part(text=user_prompt)])],
-        config=types.GenerateContentConfig(**config_kwargs),
+        **_gemini_request(system_prompt, user_prompt, response_schema)
     )
     if not response.text:
         raise ValueError("Empty response from Gemini")
     return response.text
 
 
+def _request_key(cache_name, system_prompt, user_prompt, response_schema=None, json_mode=False) -> str:
+    schema = response_schema.model_json_schema() if response_schema else None
+    # Synthetic stub answers must never be served from a cache shared with real traffic.
+    return make_key(
+        cache_name, system_prompt, user_prompt, schema, json_mode,
+        GROQ_MODEL, GEMINI_MODEL, "stub" in PROVIDER_PRIORITY,
+    )
+
+
+def _cached_response(request_key: str, record: bool = True, cache_name: str | None = None) -> str | None:
+    global last_provider
+    cached = shared_cache.get(AI_CACHE_NAMESPACE, request_key, record=record)
+    if record and cache_name:
+        metrics.record_cache_lookup(f"ai_{cache_name}", cached is not None)
+    if cached is None:
+        return None
+    last_provider = cached["provider"]
+    return ProviderText(cached["text"], cached["provider"])
+
+
+def _is_valid_response(result: str, response_schema: type[BaseModel] | None, json_mode: bool) -> bool:
+    """Whether ``result`` parses as JSON and matches ``response_schema`` when they are expected."""
+    if not json_mode and response_schema is None:
+        return True
+    try:
+        data = json.loads(_extract_json(result))
+        if response_schema is not None:
+            response_schema.model_validate(data)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _remember_response(request_key: str, ttl: int, provider_name: str, result: str,
+                       response_schema: type[BaseModel] | None = None, json_mode: bool = False) -> str:
+    """Record the provider and cache ``result``, unless it is malformed.
+
+    A truncated or off-schema answer is returned to this caller, whose parse
+    fails into its fallback, but is never cached: the next call asks again.
+    """
+    global last_provider
+    last_provider = provider_name
+    if provider_name != PROVIDER_PRIORITY[0]:
+        metrics.record_fallback(provider_name)
+    if ttl > 0 and not _is_valid_response(result, response_schema, json_mode):
+        logging.warning("Not caching malformed response from %s", provider_name)
+    elif ttl > 0:
+        shared_cache.set(
+            AI_CACHE_NAMESPACE, request_key,
+            {"provider": provider_name, "text": result}, ttl,
+        )
+    return ProviderText(result, provider_name)
+
+
 def _generate_text(
     system_prompt: str,
     user_prompt: str,
     response_schema: type[BaseModel] | None = None,
     json_mode: bool = False,
+    cache_name: str | None = None,
+    helper: str | None = None,
 ) -> str:
-    """Try Groq first, then Gemini, and fail explicitly if both are unavailable."""
-    global last_provider
-    providers = (
-        ("groq", lambda: _generate_with_groq(
-            system_prompt, user_prompt, response_schema, json_mode
-        )),
-        ("gemini", lambda: _generate_with_gemini(
-            system_prompt, user_prompt, response_schema
-        )),
+    """Try Groq first, then Gemini, and fail explicitly if both are unavailable.
+
+    Providers with an open circuit breaker are skipped, and a primary whose
+    recent p95 latency is much worse than the fallback's is tried second.
+
+    When ``cache_name`` names an entry in ``AI_CACHE_TTLS`` the response is
+    served from, and stored in, the shared cache. Identical concurrent calls
+    are collapsed into a single provider request. ``helper`` names the calling
+    helper; helpers enabled in ``AI_HEDGED_HELPERS`` race two providers.
+    """
+    ttl = _cache_ttl(cache_name)
+    request_key = _request_key(cache_name, system_prompt, user_prompt, response_schema, json_mode)
+    if ttl > 0:
+        cached = _cached_response(request_key, cache_name=cache_name)
+        if cached is not None:
+            return cached
+
+    def remember(provider_name, result):
+        return _remember_response(request_key, ttl, provider_name, result, response_schema, json_mode)
+
+    def call_providers():
+        if ttl > 0:
+            # Another worker may have filled the cache while we waited on its lease.
+            cached = _cached_response(request_key, record=False)
+            if cached is not None:
+                return cached
+
+        generators = {
+            "groq": (get_groq_client, lambda: _generate_with_groq(
+                system_prompt, user_prompt, response_schema, json_mode
+            )),
+            "gemini": (get_gemini_client, lambda: _generate_with_gemini(
+                system_prompt, user_prompt, response_schema
+            )),
+            "stub": (lambda: stub_provider, lambda: stub_provider.generate(
+                system_prompt, user_prompt, response_schema, json_mode
+            )),
+        }
+        errors = []
+        candidates = []
+        for provider_name in provider_health.route(PROVIDER_PRIORITY):
+            configured, generate = generators[provider_name]
+            if configured() is None:
+                errors.append(f"{provider_name}: API key is not configured")
+            else:
+                candidates.append((provider_name, generate))
+
+        if _hedging_enabled(helper) and len(candidates) > 1:
+            hedged, candidates = candidates[:2], candidates[2:]
+            try:
+                provider_name, result = _generate_hedged(helper, hedged)
+                return remember(provider_name, result)
+            except Exception as exc:
+                errors.append(str(exc))
+                logging.warning("Hedged AI request failed: %s", exc)
+
+        for provider_name, generate in candidates:
+            if not provider_health.get_health(provider_name).breaker.allow():
+                errors.append(f"{provider_name}: circuit open")
+                continue
+            try:
+                result = provider_health.call_with_retries(provider_name, generate)
+                return remember(provider_name, result)
+            except Exception as exc:
+                errors.append(f"{provider_name}: {exc}")
+                logging.warning("AI provider %s failed: %s", provider_name, exc)
+        raise RuntimeError("All AI providers failed: " + "; ".join(errors))
+
+    return get_group("ai").do(request_key, call_providers, shared=ttl > 0)
+
+
+def _stream_with_groq(system_prompt: str, user_prompt: str):
+    client = get_groq_client()
+    if client is None:
+        raise RuntimeError("GROQ_API_KEY is not configured")
+
+    stream = client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.2,
+        stream=True,
     )
+    for chunk in stream:
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        if text:
+            yield text
+
+
+def _stream_with_gemini(system_prompt: str, user_prompt: str):
+    client = get_gemini_client()
+    if client is None:
+        raise RuntimeError("GEMINI_API_KEY is not configured")
+
+    stream = client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=[types.Content(role="user", parts=[types.Part(text=user_prompt)])],
+        config=types.GenerateContentConfig(system_instruction=system_prompt),
+    )
+    for chunk in stream:
+        if chunk.text:
+            yield chunk.text
+
+
+def _stream_text(
+    system_prompt: str,
+    user_prompt: str,
+    cache_name: str | None = None,
+):
+    """Yield a free-text completion chunk by chunk.
+
+    Providers are tried in the same order as ``_generate_text``. A provider
+    that fails before its first chunk falls through to the next one; a
+    failure after text has been sent cannot be retried and is raised. Cached
+    responses are yielded as a single chunk, and completed streams are
+    written back to the cache.
+    """
+    ttl = _cache_ttl(cache_name)
+    request_key = _request_key(cache_name, system_prompt, user_prompt)
+    if ttl > 0:
+        cached = _cached_response(request_key, cache_name=cache_name)
+        if cached is not None:
+            yield cached
+            return
+
+    streamers = {
+        "groq": (get_groq_client, _stream_with_groq),
+        "gemini": (get_gemini_client, _stream_with_gemini),
+        "stub": (lambda: stub_provider, stub_provider.stream),
+    }
     errors = []
-    for provider_name, generate in providers:
+    for provider_name in provider_health.route(PROVIDER_PRIORITY):
+        configured, stream = streamers[provider_name]
+        if configured() is None:
+            errors.append(f"{provider_name}: API key is not configured")
+            continue
+        health = provider_health.get_health(provider_name)
+        if not health.breaker.allow():
+            errors.append(f"{provider_name}: circuit open")
+            continue
+        started = time.monotonic()
+        chunks = []
         try:
-            result = generate()
-            last_provider = provider_name
-            return result
+            for chunk in stream(system_prompt, user_prompt):
+                chunks.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            # The client went away; that says nothing about the provider's health.
+            health.breaker.release_probe()
+            raise
         except Exception as exc:
+            provider_health.observe_attempt(provider_name, time.monotonic() - started, ok=False)
+            health.record_failure(exc)
+            if chunks:
+                raise
             errors.append(f"{provider_name}: {exc}")
-            logging.warning("AI provider %s failed: %s", provider_name, exc)
+            logging.warning("AI provider %s stream failed: %s", provider_name, exc)
+            continue
+        if not chunks:
+            health.record_failure()
+            errors.append(f"{provider_name}: empty stream")
+            continue
+        elapsed = time.monotonic() - started
+        provider_health.observe_attempt(provider_name, elapsed, ok=True)
+        health.record_success(elapsed)
+        _remember_response(request_key, ttl, provider_name, "".join(chunks))
+        return
     raise RuntimeError("All AI providers failed: " + "; ".join(errors))
 
 
+def _generate_hedged(helper: str, candidates: list) -> tuple[str, str]:
+    """Race the primary against a delayed hedge and return the first success.
+
+    The loser is not cancelled (the SDK calls are blocking) but its result is
+    ignored; it still feeds the provider's latency and breaker statistics.
+    """
+    (primary_name, primary), (hedge_name, hedge) = candidates
+    _count_hedge(helper, "requests")
+    pending = {}
+    errors = []
+    if provider_health.get_health(primary_name).breaker.allow():
+        pending[_hedge_executor.submit(
+            contextvars.copy_context().run,
+            provider_health.call_with_retries, primary_name, primary, 0
+        )] = primary_name
+        done, _ = wait(pending, timeout=_hedge_delay(primary_name))
+        for future in done:
+            if future.exception() is None:
+                return primary_name, future.result()
+            errors.append(f"{primary_name}: {future.exception()}")
+            del pending[future]
+    else:
+        errors.append(f"{primary_name}: circuit open")
+
+    if provider_health.get_health(hedge_name).breaker.allow():
+        if pending:
+            _count_hedge(helper, "fired")
+        pending[_hedge_executor.submit(
+            contextvars.copy_context().run,
+            provider_health.call_with_retries, hedge_name, hedge, 0
+        )] = hedge_name
+    else:
+        errors.append(f"{hedge_name}: circuit open")
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            provider_name = pending.pop(future)
+            if future.exception() is None:
+                if provider_name == hedge_name and primary_name in pending.values():
+                    _count_hedge(helper, "won")
+                return provider_name, future.result()
+            errors.append(f"{provider_name}: {future.exception()}")
+    raise RuntimeError("Hedged providers failed: " + "; ".join(errors))
+
+
 def _generate_json(
     system_prompt: str,
     user_prompt: str,
     response_schema: type[BaseModel] | None = None,
+    cache_name: str | None = None,
+    helper: str | None = None,
 ):
     raw = _generate_text(
         system_prompt,
         user_prompt,
         response_schema=response_schema,
         json_mode=True,
+        cache_name=cache_name,
+        helper=helper,
     )
     return json.loads(_extract_json(raw))
 
@@ -174,83 +580,222 @@ class NutritionPlan(BaseModel):
     warnings: list[str]
 
 
+def _health_advice_request(symptoms: str, age: int = None, gender: str = None) -> dict:
+    system_prompt = (
+        "You are a helpful health advisor for underserved communities. "
+        "Provide practical, safe health advice based on symptoms. "
+        "Always recommend consulting healthcare professionals for serious concerns. "
+        "Focus on preventive care and accessible remedies."
+    )
+
+    user_prompt = f"Symptoms: {symptoms}"
+    if age:
+        user_prompt += f", Age: {age}"
+    if gender:
+        user_prompt += f", Gender: {gender}"
+
+    return dict(system_prompt=system_prompt, user_prompt=user_prompt,
+                response_schema=HealthAdvice, cache_name="health",
+                helper="get_health_advice")
+
+
+def _health_advice_fallback() -> HealthAdvice:
+    return HealthAdvice(
+        advice="Please consult with a healthcare professional for personalized advice.",
+        urgency_level="medium",
+        recommended_actions=["Seek professional medical consultation"]
+    )
+
+
 def get_health_advice(symptoms: str, age: int = None, gender: str = None) -> HealthAdvice:
     """Get health advice based on symptoms and demographics"""
     try:
-        system_prompt = (
-            "You are a helpful health advisor for underserved communities. "
-            "Provide practical, safe health advice based on symptoms. "
-            "Always recommend consulting healthcare professionals for serious concerns. "
-            "Focus on preventive care and accessible remedies."
-        )
-
-        user_prompt = f"Symptoms: {symptoms}"
-        if age:
-            user_prompt += f", Age: {age}"
-        if gender:
-            user_prompt += f", Gender: {gender}"
-
-        data = _generate_json(system_prompt, user_prompt, HealthAdvice)
+        data = _generate_json(**_health_advice_request(symptoms, age, gender))
         return HealthAdvice(**data)
 
     except Exception as e:
         logging.error(f"Failed to get health advice: {e}")
-        return HealthAdvice(
-            advice="Please consult with a healthcare professional for personalized advice.",
-            urgency_level="medium",
-            recommended_actions=["Seek professional medical consultation"]
-        )
+        return _health_advice_fallback()
+
+
+JOB_MATCH_SYSTEM_PROMPT = (
+    "You are an AI career advisor for underserved communities. "
+    "Analyze job descriptions against user skills and provide matching scores, "
+    "identify skill gaps, and suggest practical improvements."
+)
+
+
+def _job_match_request(job_description: str, user_skills: list[str]) -> dict:
+    user_prompt = f"Job: {job_description}\nUser Skills: {', '.join(user_skills)}"
+
+    return dict(system_prompt=JOB_MATCH_SYSTEM_PROMPT, user_prompt=user_prompt,
+                response_schema=JobMatch, cache_name="job_match",
+                helper="match_job_to_skills")
+
+
+def _job_match_fallback() -> JobMatch:
+    return JobMatch(
+        match_score=0.0,
+        reasons=["Unable to analyze at this time"],
+        skill_gaps=["Analysis unavailable"],
+        recommendations=["Please try again later"]
+    )
 
 
 def match_job_to_skills(job_description: str, user_skills: list[str]) -> JobMatch:
     """Match a job to user skills and provide recommendations"""
     try:
-        system_prompt = (
-            "You are an AI career advisor for underserved communities. "
-            "Analyze job descriptions against user skills and provide matching scores, "
-            "identify skill gaps, and suggest practical improvements."
-        )
-
-        user_prompt = f"Job: {job_description}\nUser Skills: {', '.join(user_skills)}"
-
-        data = _generate_json(system_prompt, user_prompt, JobMatch)
+        data = _generate_json(**_job_match_request(job_description, user_skills))
         return JobMatch(**data)
 
     except Exception as e:
         logging.error(f"Failed to match job to skills: {e}")
-        return JobMatch(
-            match_score=0.0,
-            reasons=["Unable to analyze at this time"],
-            skill_gaps=["Analysis unavailable"],
-            recommendations=["Please try again later"]
-        )
+        return _job_match_fallback()
+
+
+# Several jobs evaluated against the same skills share one request, so the
+# system prompt, skills and schema are sent once per batch instead of once per
+# job. A batch holds at most AI_JOB_MATCH_BATCH_SIZE jobs, and its estimated
+# prompt plus JOB_MATCH_OUTPUT_TOKENS per job must fit AI_CONTEXT_TOKENS, the
+# smallest context window among the configured models.
+JOB_MATCH_BATCH_SIZE = int(os.environ.get("AI_JOB_MATCH_BATCH_SIZE", 8))
+AI_CONTEXT_TOKENS = int(os.environ.get("AI_CONTEXT_TOKENS", 8192))
+JOB_MATCH_OUTPUT_TOKENS = 300
+_batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("AI_BATCH_POOL_SIZE", 8)),
+    thread_name_prefix="ai-batch",
+)
+
+
+def _estimate_tokens(text: str) -> int:
+    # About four characters per token for English text.
+    return len(text) // 4 + 1
+
+
+@functools.lru_cache(maxsize=None)
+def _job_match_batch_schema(count: int) -> type[BaseModel]:
+    """Response schema holding exactly ``count`` JobMatch results."""
+    return create_model(
+        f"JobMatchBatch{count}",
+        matches=(conlist(JobMatch, min_length=count, max_length=count), ...),
+    )
 
 
-def get_nutrition_advice(dietary_preferences: str, health_conditions: str = None, budget: str = "low") -> NutritionPlan:
-    """Get personalized nutrition advice for community members"""
+def _job_match_batch_request(job_descriptions: list[str], user_skills: list[str]) -> dict:
+    system_prompt = (
+        f"{JOB_MATCH_SYSTEM_PROMPT} Several numbered jobs follow. Evaluate each job "
+        "independently and return one result per job, in the same order."
+    )
+    jobs = "\n\n".join(
+        f"Job {number}: {description}" for number, description in enumerate(job_descriptions, 1)
+    )
+    user_prompt = f"{jobs}\n\nUser Skills: {', '.join(user_skills)}"
+
+    return dict(system_prompt=system_prompt, user_prompt=user_prompt,
+                response_schema=_job_match_batch_schema(len(job_descriptions)),
+                cache_name="job_match", helper="match_jobs_to_skills")
+
+
+def _job_match_batches(job_descriptions: list[str], user_skills: list[str]) -> list[list[str]]:
+    """Pack jobs, in order, into batches that fit the context window.
+
+    A description too long for a batch of its own is truncated.
+    """
+    request = _job_match_batch_request(["x"], user_skills)
+    overhead = _estimate_tokens(
+        request["system_prompt"] + request["user_prompt"]
+        + json.dumps(request["response_schema"].model_json_schema())
+    )
+    room = max(AI_CONTEXT_TOKENS - overhead - JOB_MATCH_OUTPUT_TOKENS, 1)
+    batches, batch, used = [], [], 0
+    for description in job_descriptions:
+        description = description[:room * 4]
+        cost = _estimate_tokens(description) + JOB_MATCH_OUTPUT_TOKENS
+        if batch and (len(batch) >= JOB_MATCH_BATCH_SIZE or overhead + used + cost > AI_CONTEXT_TOKENS):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(description)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _should_split(exc: Exception) -> bool:
+    """True for failures a smaller batch can fix: a short or malformed result
+    list, or a provider rejecting the prompt as too long."""
+    if isinstance(exc, (ValidationError, ValueError, TypeError)):
+        return True
+    message = str(exc).lower()
+    return any(hint in message for hint in ("context", "too long", "too large", "413"))
+
+
+def _match_job_batch(job_descriptions: list[str], user_skills: list[str]) -> list[JobMatch]:
+    if len(job_descriptions) == 1:
+        return [match_job_to_skills(job_descriptions[0], user_skills)]
     try:
-        system_prompt = (
-            "You are a nutrition advisor for underserved communities. "
-            "Provide practical, affordable nutrition advice that considers "
-            "limited resources and local food availability. Focus on accessible, "
-            "culturally appropriate recommendations."
-        )
+        request = _job_match_batch_request(job_descriptions, user_skills)
+        return request["response_schema"](**_generate_json(**request)).matches
+    except Exception as e:
+        if not _should_split(e):
+            logging.error(f"Failed to match a batch of {len(job_descriptions)} jobs: {e}")
+            return [_job_match_fallback() for _ in job_descriptions]
+        logging.warning(f"Splitting a batch of {len(job_descriptions)} jobs: {e}")
+        half = len(job_descriptions) // 2
+        return (_match_job_batch(job_descriptions[:half], user_skills)
+                + _match_job_batch(job_descriptions[half:], user_skills))
+
+
+def match_jobs_to_skills(job_descriptions: list[str], user_skills: list[str]) -> list[JobMatch]:
+    """Match several jobs to the same skills, one JobMatch per job in input order.
+
+    Jobs are packed into as few requests as fit the model's context window,
+    and the requests run in parallel. A batch the model gets wrong is split
+    in half and retried, down to single-job requests.
+    """
+    futures = [
+        _batch_executor.submit(contextvars.copy_context().run, _match_job_batch, batch, user_skills)
+        for batch in _job_match_batches(job_descriptions, user_skills)
+    ]
+    return [match for future in futures for match in future.result()]
+
+
+def _nutrition_request(dietary_preferences: str, health_conditions: str = None, budget: str = "low") -> dict:
+    system_prompt = (
+        "You are a nutrition advisor for underserved communities. "
+        "Provide practical, affordable nutrition advice that considers "
+        "limited resources and local food availability. Focus on accessible, "
+        "culturally appropriate recommendations."
+    )
 
-        user_prompt = f"Dietary preferences: {dietary_preferences}, Budget: {budget}"
-        if health_conditions:
-            user_prompt += f", Health conditions: {health_conditions}"
+    user_prompt = f"Dietary preferences: {dietary_preferences}, Budget: {budget}"
+    if health_conditions:
+        user_prompt += f", Health conditions: {health_conditions}"
 
-        data = _generate_json(system_prompt, user_prompt, NutritionPlan)
+    return dict(system_prompt=system_prompt, user_prompt=user_prompt,
+                response_schema=NutritionPlan, cache_name="nutrition",
+                helper="get_nutrition_advice")
+
+
+def _nutrition_fallback() -> NutritionPlan:
+    return NutritionPlan(
+        daily_calories=2000,
+        meal_suggestions=["Balanced meals with available local ingredients"],
+        nutritional_tips=["Consult with a nutritionist for personalized advice"],
+        warnings=["Please seek professional guidance for specific dietary needs"]
+    )
+
+
+@coalesced("nutrition")
+def get_nutrition_advice(dietary_preferences: str, health_conditions: str = None, budget: str = "low") -> NutritionPlan:
+    """Get personalized nutrition advice for community members"""
+    try:
+        data = _generate_json(**_nutrition_request(dietary_preferences, health_conditions, budget))
         return NutritionPlan(**data)
 
     except Exception as e:
         logging.error(f"Failed to get nutrition advice: {e}")
-        return NutritionPlan(
-            daily_calories=2000,
-            meal_suggestions=["Balanced meals with available local ingredients"],
-            nutritional_tips=["Consult with a nutritionist for personalized advice"],
-            warnings=["Please seek professional guidance for specific dietary needs"]
-        )
+        return _nutrition_fallback()
 
 
 class WeatherForecastDay(BaseModel):
@@ -272,6 +817,19 @@ class ClimateAdvice(BaseModel):
     recommendations: list[str]
     warnings: list[str]
     forecast: list[WeatherForecastDay]
+    # Private, so they stay out of the response schema sent to providers.
+    _fallback: bool = PrivateAttr(default=False)
+    _provider: str | None = PrivateAttr(default=None)
+
+    @property
+    def is_fallback(self) -> bool:
+        """True for the canned advice returned when every provider failed."""
+        return self._fallback
+
+    @property
+    def source(self) -> str | None:
+        """The provider that answered this request, or ``"fallback"``."""
+        return "fallback" if self._fallback else self._provider
 
 class DisasterAssessment(BaseModel):
     preparedness_score: int
@@ -280,106 +838,135 @@ class DisasterAssessment(BaseModel):
     immediate_actions: list[str]
     supplies_needed: list[str]
 
-def get_india_weather(location: str = "New Delhi") -> ClimateAdvice:
-    """Get weather information for India using Groq with Gemini fallback."""
-    try:
-        system_prompt = (
-            "You are a weather and climate advisor for India. "
-            "Provide current weather conditions, temperature, humidity, wind speed, precipitation, "
-            "pressure and practical advice "
-            "for the specified location in India. Focus on actionable recommendations "
-            "for community members dealing with Indian climate conditions."
-        )
+def _india_weather_request(location: str = "New Delhi") -> dict:
+    system_prompt = (
+        "You are a weather and climate advisor for India. "
+        "Provide current weather conditions, temperature, humidity, wind speed, precipitation, "
+        "pressure and practical advice "
+        "for the specified location in India. Focus on actionable recommendations "
+        "for community members dealing with Indian climate conditions."
+    )
 
-        user_prompt = f"""Provide current weather information and climate advice for {location}, India.
+    user_prompt = f"""Provide current weather information and climate advice for {location}, India.
 Include the current temperature in °C, humidity percentage, wind speed in km/h,
 precipitation in mm, pressure in hPa, current conditions, practical recommendations,
 warnings, and a realistic 5-day forecast. For each forecast day include day, high,
 low, condition, icon (sunny, cloudy, rainy, or storm), and rain in mm."""
 
-        data = _generate_json(system_prompt, user_prompt, ClimateAdvice)
-        return ClimateAdvice(**data)
+    return dict(system_prompt=system_prompt, user_prompt=user_prompt,
+                response_schema=ClimateAdvice, cache_name="weather",
+                helper="get_india_weather")
+
+
+def _india_weather_fallback() -> ClimateAdvice:
+    advice = ClimateAdvice(
+        current_conditions="Warm conditions with partly cloudy skies",
+        temperature="32°C",
+        humidity="65%",
+        wind_speed="12 km/h",
+        precipitation="0 mm",
+        pressure="1013 hPa",
+        recommendations=[
+            "Stay hydrated and avoid prolonged exposure during peak afternoon heat.",
+            "Wear light, breathable clothing and use sun protection outdoors.",
+            "Monitor official local weather alerts before planning travel or outdoor work."
+        ],
+        warnings=["AI weather updates are temporarily unavailable; showing the latest safe fallback guidance."],
+        forecast=[
+            {"day": "Today", "high": "32°C", "low": "25°C", "condition": "Partly cloudy", "icon": "cloudy", "rain": "0 mm"},
+            {"day": "Tomorrow", "high": "34°C", "low": "26°C", "condition": "Sunny", "icon": "sunny", "rain": "0 mm"},
+            {"day": "Day 3", "high": "33°C", "low": "26°C", "condition": "Cloudy", "icon": "cloudy", "rain": "2 mm"},
+            {"day": "Day 4", "high": "31°C", "low": "25°C", "condition": "Light rain", "icon": "rainy", "rain": "8 mm"},
+            {"day": "Day 5", "high": "32°C", "low": "25°C", "condition": "Partly cloudy", "icon": "cloudy", "rain": "1 mm"}
+        ]
+    )
+    advice._fallback = True
+    return advice
+
+
+@coalesced("weather")
+def get_india_weather(location: str = "New Delhi") -> ClimateAdvice:
+    """Get weather information for India using Groq with Gemini fallback."""
+    try:
+        raw = _generate_text(json_mode=True, **_india_weather_request(location))
+        advice = ClimateAdvice(**json.loads(_extract_json(raw)))
+        advice._provider = raw.provider
+        return advice
 
     except Exception as e:
         logging.error(f"Failed to get India weather: {e}")
-        return ClimateAdvice(
-            current_conditions="Warm conditions with partly cloudy skies",
-            temperature="32°C",
-            humidity="65%",
-            wind_speed="12 km/h",
-            precipitation="0 mm",
-            pressure="1013 hPa",
-            recommendations=[
-                "Stay hydrated and avoid prolonged exposure during peak afternoon heat.",
-                "Wear light, breathable clothing and use sun protection outdoors.",
-                "Monitor official local weather alerts before planning travel or outdoor work."
-            ],
-            warnings=["AI weather updates are temporarily unavailable; showing the latest safe fallback guidance."],
-            forecast=[
-                {"day": "Today", "high": "32°C", "low": "25°C", "condition": "Partly cloudy", "icon": "cloudy", "rain": "0 mm"},
-                {"day": "Tomorrow", "high": "34°C", "low": "26°C", "condition": "Sunny", "icon": "sunny", "rain": "0 mm"},
-                {"day": "Day 3", "high": "33°C", "low": "26°C", "condition": "Cloudy", "icon": "cloudy", "rain": "2 mm"},
-                {"day": "Day 4", "high": "31°C", "low": "25°C", "condition": "Light rain", "icon": "rainy", "rain": "8 mm"},
-                {"day": "Day 5", "high": "32°C", "low": "25°C", "condition": "Partly cloudy", "icon": "cloudy", "rain": "1 mm"}
-            ]
-        )
+        return _india_weather_fallback()
+
+def _disaster_request(disaster_type: str, responses: dict, location: str) -> dict:
+    system_prompt = (
+        "You are a disaster preparedness expert for Indian communities. "
+        "Analyze questionnaire responses and provide a preparedness score (0-100), "
+        "risk level assessment, and specific recommendations based on the disaster type and location."
+    )
+
+    user_prompt = f"Disaster type: {disaster_type}, Location: {location}, India. User responses: {json.dumps(responses, sort_keys=True)}. Provide preparedness assessment."
+
+    return dict(system_prompt=system_prompt, user_prompt=user_prompt,
+                response_schema=DisasterAssessment, cache_name="disaster",
+                helper="assess_disaster_preparedness")
+
+
+def _disaster_fallback() -> DisasterAssessment:
+    return DisasterAssessment(
+        preparedness_score=50,
+        risk_level="medium",
+        recommendations=["Please complete the assessment again"],
+        immediate_actions=["Create emergency supplies kit"],
+        supplies_needed=["Basic emergency supplies"]
+    )
+
 
 def assess_disaster_preparedness(disaster_type: str, responses: dict, location: str) -> DisasterAssessment:
     """Assess disaster preparedness based on questionnaire responses"""
     try:
-        system_prompt = (
-            "You are a disaster preparedness expert for Indian communities. "
-            "Analyze questionnaire responses and provide a preparedness score (0-100), "
-            "risk level assessment, and specific recommendations based on the disaster type and location."
-        )
-
-        user_prompt = f"Disaster type: {disaster_type}, Location: {location}, India. User responses: {json.dumps(responses)}. Provide preparedness assessment."
-
-        data = _generate_json(system_prompt, user_prompt, DisasterAssessment)
+        data = _generate_json(**_disaster_request(disaster_type, responses, location))
         return DisasterAssessment(**data)
 
     except Exception as e:
         logging.error(f"Failed to assess disaster preparedness: {e}")
-        return DisasterAssessment(
-            preparedness_score=50,
-            risk_level="medium",
-            recommendations=["Please complete the assessment again"],
-            immediate_actions=["Create emergency supplies kit"],
-            supplies_needed=["Basic emergency supplies"]
-        )
+        return _disaster_fallback()
+
+def _climate_advice_request(location: str, climate_data: dict = None) -> dict:
+    prompt = (
+        f"Provide climate adaptation and sustainable living advice for {location}, India. "
+        "Focus on practical, low-cost solutions for underserved communities in Indian context."
+    )
+    if climate_data:
+        prompt += f" Consider this weather data: {climate_data}"
+
+    return dict(system_prompt=prompt, user_prompt=prompt,
+                cache_name="climate_advice", helper="get_climate_advice")
+
 
 def get_climate_advice(location: str, climate_data: dict = None) -> str:
     """Get climate adaptation advice based on location and weather data"""
     try:
-        prompt = (
-            f"Provide climate adaptation and sustainable living advice for {location}, India. "
-            "Focus on practical, low-cost solutions for underserved communities in Indian context."
-        )
-        if climate_data:
-            prompt += f" Consider this weather data: {climate_data}"
-
-        return _generate_text(prompt, prompt)
+        return _generate_text(**_climate_advice_request(location, climate_data))
 
     except Exception as e:
         logging.error(f"Failed to get climate advice: {e}")
         return "Please check back later for climate recommendations."
 
 
-def get_agricultural_weather(location: str = "Central India") -> dict:
-    """Get agricultural weather and farming advice using Groq with Gemini fallback."""
-    try:
-        system_prompt = (
-            "You are an agricultural weather advisor for Indian farmers. "
-            "Provide current weather conditions, 3-day forecast, and specific farming advice. "
-            "Include temperature, humidity, wind, rainfall predictions, and actionable recommendations "
-            "for crop management, irrigation, and plant protection based on weather conditions."
-        )
+def _agricultural_weather_request(location: str = "Central India", days: int = 3) -> dict:
+    location = location if "india" in location.lower() else f"{location}, India"
+    system_prompt = (
+        "You are an agricultural weather advisor for Indian farmers. "
+        f"Provide current weather conditions, {days}-day forecast, and specific farming advice. "
+        "Include temperature, humidity, wind, rainfall predictions, and actionable recommendations "
+        "for crop management, irrigation, and plant protection based on weather conditions."
+    )
 
-        user_prompt = f"""Provide agricultural weather forecast and advice for {location}, India. 
+    user_prompt = f"""Provide agricultural weather forecast and advice for {location}. 
         
 Include:
 1. Current weather: temperature (°C), condition, wind speed (km/h), humidity (%), precipitation (mm), feels like temperature
-2. 3-day forecast with daily high/low temperatures, conditions, and expected rainfall
+2. {days}-day forecast with daily high/low temperatures, conditions, and expected rainfall
 3. Crop advice based on weather conditions
 4. Irrigation recommendations
 5. Plant protection advice
@@ -392,74 +979,114 @@ Format as JSON with:
 - humidity: number
 - precipitation: number
 - feels_like: number
-- forecast: array of 3 days with day, high, low, condition, icon, rain
+- forecast: array of {days} days with day, high, low, condition, icon, rain
 - crop_advice: string
 - irrigation_advice: string
 - protection_advice: string"""
 
-        return _generate_json(system_prompt, user_prompt)
+    return dict(system_prompt=system_prompt, user_prompt=user_prompt,
+                cache_name="agricultural_weather", helper="get_agricultural_weather")
+
+
+def _agricultural_weather_fallback(location: str, days: int = 3) -> dict:
+    # Return fallback data with some randomization
+    import random
+    temps = [26, 28, 30, 32, 35]
+    conditions = ['Sunny', 'Partly Cloudy', 'Cloudy', 'Light Rain']
+    day_names = ['Today', 'Tomorrow'] + [f'Day {day}' for day in range(3, days + 1)]
+    
+    return {
+        'current_temp': random.choice(temps),
+        'condition': random.choice(conditions),
+        'icon': 'cloudy',
+        'wind_speed': random.randint(8, 15),
+        'humidity': random.randint(55, 75),
+        'precipitation': random.randint(0, 5),
+        'feels_like': random.choice(temps) + 2,
+        'forecast': [
+            {
+                'day': day_name,
+                'high': random.choice(temps),
+                'low': random.choice(temps) - 6,
+                'condition': random.choice(conditions),
+                'icon': random.choice(['sunny', 'cloudy', 'rainy']),
+                'rain': random.randint(0, 12)
+            }
+            for day_name in day_names[:days]
+        ],
+        'crop_advice': f'Weather conditions in {location} are suitable for most crops. Monitor for changes.',
+        'irrigation_advice': 'Adjust irrigation based on rainfall patterns and soil moisture levels.',
+        'protection_advice': 'Protect crops from extreme weather. Use organic methods when possible.',
+        # Lets callers avoid caching made-up data.
+        'fallback': True
+    }
+
+
+@coalesced("agricultural_weather")
+def get_agricultural_weather(location: str = "Central India", days: int = 3) -> dict:
+    """Get agricultural weather and farming advice using Groq with Gemini fallback."""
+    try:
+        return _generate_json(**_agricultural_weather_request(location, days))
 
     except Exception as e:
         logging.error(f"Failed to get agricultural weather: {e}")
-        # Return fallback data with some randomization
-        import random
-        temps = [26, 28, 30, 32, 35]
-        conditions = ['Sunny', 'Partly Cloudy', 'Cloudy', 'Light Rain']
-        
-        return {
-            'current_temp': random.choice(temps),
-            'condition': random.choice(conditions),
-            'icon': 'cloudy',
-            'wind_speed': random.randint(8, 15),
-            'humidity': random.randint(55, 75),
-            'precipitation': random.randint(0, 5),
-            'feels_like': random.choice(temps) + 2,
-            'forecast': [
-                {
-                    'day': 'Today',
-                    'high': random.choice(temps),
-                    'low': random.choice(temps) - 6,
-                    'condition': random.choice(conditions),
-                    'icon': 'cloudy',
-                    'rain': random.randint(0, 8)
-                },
-                {
-                    'day': 'Tomorrow', 
-                    'high': random.choice(temps),
-                    'low': random.choice(temps) - 6,
-                    'condition': random.choice(conditions),
-                    'icon': 'rainy' if random.choice([True, False]) else 'sunny',
-                    'rain': random.randint(0, 12)
-                },
-                {
-                    'day': 'Day 3',
-                    'high': random.choice(temps),
-                    'low': random.choice(temps) - 6,
-                    'condition': random.choice(conditions),
-                    'icon': 'sunny' if random.choice([True, False]) else 'cloudy',
-                    'rain': random.randint(0, 6)
-                }
-            ],
-            'crop_advice': f'Weather conditions in {location} are suitable for most crops. Monitor for changes.',
-            'irrigation_advice': 'Adjust irrigation based on rainfall patterns and soil moisture levels.',
-            'protection_advice': 'Protect crops from extreme weather. Use organic methods when possible.'
-        }
+        return _agricultural_weather_fallback(location, days)
+
+
+CHAT_SYSTEM_PROMPT = (
+    "You are a helpful assistant for a community platform serving "
+    "underserved populations. Provide supportive, practical advice "
+    "focusing on health, education, climate action, and economic opportunities. "
+    "Be empathetic and culturally sensitive."
+)
+
+
+def _chat_request(message: str, context: str = "", helper: str = "general_chat_response") -> dict:
+    full_prompt = f"Context: {context}\nUser message: {message}" if context else message
+    return dict(system_prompt=CHAT_SYSTEM_PROMPT, user_prompt=full_prompt,
+                cache_name="chat", helper=helper)
 
 
 def general_chat_response(message: str, context: str = "") -> str:
     """General chat response for community platform"""
     try:
-        system_prompt = (
-            "You are a helpful assistant for a community platform serving "
-            "underserved populations. Provide supportive, practical advice "
-            "focusing on health, education, climate action, and economic opportunities. "
-            "Be empathetic and culturally sensitive."
-        )
-
-        full_prompt = f"Context: {context}\nUser message: {message}" if context else message
-
-        return _generate_text(system_prompt, full_prompt)
+        return _generate_text(**_chat_request(message, context))
 
     except Exception as e:
         logging.error(f"Failed to generate chat response: {e}")
         return "I'm having trouble responding right now. Please try again."
+
+
+def general_chat_stream(message: str, context: str = ""):
+    """Streaming variant of ``general_chat_response`` that yields text chunks."""
+    request = _chat_request(message, context)
+    sent = False
+    try:
+        for chunk in _stream_text(request["system_prompt"], request["user_prompt"],
+                                  cache_name=request["cache_name"]):
+            sent = True
+            yield chunk
+    except Exception as e:
+        logging.error(f"Failed to stream chat response: {e}")
+        if sent:
+            # A partial answer must not be saved as complete; stream_text reports the error.
+            raise
+        yield "I'm having trouble responding right now. Please try again."
+
+
+URGENT_CHAT_FALLBACK = ("I'm having trouble responding right now. If this is an emergency, "
+                        "call 112 immediately.")
+
+
+def urgent_chat_response(message: str, context: str = "") -> str:
+    """Chat response for latency-critical paths such as telemedicine support.
+
+    Uses the same prompt as ``general_chat_response`` but is listed in
+    ``AI_HEDGED_HELPERS`` so a slow primary provider is raced by the fallback.
+    """
+    try:
+        return _generate_text(**_chat_request(message, context, helper="urgent_chat_response"))
+
+    except Exception as e:
+        logging.error(f"Failed to generate urgent chat response: {e}")
+        return URGENT_CHAT_FALLBACK
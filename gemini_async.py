@@ -0,0 +1,418 @@
+"""Asyncio variants of the AI helpers in gemini.py.
+
+The sync helpers hold a worker thread for the whole LLM round trip. These
+helpers build exactly the same requests (and share the response cache,
+coalescing, circuit breakers and hedging settings) but await AsyncGroq and
+the google-genai async client instead.
+
+All provider I/O runs on one event loop per worker process, started on first
+use in a daemon thread. Flask runs each ``async def`` view in its own
+short-lived loop, so the helpers hand their work to that shared loop: one
+connection pool per provider, and identical in-flight calls from different
+requests are collapsed into one.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import json
+import logging
+import os
+import threading
+
+from google import genai
+from google.genai import types
+from groq import AsyncGroq
+
+import gemini
+import provider_health
+import stub_provider
+from coalesce import get_group
+from gemini import (
+    ClimateAdvice,
+    DisasterAssessment,
+    HealthAdvice,
+    JobMatch,
+    NutritionPlan,
+    URGENT_CHAT_FALLBACK,
+)
+
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+# Only touched from the AI loop.
+_groq_client = None
+_gemini_client = None
+
+
+def _ai_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_pid
+    with _loop_lock:
+        # A forked worker inherits the loop object but not its thread.
+        if _loop is None or _loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ai-loop", daemon=True).start()
+            _loop, _loop_pid = loop, os.getpid()
+        return _loop
+
+
+async def _on_ai_loop(coro):
+    """Await ``coro`` on the shared AI loop from any event loop.
+
+    Cancelling the caller cancels the work on the AI loop as well.
+    """
+    loop = _ai_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        return await coro
+    # Run in a copy of the caller's context so per-request state such as
+    # profiling timings follows the work onto the AI loop.
+    context = contextvars.copy_context()
+    return await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(_run_in_context(coro, context), loop)
+    )
+
+
+def run_in_background(coro) -> concurrent.futures.Future:
+    """Schedule ``coro`` on the shared AI loop without waiting for it."""
+    return asyncio.run_coroutine_threadsafe(coro, _ai_loop())
+
+
+async def _run_in_context(coro, context):
+    return await asyncio.get_running_loop().create_task(coro, context=context)
+
+
+def _get_groq_client():
+    global _groq_client
+    api_key = os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        return None
+    if _groq_client is None:
+        _groq_client = AsyncGroq(
+            api_key=api_key, timeout=gemini.PROVIDER_TIMEOUT_SECONDS, max_retries=0
+        )
+    return _groq_client
+
+
+def _get_gemini_client():
+    global _gemini_client
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    if _gemini_client is None:
+        _gemini_client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(timeout=int(gemini.PROVIDER_TIMEOUT_SECONDS * 1000)),
+        )
+    return _gemini_client.aio
+
+
+async def _agenerate_with_groq(system_prompt, user_prompt, response_schema=None, json_mode=False) -> str:
+    client = _get_groq_client()
+    if client is None:
+        raise RuntimeError("GROQ_API_KEY is not configured")
+
+    response = await client.chat.completions.create(
+        **gemini._groq_request(system_prompt, user_prompt, response_schema, json_mode)
+    )
+    return gemini._groq_text(response)
+
+
+async def _agenerate_with_gemini(system_prompt, user_prompt, response_schema=None) -> str:
+    client = _get_gemini_client()
+    if client is None:
+        raise RuntimeError("GEMINI_API_KEY is not configured")
+
+    response = await client.models.generate_content(
+        **gemini._gemini_request(system_prompt, user_prompt, response_schema)
+    )
+    if not response.text:
+        raise ValueError("Empty response from Gemini")
+    return response.text
+
+
+async def _run_blocking(fn, *args, **kwargs):
+    """Call blocking ``fn`` in a thread on the AI loop, inline on any other loop.
+
+    A request's own loop only holds up that request, and skipping the thread
+    hop keeps cache hits cheap; the shared AI loop must never wait on SQLite.
+    """
+    if asyncio.get_running_loop() is _loop:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+async def _agenerate_text(
+    system_prompt: str,
+    user_prompt: str,
+    response_schema=None,
+    json_mode: bool = False,
+    cache_name: str | None = None,
+    helper: str | None = None,
+) -> str:
+    """Async twin of ``gemini._generate_text``, with the same routing and caching."""
+    ttl = gemini._cache_ttl(cache_name)
+    request_key = gemini._request_key(cache_name, system_prompt, user_prompt, response_schema, json_mode)
+    if ttl > 0:
+        cached = await _run_blocking(gemini._cached_response, request_key, cache_name=cache_name)
+        if cached is not None:
+            return cached
+
+    async def call_providers():
+        if ttl > 0:
+            cached = await asyncio.to_thread(gemini._cached_response, request_key, record=False)
+            if cached is not None:
+                return cached
+
+        generators = {
+            "groq": (_get_groq_client, lambda: _agenerate_with_groq(
+                system_prompt, user_prompt, response_schema, json_mode
+            )),
+            "gemini": (_get_gemini_client, lambda: _agenerate_with_gemini(
+                system_prompt, user_prompt, response_schema
+            )),
+            "stub": (lambda: stub_provider, lambda: stub_provider.agenerate(
+                system_prompt, user_prompt, response_schema, json_mode
+            )),
+        }
+        errors = []
+        candidates = []
+        for provider_name in provider_health.route(gemini.PROVIDER_PRIORITY):
+            configured, generate = generators[provider_name]
+            if configured() is None:
+                errors.append(f"{provider_name}: API key is not configured")
+            else:
+                candidates.append((provider_name, generate))
+
+        if gemini._hedging_enabled(helper) and len(candidates) > 1:
+            hedged, candidates = candidates[:2], candidates[2:]
+            try:
+                provider_name, result = await _agenerate_hedged(helper, hedged)
+                return await asyncio.to_thread(
+                    gemini._remember_response, request_key, ttl, provider_name, result, response_schema, json_mode
+                )
+            except Exception as exc:
+                errors.append(str(exc))
+                logging.warning("Hedged AI request failed: %s", exc)
+
+        for provider_name, generate in candidates:
+            if not provider_health.get_health(provider_name).breaker.allow():
+                errors.append(f"{provider_name}: circuit open")
+                continue
+            try:
+                result = await provider_health.acall_with_retries(provider_name, generate)
+                return await asyncio.to_thread(
+                    gemini._remember_response, request_key, ttl, provider_name, result, response_schema, json_mode
+                )
+            except Exception as exc:
+                errors.append(f"{provider_name}: {exc}")
+                logging.warning("AI provider %s failed: %s", provider_name, exc)
+        raise RuntimeError("All AI providers failed: " + "; ".join(errors))
+
+    return await _on_ai_loop(
+        get_group("ai").do_async(request_key, call_providers, shared=ttl > 0)
+    )
+
+
+async def _agenerate_hedged(helper: str, candidates: list) -> tuple[str, str]:
+    """Async twin of ``gemini._generate_hedged``; the losing request is cancelled."""
+    (primary_name, primary), (hedge_name, hedge) = candidates
+    gemini._count_hedge(helper, "requests")
+    pending = {}
+    errors = []
+    try:
+        if provider_health.get_health(primary_name).breaker.allow():
+            pending[asyncio.ensure_future(
+                provider_health.acall_with_retries(primary_name, primary, 0)
+            )] = primary_name
+            done, _ = await asyncio.wait(pending, timeout=gemini._hedge_delay(primary_name))
+            for task in done:
+                if task.exception() is None:
+                    return primary_name, task.result()
+                errors.append(f"{primary_name}: {task.exception()}")
+                del pending[task]
+        else:
+            errors.append(f"{primary_name}: circuit open")
+
+        if provider_health.get_health(hedge_name).breaker.allow():
+            if pending:
+                gemini._count_hedge(helper, "fired")
+            pending[asyncio.ensure_future(
+                provider_health.acall_with_retries(hedge_name, hedge, 0)
+            )] = hedge_name
+        else:
+            errors.append(f"{hedge_name}: circuit open")
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider_name = pending.pop(task)
+                if task.exception() is None:
+                    if provider_name == hedge_name and primary_name in pending.values():
+                        gemini._count_hedge(helper, "won")
+                    return provider_name, task.result()
+                errors.append(f"{provider_name}: {task.exception()}")
+        raise RuntimeError("Hedged providers failed: " + "; ".join(errors))
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _agenerate_json(
+    system_prompt: str,
+    user_prompt: str,
+    response_schema=None,
+    cache_name: str | None = None,
+    helper: str | None = None,
+):
+    raw = await _agenerate_text(
+        system_prompt,
+        user_prompt,
+        response_schema=response_schema,
+        json_mode=True,
+        cache_name=cache_name,
+        helper=helper,
+    )
+    return json.loads(gemini._extract_json(raw))
+
+
+async def aget_health_advice(symptoms: str, age: int = None, gender: str = None) -> HealthAdvice:
+    """Async variant of ``gemini.get_health_advice``."""
+    try:
+        data = await _agenerate_json(**gemini._health_advice_request(symptoms, age, gender))
+        return HealthAdvice(**data)
+
+    except Exception as e:
+        logging.error(f"Failed to get health advice: {e}")
+        return gemini._health_advice_fallback()
+
+
+async def amatch_job_to_skills(job_description: str, user_skills: list[str]) -> JobMatch:
+    """Async variant of ``gemini.match_job_to_skills``."""
+    try:
+        data = await _agenerate_json(**gemini._job_match_request(job_description, user_skills))
+        return JobMatch(**data)
+
+    except Exception as e:
+        logging.error(f"Failed to match job to skills: {e}")
+        return gemini._job_match_fallback()
+
+
+async def _amatch_job_batch(job_descriptions: list[str], user_skills: list[str]) -> list[JobMatch]:
+    if len(job_descriptions) == 1:
+        return [await amatch_job_to_skills(job_descriptions[0], user_skills)]
+    try:
+        request = gemini._job_match_batch_request(job_descriptions, user_skills)
+        return request["response_schema"](**await _agenerate_json(**request)).matches
+    except Exception as e:
+        if not gemini._should_split(e):
+            logging.error(f"Failed to match a batch of {len(job_descriptions)} jobs: {e}")
+            return [gemini._job_match_fallback() for _ in job_descriptions]
+        logging.warning(f"Splitting a batch of {len(job_descriptions)} jobs: {e}")
+        half = len(job_descriptions) // 2
+        first, second = await asyncio.gather(
+            _amatch_job_batch(job_descriptions[:half], user_skills),
+            _amatch_job_batch(job_descriptions[half:], user_skills),
+        )
+        return first + second
+
+
+async def amatch_jobs_to_skills(job_descriptions: list[str], user_skills: list[str]) -> list[JobMatch]:
+    """Async variant of ``gemini.match_jobs_to_skills``."""
+    results = await asyncio.gather(*(
+        _amatch_job_batch(batch, user_skills)
+        for batch in gemini._job_match_batches(job_descriptions, user_skills)
+    ))
+    return [match for batch in results for match in batch]
+
+
+async def aget_nutrition_advice(dietary_preferences: str, health_conditions: str = None, budget: str = "low") -> NutritionPlan:
+    """Async variant of ``gemini.get_nutrition_advice``."""
+    try:
+        data = await _agenerate_json(**gemini._nutrition_request(dietary_preferences, health_conditions, budget))
+        return NutritionPlan(**data)
+
+    except Exception as e:
+        logging.error(f"Failed to get nutrition advice: {e}")
+        return gemini._nutrition_fallback()
+
+
+def _without_response_cache(request: dict, cache: bool) -> dict:
+    # Callers with their own cache (swr_cache.py) need every fetch to reach a provider.
+    return request if cache else {**request, "cache_name": None}
+
+
+async def aget_india_weather(location: str = "New Delhi", cache: bool = True) -> ClimateAdvice:
+    """Async variant of ``gemini.get_india_weather``.
+
+    ``cache=False`` skips the AI response cache.
+    """
+    try:
+        request = _without_response_cache(gemini._india_weather_request(location), cache)
+        raw = await _agenerate_text(json_mode=True, **request)
+        advice = ClimateAdvice(**json.loads(gemini._extract_json(raw)))
+        advice._provider = raw.provider
+        return advice
+
+    except Exception as e:
+        logging.error(f"Failed to get India weather: {e}")
+        return gemini._india_weather_fallback()
+
+
+async def aassess_disaster_preparedness(disaster_type: str, responses: dict, location: str) -> DisasterAssessment:
+    """Async variant of ``gemini.assess_disaster_preparedness``."""
+    try:
+        data = await _agenerate_json(**gemini._disaster_request(disaster_type, responses, location))
+        return DisasterAssessment(**data)
+
+    except Exception as e:
+        logging.error(f"Failed to assess disaster preparedness: {e}")
+        return gemini._disaster_fallback()
+
+
+async def aget_climate_advice(location: str, climate_data: dict = None) -> str:
+    """Async variant of ``gemini.get_climate_advice``."""
+    try:
+        return await _agenerate_text(**gemini._climate_advice_request(location, climate_data))
+
+    except Exception as e:
+        logging.error(f"Failed to get climate advice: {e}")
+        return "Please check back later for climate recommendations."
+
+
+async def aget_agricultural_weather(location: str = "Central India", days: int = 3, cache: bool = True) -> dict:
+    """Async variant of ``gemini.get_agricultural_weather``.
+
+    ``cache=False`` skips the AI response cache.
+    """
+    try:
+        return await _agenerate_json(
+            **_without_response_cache(gemini._agricultural_weather_request(location, days), cache)
+        )
+
+    except Exception as e:
+        logging.error(f"Failed to get agricultural weather: {e}")
+        return gemini._agricultural_weather_fallback(location, days)
+
+
+async def ageneral_chat_response(message: str, context: str = "") -> str:
+    """Async variant of ``gemini.general_chat_response``."""
+    try:
+        return await _agenerate_text(**gemini._chat_request(message, context))
+
+    except Exception as e:
+        logging.error(f"Failed to generate chat response: {e}")
+        return "I'm having trouble responding right now. Please try again."
+
+
+async def aurgent_chat_response(message: str, context: str = "") -> str:
+    """Async variant of ``gemini.urgent_chat_response``."""
+    try:
+        return await _agenerate_text(**gemini._chat_request(message, context, helper="urgent_chat_response"))
+
+    except Exception as e:
+        logging.error(f"Failed to generate urgent chat response: {e}")
+        return URGENT_CHAT_FALLBACK
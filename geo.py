@@ -0,0 +1,69 @@
+"""Distance helpers for location search.
+
+Queries are narrowed with a latitude/longitude bounding box (served by the
+composite index on ``health_services``). Exact great-circle distances are then
+computed for the remaining candidates in one NumPy pass.
+"""
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> tuple[float, float, float | None, float | None]:
+    """Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle.
+
+    The longitude bounds are ``None`` when the box would wrap the
+    antimeridian or reach a pole, so callers should only filter on latitude.
+    """
+    delta_lat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+    # Use the latitude nearest the pole, where a degree of longitude is shortest.
+    widest = math.radians(max(abs(min_lat), abs(max_lat)))
+    delta_lng = radius_km / (KM_PER_DEGREE_LAT * math.cos(widest))
+    min_lng, max_lng = lng - delta_lng, lng + delta_lng
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def haversine_km(lat: float, lng: float, lats, lngs) -> np.ndarray:
+    """Vectorized great-circle distance from one point to many, in kilometres."""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    delta_lat = lat2 - lat1
+    delta_lng = np.radians(np.asarray(lngs, dtype=float) - lng)
+    a = np.sin(delta_lat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(delta_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def within_radius(rows, lat: float, lng: float, radius_km: float,
+                  lat_of=lambda row: row.latitude, lng_of=lambda row: row.longitude):
+    """Return (row, distance_km) pairs within ``radius_km``, nearest first."""
+    if not rows:
+        return []
+    distances = haversine_km(lat, lng, [lat_of(row) for row in rows], [lng_of(row) for row in rows])
+    order = np.argsort(distances, kind="stable")
+    return [(rows[i], float(distances[i])) for i in order if distances[i] <= radius_km]
+
+
+def nearest(fetch_box, lat: float, lng: float, k: int, max_radius_km: float,
+            start_radius_km: float = 2.0, **accessors):
+    """Exact k-nearest search by growing a bounding box.
+
+    ``fetch_box(min_lat, max_lat, min_lng, max_lng)`` must return the rows
+    inside the box. The box doubles until it holds ``k`` rows within its
+    inscribed radius or reaches ``max_radius_km``. Every row within that
+    radius is inside the box, so the first ``k`` are the true nearest.
+    """
+    radius = min(start_radius_km, max_radius_km)
+    while True:
+        matches = within_radius(fetch_box(*bounding_box(lat, lng, radius)), lat, lng, radius, **accessors)
+        if len(matches) >= k or radius >= max_radius_km:
+            return matches[:k]
+        radius = min(radius * 2, max_radius_km)
@@ -0,0 +1,29 @@
+"""Gunicorn settings and hooks for multiprocess Prometheus metrics.
+
+Gunicorn loads this file automatically from the working directory. Workers
+are threaded: live update streams and in-flight AI requests each hold a
+thread, and a sync worker would be taken over by a single open dashboard.
+
+When PROMETHEUS_MULTIPROC_DIR is set, stale metric files from a previous run
+are removed at startup and files of exited workers are merged away.
+"""
+import glob
+import os
+
+
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 100))
+
+
+def on_starting(server):
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,191 @@
+"""Local BM25 ranking of job listings against a list of skills.
+
+Asking the LLM "which of these jobs fit me" costs one multi-second call per
+job. This index scores a skill list against every ``JobListing`` in a few
+milliseconds, so the LLM only has to evaluate the best few.
+
+Jobs are tokenised into one weighted bag of words: skills_required counts
+three times, the title twice and the description once (a simple BM25F). The
+per-term BM25 weights are precomputed into a term-major sparse matrix stored
+as plain NumPy CSC arrays (``indptr``, ``indices``, ``data``). A query sums
+the posting rows of its terms with one ``np.bincount``.
+
+Each worker keeps its own index in memory. Committed job inserts, updates and
+deletes bump a generation key in the shared cache, and every worker rebuilds
+on its next query after the generation changes.
+"""
+import functools
+import logging
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache_store import shared_cache
+from models import JobListing
+
+
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = (("skills_required", 3), ("title", 2), ("description", 1))
+GENERATION_NAMESPACE = "job_index"
+GENERATION_TTL = 365 * 86400
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or our the to we with you your "
+    "will who this that job role work".split()
+)
+
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+
+@functools.lru_cache(maxsize=100_000)
+def _term(token: str) -> str | None:
+    token = token.rstrip(".")
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    return token if token and token not in _STOPWORDS else None
+
+
+def tokenize(text: str | None) -> list[str]:
+    """Lower-case word tokens with a light plural strip, minus stopwords."""
+    return [term for term in map(_term, _TOKEN.findall((text or "").casefold())) if term]
+
+
+@dataclass
+class _Matrix:
+    job_ids: np.ndarray
+    vocabulary: dict[str, int]
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+
+
+def _build(rows) -> _Matrix:
+    vocabulary: dict[str, int] = {}
+    job_ids, token_columns, field_weights, field_lengths = [], [], [], []
+    for row in rows:
+        job_ids.append(row.id)
+        for field, weight in FIELD_WEIGHTS:
+            tokens = tokenize(getattr(row, field))
+            token_columns.extend([vocabulary.setdefault(token, len(vocabulary)) for token in tokens])
+            field_weights.append(weight)
+            field_lengths.append(len(tokens))
+
+    count = len(job_ids)
+    field_lengths = np.array(field_lengths, dtype=np.int64)
+    token_rows = np.repeat(np.repeat(np.arange(count, dtype=np.int64), len(FIELD_WEIGHTS)), field_lengths)
+    token_weights = np.repeat(np.array(field_weights, dtype=np.float64), field_lengths)
+    # One key per (term, job) pair in term-major order, so the sorted unique
+    # keys are already the CSC postings: the postings of term t are
+    # indptr[t]:indptr[t + 1].
+    keys, inverse = np.unique(np.array(token_columns, dtype=np.int64) * max(count, 1) + token_rows,
+                              return_inverse=True)
+    tf = np.bincount(inverse, weights=token_weights)
+    columns, rows_ = np.divmod(keys, max(count, 1))
+
+    lengths = np.bincount(token_rows, weights=token_weights, minlength=count)
+    average = lengths.mean() if count and lengths.mean() > 0 else 1.0
+    df = np.bincount(columns, minlength=len(vocabulary))
+    idf = np.log(1 + (count - df + 0.5) / (df + 0.5))
+    norm = K1 * (1 - B + B * lengths / average)
+    data = tf * (K1 + 1) / (tf + norm[rows_]) * idf[columns]
+    indptr = np.concatenate(([0], np.cumsum(df)))
+    return _Matrix(np.array(job_ids, dtype=np.int64), vocabulary, indptr, rows_, data)
+
+
+class JobIndex:
+    """Lazily (re)built BM25 index over every job listing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix: _Matrix | None = None
+        self._generation = None
+        self.builds = 0
+        self.last_build_ms = None
+
+    def _current(self) -> _Matrix:
+        generation = shared_cache.get(GENERATION_NAMESPACE, "generation", record=False)
+        if self._matrix is not None and generation == self._generation:
+            return self._matrix
+        # While one thread rebuilds, the others keep ranking with the old matrix.
+        if not self._lock.acquire(blocking=self._matrix is None):
+            return self._matrix
+        try:
+            if self._matrix is None or generation != self._generation:
+                started = time.perf_counter()
+                rows = JobListing.query.with_entities(
+                    JobListing.id, JobListing.title, JobListing.description, JobListing.skills_required
+                ).all()
+                self._matrix = _build(rows)
+                self._generation = generation
+                self.builds += 1
+                self.last_build_ms = round((time.perf_counter() - started) * 1000, 1)
+                logging.info("Built job index over %d jobs in %s ms", len(rows), self.last_build_ms)
+            return self._matrix
+        finally:
+            self._lock.release()
+
+    def rank(self, skills: list[str], limit: int = 10) -> list[tuple[int, float]]:
+        """Return (job id, score) for the best ``limit`` jobs, best first.
+
+        Jobs sharing no term with ``skills`` are left out.
+        """
+        matrix = self._current()
+        columns = {matrix.vocabulary[t] for skill in skills for t in tokenize(skill) if t in matrix.vocabulary}
+        if not columns or not len(matrix.job_ids):
+            return []
+        spans = [np.arange(matrix.indptr[c], matrix.indptr[c + 1]) for c in columns]
+        positions = np.concatenate(spans)
+        scores = np.bincount(matrix.indices[positions], weights=matrix.data[positions],
+                             minlength=len(matrix.job_ids))
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        best = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(matrix.job_ids[row]), round(float(scores[row]), 4)) for row in best]
+
+    def stats(self) -> dict:
+        matrix = self._matrix
+        return {
+            "jobs": int(len(matrix.job_ids)) if matrix else None,
+            "terms": len(matrix.vocabulary) if matrix else None,
+            "builds": self.builds,
+            "last_build_ms": self.last_build_ms,
+        }
+
+
+job_index = JobIndex()
+
+
+def _mark_changed(mapper, connection, target):
+    Session.object_session(target).info["job_index_changed"] = True
+
+
+def invalidate():
+    """Make every worker rebuild its index on the next query.
+
+    Call this after bulk writes that skip ORM events.
+    """
+    shared_cache.set(GENERATION_NAMESPACE, "generation", uuid.uuid4().hex, GENERATION_TTL)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_generation(session):
+    if session.info.pop("job_index_changed", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop("job_index_changed", None)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(JobListing, _event, _mark_changed)
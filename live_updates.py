@@ -0,0 +1,150 @@
+"""Push weather updates and alerts to open dashboards over Server-Sent Events.
+
+Browsers subscribe to channels such as ``weather:city:new-delhi`` and
+``alerts`` and keep one connection open instead of polling. ``publish``
+appends to the shared cache's event log, so an event raised in any worker
+reaches subscribers in every worker on the host. Each worker runs one
+poller thread, which reads new events every ``LIVE_UPDATES_POLL_SECONDS``
+while it has subscribers and hands them to per-connection queues.
+
+Connections hold a worker thread (run gunicorn with ``gthread``), so each
+worker accepts at most ``LIVE_UPDATES_MAX_SUBSCRIBERS``. Beyond that,
+``stream`` raises ``Overloaded`` and clients fall back to polling.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from cache_store import shared_cache
+from streaming import sse_event
+
+
+LIVE_UPDATES_POLL_SECONDS = float(os.environ.get("LIVE_UPDATES_POLL_SECONDS", 1))
+LIVE_UPDATES_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_UPDATES_MAX_SUBSCRIBERS", 500))
+HEARTBEAT_SECONDS = 20
+QUEUE_SIZE = 100
+
+
+class Overloaded(Exception):
+    """This worker already holds ``LIVE_UPDATES_MAX_SUBSCRIBERS`` connections."""
+
+
+class Hub:
+    """Per-worker fan-out from the shared event log to subscriber queues."""
+
+    def __init__(self, max_subscribers: int = LIVE_UPDATES_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._channels: dict[str, set[queue.Queue]] = defaultdict(set)
+        self._subscribers = 0
+        self._lock = threading.Lock()
+        self._poller_pid = None
+        self._last_id = 0
+        self._counts = {"published": 0, "delivered": 0, "dropped": 0, "rejected": 0}
+
+    def publish(self, channel: str, event: str, data):
+        shared_cache.publish(channel, {"event": event, "data": data})
+        self._counts["published"] += 1
+
+    def _ensure_poller(self):
+        # A forked worker inherits the flag but not the thread.
+        if self._poller_pid != os.getpid():
+            self._poller_pid = os.getpid()
+            self._last_id = shared_cache.last_event_id()
+            threading.Thread(target=self._poll, name="live-updates", daemon=True).start()
+
+    def _poll(self):
+        while True:
+            time.sleep(LIVE_UPDATES_POLL_SECONDS)
+            if not self._subscribers:
+                continue
+            try:
+                for event_id, channel, payload in shared_cache.events_since(self._last_id):
+                    if event_id <= self._last_id:
+                        # subscribe() moved past it while this read was running.
+                        continue
+                    self._last_id = event_id
+                    self._deliver(channel, (payload["event"], payload["data"]))
+            except Exception as exc:
+                logging.warning("Live update poll failed: %s", exc)
+
+    def _deliver(self, channel: str, message):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+                self._counts["delivered"] += 1
+            except queue.Full:
+                # A stalled client loses updates instead of growing memory.
+                self._counts["dropped"] += 1
+
+    def subscribe(self, channels) -> queue.Queue:
+        subscriber = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                self._counts["rejected"] += 1
+                raise Overloaded(f"{self._subscribers} live update subscribers")
+            self._ensure_poller()
+            if not self._subscribers:
+                # Nothing was read while idle; start from now rather than replay the log.
+                self._last_id = shared_cache.last_event_id()
+            self._subscribers += 1
+            for channel in channels:
+                self._channels[channel].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue, channels):
+        with self._lock:
+            self._subscribers -= 1
+            for channel in channels:
+                self._channels[channel].discard(subscriber)
+                if not self._channels[channel]:
+                    del self._channels[channel]
+
+    def stream(self, channels, initial=(), on_heartbeat=None):
+        """Yield SSE frames for ``channels``, starting with ``initial`` (event, data) pairs.
+
+        ``on_heartbeat`` runs every ``HEARTBEAT_SECONDS`` while the client
+        stays connected. Raises ``Overloaded`` when the worker is already full.
+        """
+        if self._subscribers >= self.max_subscribers:
+            self._counts["rejected"] += 1
+            raise Overloaded(f"{self._subscribers} live update subscribers")
+        channels = list(channels)
+
+        def frames():
+            # Subscribe once streaming starts: a generator that never starts never runs its finally.
+            try:
+                subscriber = self.subscribe(channels)
+            except Overloaded:
+                yield sse_event({"error": "Too many live connections"}, event="error")
+                return
+            try:
+                for event, data in initial:
+                    yield sse_event(data, event=event)
+                next_heartbeat = time.monotonic() + HEARTBEAT_SECONDS
+                while True:
+                    try:
+                        event, data = subscriber.get(timeout=max(0.0, next_heartbeat - time.monotonic()))
+                        yield sse_event(data, event=event)
+                    except queue.Empty:
+                        pass
+                    if time.monotonic() >= next_heartbeat:
+                        next_heartbeat = time.monotonic() + HEARTBEAT_SECONDS
+                        # Comment frames keep proxies from closing an idle stream.
+                        yield ": keepalive\n\n"
+                        if on_heartbeat is not None:
+                            on_heartbeat()
+            finally:
+                self.unsubscribe(subscriber, channels)
+
+        return frames()
+
+    def stats(self) -> dict:
+        return {**self._counts, "subscribers": self._subscribers, "channels": len(self._channels)}
+
+
+hub = Hub()
@@ -0,0 +1,154 @@
+"""Prometheus metrics for HTTP requests, the database pool, AI providers and Stripe.
+
+Gunicorn workers are separate processes, so when ``PROMETHEUS_MULTIPROC_DIR``
+is set each worker writes its samples to files in that directory and
+``/metrics`` aggregates them across every worker. ``gunicorn.conf.py`` empties the
+directory at startup and cleans up after workers that exit. Without the
+variable (e.g. ``python main.py``), metrics cover the single process.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+
+AI_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "communigrow_http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ["blueprint", "route", "method"],
+)
+HTTP_REQUESTS = Counter(
+    "communigrow_http_requests_total",
+    "HTTP requests handled, by response status.",
+    ["blueprint", "route", "method", "status"],
+)
+AI_PROVIDER_SECONDS = Histogram(
+    "communigrow_ai_provider_request_duration_seconds",
+    "Latency of individual AI provider attempts.",
+    ["provider", "outcome"],
+    buckets=AI_BUCKETS,
+)
+AI_PROVIDER_FAILURES = Counter(
+    "communigrow_ai_provider_failures_total",
+    "AI provider attempts that raised an error.",
+    ["provider"],
+)
+AI_FALLBACKS = Counter(
+    "communigrow_ai_fallbacks_total",
+    "AI requests answered by a provider other than the first choice.",
+    ["provider"],
+)
+CACHE_LOOKUPS = Counter(
+    "communigrow_cache_lookups_total",
+    "Cache lookups by cache name and result (hit, stale or miss).",
+    ["cache", "result"],
+)
+DB_POOL_CHECKOUTS = Counter(
+    "communigrow_db_pool_checkouts_total",
+    "Connections checked out of the SQLAlchemy pool.",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "communigrow_db_pool_checked_out",
+    "Connections currently checked out of the SQLAlchemy pool.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "communigrow_db_pool_overflow",
+    "Connections open beyond the SQLAlchemy pool size.",
+    multiprocess_mode="livesum",
+)
+STRIPE_REQUEST_SECONDS = Histogram(
+    "communigrow_stripe_request_duration_seconds",
+    "Latency of Stripe API calls.",
+    ["operation", "outcome"],
+)
+
+
+def observe_provider_call(provider: str, seconds: float, ok: bool):
+    AI_PROVIDER_SECONDS.labels(provider, "success" if ok else "failure").observe(seconds)
+    if not ok:
+        AI_PROVIDER_FAILURES.labels(provider).inc()
+
+
+def record_fallback(provider: str):
+    AI_FALLBACKS.labels(provider).inc()
+
+
+def record_cache_lookup(cache: str, hit: bool, stale: bool = False):
+    CACHE_LOOKUPS.labels(cache, "stale" if stale else "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def time_stripe(operation: str):
+    """Time a Stripe API call, labelled by whether it raised."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        STRIPE_REQUEST_SECONDS.labels(operation, outcome).observe(time.perf_counter() - started)
+
+
+def _update_pool_gauges(pool):
+    checked_out = getattr(pool, "checkedout", None)
+    overflow = getattr(pool, "overflow", None)
+    if checked_out is not None:
+        DB_POOL_CHECKED_OUT.set(checked_out())
+    if overflow is not None:
+        DB_POOL_OVERFLOW.set(max(0, overflow()))
+
+
+def init_app(app, db):
+    """Record request latency for ``app`` and pool usage for ``db``'s engine."""
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.inc()
+        _update_pool_gauges(engine.pool)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        _update_pool_gauges(engine.pool)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            blueprint = request.blueprint or "app"
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(blueprint, route, request.method).observe(
+                time.perf_counter() - started
+            )
+            HTTP_REQUESTS.labels(blueprint, route, request.method, response.status_code).inc()
+        return response
+
+
+def metrics_response() -> Response:
+    """Render every metric, aggregated across workers in multiprocess mode."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,291 @@
+"""Versioned schema migrations and a query-plan check for hot queries.
+
+``db.create_all()`` creates missing tables but never changes existing ones, so
+an index added to models.py would not reach a database created before it.
+Each migration below runs once per database and is recorded in the
+``schema_migrations`` table. app.py applies pending migrations at startup.
+
+Migrations must be safe to run on a database that already has their changes,
+because a fresh database gets every index from ``create_all`` first. Index
+DDL therefore uses ``IF NOT EXISTS``. Each migration spells out its own DDL
+instead of reading models.py, so it does the same thing whenever it runs;
+never edit a migration that has shipped, add a new one.
+
+On PostgreSQL an advisory lock keeps concurrently starting workers from
+running the same migration twice. On SQLite they take turns on a lock file
+next to the database, because pysqlite runs DDL outside the transaction. A
+worker that still finds the database locked by some other writer retries,
+and skips whatever was applied meanwhile.
+
+    python migrations.py                # apply pending migrations
+    python migrations.py --status       # list applied and pending migrations
+    python migrations.py --check-plans  # EXPLAIN hot queries, fail on table scans
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+
+# Arbitrary constant shared by every worker taking the PostgreSQL advisory lock.
+ADVISORY_LOCK_KEY = 74_310_015
+# Each attempt also waits out SQLite's own 5 second busy timeout.
+SQLITE_LOCK_ATTEMPTS = 5
+SQLITE_LOCK_RETRY_SECONDS = 1
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: object
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Register ``fn(conn)`` as schema migration ``version``."""
+    def register(fn):
+        if any(existing.version == version for existing in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append(Migration(version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return register
+
+
+def create_index(conn, name: str, table: str, *columns: str):
+    """Create index ``name`` on ``table`` unless it already exists."""
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+def drop_indexes(conn, *names: str):
+    """Drop the named indexes, if present."""
+    for name in names:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+@migration(1, "Location index for the nearby facility search")
+def _health_service_location(conn):
+    create_index(conn, "ix_health_service_active_lat_lng", "health_service", "is_active", "latitude", "longitude")
+
+
+@migration(2, "Composite indexes for hot list and filter queries")
+def _hot_query_indexes(conn):
+    create_index(conn, "ix_food_listing_category_available", "food_listing", "category", "is_available")
+    create_index(conn, "ix_food_listing_available_created", "food_listing", "is_available", "created_at")
+    create_index(conn, "ix_job_listing_created", "job_listing", "created_at")
+    create_index(conn, "ix_skill_listing_created", "skill_listing", "created_at")
+    create_index(conn, "ix_telemedicine_session_created", "telemedicine_session", "created_at")
+    create_index(conn, "ix_weather_alert_active_created", "weather_alert", "is_active", "created_at")
+    create_index(conn, "ix_chat_session_session_created", "chat_session", "session_id", "created_at")
+    create_index(conn, "ix_health_service_active_type", "health_service", "is_active", "service_type")
+
+
+@migration(3, "Indexes in keyset order for paginated listings and facilities")
+def _keyset_indexes(conn):
+    # Replaces migration 2's ix_food_listing_category_available with one in keyset order.
+    drop_indexes(conn, "ix_food_listing_category_available")
+    create_index(conn, "ix_food_listing_category_available_created", "food_listing",
+                 "category", "is_available", "created_at")
+    create_index(conn, "ix_health_service_active_id", "health_service", "is_active", "id")
+
+
+@migration(4, "Full-text search index over jobs, skills, courses and food listings")
+def _search_index(conn):
+    import search
+
+    search.install(conn)
+    search.rebuild(conn)
+
+
+def _applied(conn) -> set[int]:
+    return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+@contextmanager
+def _sqlite_migration_lock(engine):
+    """Hold an exclusive lock file next to a SQLite database; no-op elsewhere."""
+    path = engine.url.database
+    if engine.dialect.name != "sqlite" or fcntl is None or not path or path == ":memory:":
+        yield
+        return
+    with open(f"{path}.migrate.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _apply_pending(engine) -> list[int]:
+    applied_now = []
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        schema_migrations.create(conn, checkfirst=True)
+        applied = _applied(conn)
+        for step in MIGRATIONS:
+            if step.version in applied:
+                continue
+            step.apply(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=step.version, description=step.description,
+                applied_at=datetime.utcnow(),
+            ))
+            logging.info("Applied schema migration %s: %s", step.version, step.description)
+            applied_now.append(step.version)
+    return applied_now
+
+
+def upgrade(engine) -> list[int]:
+    """Apply pending migrations in version order and return their versions."""
+    for attempt in range(1, SQLITE_LOCK_ATTEMPTS + 1):
+        try:
+            with _sqlite_migration_lock(engine):
+                return _apply_pending(engine)
+        except IntegrityError:
+            # Another worker recorded the same migration first. The DDL is
+            # idempotent, so its result is the same as ours.
+            logging.info("Schema migrations were applied concurrently by another process")
+            return []
+        except OperationalError as exc:
+            # Another process is writing to the SQLite file. The DDL is
+            # idempotent and the version rows were rolled back, so retry;
+            # the retry re-reads what has been applied in the meantime.
+            if engine.dialect.name != "sqlite" or "locked" not in str(exc) or attempt == SQLITE_LOCK_ATTEMPTS:
+                raise
+            logging.info("Database is locked by another process; retrying migrations (%s)", attempt)
+            time.sleep(SQLITE_LOCK_RETRY_SECONDS * attempt)
+
+
+def status(engine) -> list[tuple[Migration, bool]]:
+    with engine.connect() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        conn.commit()
+        applied = _applied(conn)
+    return [(step, step.version in applied) for step in MIGRATIONS]
+
+
+def hot_queries():
+    """Statements the busiest pages run, named after the view that runs them."""
+    from pagination import keyset_filter
+    from models import (ChatSession, FoodListing, HealthService, JobListing,
+                        SkillListing, TelemedicineSession, WeatherAlert)
+
+    return {
+        "climate.dashboard alerts": select(WeatherAlert).where(WeatherAlert.is_active.is_(True))
+            .order_by(WeatherAlert.created_at.desc()),
+        "food.index recent listings": select(FoodListing).where(FoodListing.is_available.is_(True))
+            .order_by(FoodListing.created_at.desc()).limit(6),
+        "food.marketplace by category": select(FoodListing).where(
+            FoodListing.category == "marketplace", FoodListing.is_available.is_(True))
+            .order_by(FoodListing.created_at.desc(), FoodListing.id.desc()).limit(25),
+        "skills.jobs keyset page": select(JobListing).where(
+            keyset_filter((JobListing.created_at, JobListing.id), (datetime(2026, 1, 1), 1)))
+            .order_by(JobListing.created_at.desc(), JobListing.id.desc()).limit(21),
+        "skills.index recent jobs": select(JobListing).order_by(JobListing.created_at.desc()).limit(5),
+        "skills.index recent skills": select(SkillListing).order_by(SkillListing.created_at.desc()).limit(5),
+        "health.telemedicine recent sessions": select(TelemedicineSession)
+            .order_by(TelemedicineSession.created_at.desc()).limit(5),
+        "health chat history": select(ChatSession).where(ChatSession.session_id == "session")
+            .order_by(ChatSession.created_at),
+        "health.get_health_services page": select(HealthService).where(
+            HealthService.is_active.is_(True), HealthService.id > 100)
+            .order_by(HealthService.id).limit(101),
+        "health services by type": select(HealthService).where(
+            HealthService.is_active.is_(True), HealthService.service_type == "hospital"),
+        "health.get_nearby_facilities box": select(HealthService).where(
+            HealthService.is_active.is_(True),
+            HealthService.latitude.between(28.5, 28.7),
+            HealthService.longitude.between(77.1, 77.3)),
+    }
+
+
+def _plan_sqlite(conn, sql: str) -> tuple[list[str], bool]:
+    details = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    # "SCAN food_listing" is a full table scan; index use reads
+    # "SEARCH ... USING INDEX" or "SCAN ... USING INDEX".
+    scans = [d for d in details if re.fullmatch(r"SCAN \w+", d) or "TEMP B-TREE" in d]
+    return details, not scans
+
+
+def _plan_postgresql(conn, sql: str) -> tuple[list[str], bool]:
+    # Tiny development tables make a sequential scan the cheapest plan, so
+    # rule it out to see whether an index could serve the query at all.
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    (plan,) = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").one()
+    plan = plan if isinstance(plan, list) else json.loads(plan)
+    nodes, stack = [], [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        nodes.append(node["Node Type"])
+        stack.extend(node.get("Plans", []))
+    uses_index = any("Index" in node for node in nodes) and "Seq Scan" not in nodes
+    return nodes, uses_index
+
+
+def check_query_plans(engine) -> dict[str, tuple[list[str], bool]]:
+    """EXPLAIN each hot query and report its plan and whether it uses an index."""
+    explain = {"sqlite": _plan_sqlite, "postgresql": _plan_postgresql}.get(engine.dialect.name)
+    if explain is None:
+        raise ValueError(f"No query plan check for {engine.dialect.name}")
+    results = {}
+    for name, statement in hot_queries().items():
+        sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+        with engine.begin() as conn:
+            results[name] = explain(conn, sql)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    group.add_argument("--check-plans", action="store_true",
+                       help="EXPLAIN hot queries and fail if any scans a whole table")
+    args = parser.parse_args(argv)
+
+    # Importing the app creates tables and applies pending migrations.
+    from app import app, db
+
+    with app.app_context():
+        if args.status:
+            for step, applied in status(db.engine):
+                print(f"{step.version:>4}  {'applied' if applied else 'pending'}  {step.description}")
+            return 0
+        if args.check_plans:
+            failures = 0
+            for name, (plan, uses_index) in check_query_plans(db.engine).items():
+                failures += not uses_index
+                print(f"{'ok  ' if uses_index else 'FAIL'}  {name}: {'; '.join(plan)}")
+            return 1 if failures else 0
+        applied = upgrade(db.engine)
+        print(f"Applied {len(applied)} migration(s)" + (f": {applied}" if applied else ""))
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
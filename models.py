@@ -2,6 +2,10 @@ from app import db
 from datetime import datetime
 
 class WeatherAlert(db.Model):
+    __table_args__ = (
+        db.Index('ix_weather_alert_active_created', 'is_active', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     location = db.Column(db.String(100), nullable=False)
     alert_type = db.Column(db.String(50), nullable=False)
@@ -12,6 +16,10 @@ class WeatherAlert(db.Model):
     is_active = db.Column(db.Boolean, default=True)
 
 class SkillListing(db.Model):
+    __table_args__ = (
+        db.Index('ix_skill_listing_created', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -23,6 +31,10 @@ class SkillListing(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class JobListing(db.Model):
+    __table_args__ = (
+        db.Index('ix_job_listing_created', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -35,6 +47,13 @@ class JobListing(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class FoodListing(db.Model):
+    # Marketplace tabs page through each category newest first; the food home
+    # page lists the newest available listings.
+    __table_args__ = (
+        db.Index('ix_food_listing_category_available_created', 'category', 'is_available', 'created_at'),
+        db.Index('ix_food_listing_available_created', 'is_available', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -114,6 +133,14 @@ class MarketplaceProduct(db.Model):
                            for n, t, d, pr, s, loc, url in products)
 
 class HealthService(db.Model):
+    # Serves the bounding-box prefilter in the nearby facility search.
+    __table_args__ = (
+        db.Index('ix_health_service_active_lat_lng', 'is_active', 'latitude', 'longitude'),
+        db.Index('ix_health_service_active_type', 'is_active', 'service_type'),
+        # Keyset pages of /api/health-services follow id.
+        db.Index('ix_health_service_active_id', 'is_active', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     service_type = db.Column(db.String(100), nullable=False)
@@ -139,6 +166,10 @@ class HealthService(db.Model):
                            for n, t, a, lat, lng, phone, hours, offered in services)
 
 class ChatSession(db.Model):
+    __table_args__ = (
+        db.Index('ix_chat_session_session_created', 'session_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(100), nullable=False)
     module = db.Column(db.String(50), nullable=False)  # 'health', 'nutrition', 'mental_health'
@@ -169,6 +200,10 @@ class SleepWellnessData(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class TelemedicineSession(db.Model):
+    __table_args__ = (
+        db.Index('ix_telemedicine_session_created', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     session_type = db.Column(db.String(50), nullable=False)  # 'ai_chat', 'emergency', 'consultation'
     status = db.Column(db.String(20), default='active')  # 'active', 'completed', 'scheduled'
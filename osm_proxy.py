@@ -0,0 +1,184 @@
+"""Cached server-side access to OpenStreetMap geocoding and Overpass.
+
+The facility finder used to call Nominatim and Overpass straight from the
+browser. Every search paid for a slow third-party round trip, and the shared
+public instances rate-limited us. Lookups now go through this module:
+
+* Queries are normalised (case, whitespace, punctuation) and coordinates are
+  rounded to about 1 km before keying the shared cache, so nearby and
+  near-identical searches reuse one upstream response.
+* Empty results are cached too, for a shorter time (negative caching).
+  Upstream failures are not cached.
+* Concurrent identical lookups are collapsed, within and across workers, into
+  one upstream request.
+
+``NOMINATIM_URL`` and ``OVERPASS_URL`` point at the upstream services, so
+tests or a self-hosted instance can replace the public ones.
+"""
+import os
+import re
+import time
+
+import requests
+
+import metrics
+import profiling
+from cache_store import make_key, shared_cache
+from coalesce import get_group
+from geo import within_radius
+
+
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org").rstrip("/")
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+OSM_USER_AGENT = os.environ.get("OSM_USER_AGENT", "CommuniGrow/1.0 (community health facility finder)")
+OSM_TIMEOUT_SECONDS = float(os.environ.get("OSM_TIMEOUT_SECONDS", 20))
+GEOCODE_COUNTRY_CODES = os.environ.get("GEOCODE_COUNTRY_CODES", "in")
+
+GEOCODE_NAMESPACE = "geocode"
+OSM_FACILITIES_NAMESPACE = "osm_facilities"
+GEOCODE_TTL = int(os.environ.get("GEOCODE_TTL_SECONDS", 30 * 86400))
+GEOCODE_NEGATIVE_TTL = int(os.environ.get("GEOCODE_NEGATIVE_TTL_SECONDS", 86400))
+OSM_FACILITIES_TTL = int(os.environ.get("OSM_FACILITIES_TTL_SECONDS", 7 * 86400))
+OSM_FACILITIES_NEGATIVE_TTL = int(os.environ.get("OSM_FACILITIES_NEGATIVE_TTL_SECONDS", 86400))
+
+# Facility lookups are keyed on a ~1 km grid and fetched with this much extra
+# radius, so every point in the grid cell gets complete results.
+COORDINATE_DECIMALS = 2
+GRID_SLACK_KM = 1.0
+MAX_RADIUS_KM = 50
+OSM_AMENITIES = ("hospital", "clinic", "doctors", "pharmacy", "dentist")
+
+
+class OSMUpstreamError(Exception):
+    """The upstream OSM service failed or returned something unusable."""
+
+
+def normalise_query(query: str) -> str:
+    """Case-fold and collapse a free-text search so trivial variants share a key."""
+    text = re.sub(r"[^\w\s,-]+", " ", query.casefold())
+    text = re.sub(r"\s*,\s*", ", ", text)
+    return " ".join(text.split()).strip(" ,-")
+
+
+def _upstream(method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = requests.request(
+            method, url, timeout=OSM_TIMEOUT_SECONDS,
+            headers={"User-Agent": OSM_USER_AGENT}, **kwargs,
+        )
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError) as exc:
+        raise OSMUpstreamError(f"{url} failed: {exc}") from exc
+    finally:
+        profiling.record("osm", time.perf_counter() - started)
+
+
+def _cached_lookup(namespace: str, key: str, fetch, ttl: int, negative_ttl: int):
+    """Return the cached value for ``key`` or fetch, cache and return it once."""
+    cached = shared_cache.get(namespace, key)
+    metrics.record_cache_lookup(namespace, cached is not None)
+    if cached is not None:
+        return cached
+
+    def load():
+        # Another worker may have filled the entry while we waited for the lease.
+        again = shared_cache.get(namespace, key, record=False)
+        if again is not None:
+            return again
+        value = fetch()
+        shared_cache.set(namespace, key, value, ttl if value else negative_ttl)
+        return value
+
+    return get_group(namespace).do(key, load, shared=True)
+
+
+def geocode(query: str, limit: int = 5) -> list[dict]:
+    """Look up a place or facility name, best match first."""
+    normalised = normalise_query(query)
+    if not normalised:
+        return []
+    limit = min(max(limit, 1), 10)
+
+    def fetch():
+        data = _upstream("GET", f"{NOMINATIM_URL}/search", params={
+            "q": normalised, "format": "jsonv2", "limit": limit,
+            "countrycodes": GEOCODE_COUNTRY_CODES,
+        })
+        results = []
+        for place in data if isinstance(data, list) else []:
+            try:
+                results.append({
+                    "lat": float(place["lat"]),
+                    "lng": float(place["lon"]),
+                    "display_name": place.get("display_name", ""),
+                    "category": place.get("category") or place.get("class"),
+                    "type": place.get("type"),
+                })
+            except (KeyError, TypeError, ValueError):
+                continue
+        return results
+
+    key = make_key(normalised, limit, GEOCODE_COUNTRY_CODES)
+    return _cached_lookup(GEOCODE_NAMESPACE, key, fetch, GEOCODE_TTL, GEOCODE_NEGATIVE_TTL)
+
+
+def _format_address(tags: dict) -> str:
+    parts = [
+        " ".join(filter(None, (tags.get("addr:housenumber"), tags.get("addr:street")))),
+        tags.get("addr:city") or tags.get("addr:district"),
+        tags.get("addr:state"),
+        tags.get("addr:postcode"),
+    ]
+    return ", ".join(part for part in parts if part) or "Address not available"
+
+
+def _overpass_facilities(lat: float, lng: float, radius_km: float, amenity: str | None) -> list[dict]:
+    selector = f'["amenity"="{amenity}"]' if amenity else f'["amenity"~"^({"|".join(OSM_AMENITIES)})$"]'
+    around = f"(around:{radius_km * 1000:.0f},{lat},{lng})"
+    query = (
+        "[out:json][timeout:25];"
+        f"(node{selector}{around};way{selector}{around};relation{selector}{around};);"
+        "out center tags;"
+    )
+    data = _upstream("POST", OVERPASS_URL, data={"data": query})
+    facilities = []
+    for element in data.get("elements", []) if isinstance(data, dict) else []:
+        center = element if "lat" in element else element.get("center") or {}
+        if "lat" not in center or "lon" not in center:
+            continue
+        tags = element.get("tags") or {}
+        facilities.append({
+            "id": f"{element.get('type', 'node')}/{element.get('id')}",
+            "name": tags.get("name") or "Medical Facility",
+            "type": tags.get("amenity") or amenity or "hospital",
+            "address": _format_address(tags),
+            "lat": center["lat"],
+            "lng": center["lon"],
+            "phone": tags.get("phone") or tags.get("contact:phone") or "Not available",
+            "website": tags.get("website") or "",
+            "opening_hours": tags.get("opening_hours") or "Hours not specified",
+            "wheelchair": tags.get("wheelchair") or "Unknown",
+        })
+    return facilities
+
+
+def osm_facilities(lat: float, lng: float, radius_km: float, amenity: str | None = None) -> list[dict]:
+    """Medical facilities from OSM within ``radius_km`` of a point, nearest first."""
+    if amenity not in OSM_AMENITIES:
+        amenity = None
+    radius_km = min(max(radius_km, 1), MAX_RADIUS_KM)
+    grid_lat, grid_lng = round(lat, COORDINATE_DECIMALS), round(lng, COORDINATE_DECIMALS)
+    # Whole kilometres keep the key space small; the exact radius is applied below.
+    fetch_radius = int(-(-radius_km // 1)) + GRID_SLACK_KM
+    key = make_key(grid_lat, grid_lng, fetch_radius, amenity)
+    candidates = _cached_lookup(
+        OSM_FACILITIES_NAMESPACE, key,
+        lambda: _overpass_facilities(grid_lat, grid_lng, fetch_radius, amenity),
+        OSM_FACILITIES_TTL, OSM_FACILITIES_NEGATIVE_TTL,
+    )
+    matches = within_radius(candidates, lat, lng, radius_km,
+                            lat_of=lambda row: row["lat"], lng_of=lambda row: row["lng"])
+    return [{**facility, "distance_km": round(distance, 1)} for facility, distance in matches]
+
@@ -0,0 +1,113 @@
+"""Keyset (cursor) pagination and field projection for list views and APIs.
+
+OFFSET pagination makes the database step over every skipped row, so page N
+costs N pages. Here each page starts strictly after the last row of the
+previous page on an indexed sort key (newest first by ``created_at, id``), so
+every page is one index range read. Clients get the position as an opaque
+``cursor`` and pass it back unchanged.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class PaginationError(ValueError):
+    """A cursor, page size or field list sent by the client is invalid."""
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: str | None
+
+
+def encode_cursor(values) -> str:
+    payload = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys) -> list:
+    """Turn a cursor back into one value per sort key."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("wrong number of values")
+        return [
+            datetime.fromisoformat(value) if key.type.python_type is datetime else value
+            for key, value in zip(keys, values)
+        ]
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise PaginationError("Invalid cursor") from exc
+
+
+def page_size(value, default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    """Validate a ``limit`` query argument."""
+    if value in (None, ""):
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        raise PaginationError("limit must be an integer") from None
+    if size < 1:
+        raise PaginationError("limit must be at least 1")
+    return min(size, maximum)
+
+
+def parse_fields(value: str | None, allowed) -> list[str]:
+    """Validate a ``fields=id,name`` projection; all ``allowed`` fields when absent."""
+    if not value:
+        return list(allowed)
+    fields = list(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown or not fields:
+        raise PaginationError(
+            f"Unknown fields: {', '.join(unknown) or '(none given)'}. "
+            f"Available: {', '.join(allowed)}"
+        )
+    return fields
+
+
+def keyset_filter(keys, values, descending: bool = True):
+    """Rows after ``values`` in ``keys`` order: ``(k1, k2) < (v1, v2)`` spelled
+    out, so every database can use the index."""
+    key, value = keys[0], values[0]
+    beyond = key < value if descending else key > value
+    if len(keys) == 1:
+        return beyond
+    return or_(beyond, and_(key == value, keyset_filter(keys[1:], values[1:], descending)))
+
+
+def keyset_page(query, keys, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                descending: bool = True, columns=None) -> Page:
+    """Return one page of ``query`` ordered by ``keys``, continuing after ``cursor``.
+
+    With ``columns`` only those columns (plus the sort keys) are selected and
+    items are plain dicts of the requested columns instead of model objects.
+    """
+    if cursor:
+        query = query.filter(keyset_filter(keys, decode_cursor(cursor, keys), descending))
+    query = query.order_by(*(key.desc() if descending else key.asc() for key in keys))
+    if columns is not None:
+        extra = [key for key in keys if all(key.key != column.key for column in columns)]
+        query = query.with_entities(*columns, *extra)
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            last._mapping[key.key] if columns is not None else getattr(last, key.key)
+            for key in keys
+        )
+    if columns is not None:
+        rows = [{column.key: row._mapping[column.key] for column in columns} for row in rows]
+    return Page(rows, next_cursor)
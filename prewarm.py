@@ -0,0 +1,175 @@
+"""Keep the most requested entries of a stale-while-revalidate cache fresh.
+
+Without this, the first request after an entry goes stale triggers its
+refresh, and the first request after the stale window closes waits for the
+AI provider. A ``Prewarmer`` refreshes popular keys shortly before they stop
+being fresh, so they are always served from cache.
+
+Every worker counts requests per key (``SWRCache.take_demand``) and merges
+its counts into one decaying score table in the cache backend. One worker
+holds the leader lease. On each tick it refreshes the top keys whose entries
+are missing or within ``lead`` seconds of going stale. It refreshes at most
+``max_per_minute`` keys, most popular first.
+
+The loop starts on the AI event loop the first time a worker serves a
+request, unless ``PREWARM_ENABLED=0``. ``python prewarm.py`` runs the
+same loop as a separate process instead; it joins the leader election, so it
+can run alongside the web workers.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+
+from swr_cache import SWRCache
+
+
+PREWARM_INTERVAL_SECONDS = int(os.environ.get("PREWARM_INTERVAL_SECONDS", 60))
+PREWARM_TOP_KEYS = int(os.environ.get("PREWARM_TOP_KEYS", 20))
+PREWARM_MAX_PER_MINUTE = int(os.environ.get("PREWARM_MAX_PER_MINUTE", 10))
+PREWARM_LEAD_SECONDS = int(os.environ.get("PREWARM_LEAD_SECONDS", 120))
+DEMAND_HALF_LIFE_SECONDS = 6 * 60 * 60
+DEMAND_TTL = 7 * 86400
+MIN_SCORE = 1.0
+FORGET_SCORE = 0.01
+MAX_TRACKED_KEYS = 200
+DEMAND_LEASE_SECONDS = 10
+_prewarmers: dict[str, "Prewarmer"] = {}
+
+
+class Prewarmer:
+    """Leader-elected refresh loop for the popular keys of one ``SWRCache``.
+
+    ``load(key)`` returns the awaitable that fetches ``key``, like the
+    ``fetch`` passed to ``SWRCache.aget``.
+    """
+
+    def __init__(self, cache: SWRCache, load, cacheable=None, top: int = PREWARM_TOP_KEYS,
+                 interval: float = PREWARM_INTERVAL_SECONDS, lead: float = PREWARM_LEAD_SECONDS,
+                 max_per_minute: int = PREWARM_MAX_PER_MINUTE):
+        self.cache = cache
+        self.load = load
+        self.cacheable = cacheable
+        self.top = top
+        self.interval = interval
+        self.lead = lead
+        self.per_tick = max(1, round(max_per_minute * interval / 60))
+        # Scores live next to the entries, so every worker sharing the cache shares them.
+        self._scores = type(cache.backend)(f"prewarm_{cache.name}", 1)
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._started_pid = None
+        self._unmerged = Counter()
+        self._counts = {"ticks": 0, "refreshes": 0, "deferred": 0}
+        self.is_leader = False
+        _prewarmers[cache.name] = self
+
+    def _merge_demand(self) -> dict[str, float]:
+        """Fold this worker's new requests into the shared scores and return them."""
+        demand = self._unmerged + self.cache.take_demand()
+        lease = f"prewarm_{self.cache.name}:scores"
+        if not self._scores.acquire_lease(lease, self._owner, DEMAND_LEASE_SECONDS):
+            # Another worker is merging; keep the counts for the next tick.
+            self._unmerged = demand
+            return (self._scores.get("scores") or {}).get("scores", {})
+        self._unmerged = Counter()
+        try:
+            now = time.time()
+            stored = self._scores.get("scores") or {"updated": now, "scores": {}}
+            decay = 0.5 ** ((now - stored["updated"]) / DEMAND_HALF_LIFE_SECONDS)
+            scores = {key: score * decay for key, score in stored["scores"].items()}
+            for key, count in demand.items():
+                scores[key] = scores.get(key, 0.0) + count
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:MAX_TRACKED_KEYS]
+            scores = {key: round(score, 3) for key, score in ranked if score >= FORGET_SCORE}
+            self._scores.set("scores", {"updated": now, "scores": scores}, DEMAND_TTL)
+            return scores
+        finally:
+            self._scores.release_lease(lease, self._owner)
+
+    def _due(self, scores: dict[str, float]) -> list[str]:
+        """Popular keys that are missing or about to go stale, most popular first."""
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        popular = [key for key, score in ranked if score >= MIN_SCORE][:self.top]
+        due = []
+        for key in popular:
+            age = self.cache.age(key)
+            if age is None or age >= self.cache.fresh_ttl - self.lead:
+                due.append(key)
+        return due
+
+    async def tick(self) -> int:
+        """Merge demand and, as leader, refresh due keys. Returns the number refreshed."""
+        self._counts["ticks"] += 1
+        # The tick runs on the AI loop; the backend calls block, so they run in threads.
+        scores = await asyncio.to_thread(self._merge_demand)
+        self.is_leader = await asyncio.to_thread(
+            self._scores.acquire_lease, f"prewarm_{self.cache.name}:leader", self._owner, self.interval * 3
+        )
+        if not self.is_leader:
+            return 0
+        due = await asyncio.to_thread(self._due, scores)
+        self._counts["deferred"] += max(0, len(due) - self.per_tick)
+        # Failures are logged and counted by the cache itself.
+        refreshed = sum(await asyncio.gather(*(
+            self.cache.refresh(key, lambda key=key: self.load(key), self.cacheable)
+            for key in due[:self.per_tick]
+        )))
+        self._counts["refreshes"] += refreshed
+        return refreshed
+
+    async def run_forever(self):
+        while True:
+            # Sleep first: the request that started the loop is fetching its own miss.
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception as exc:
+                logging.warning("Pre-warming %s failed: %s", self.cache.name, exc)
+
+    def start(self):
+        """Run the loop on this worker's AI event loop; later calls do nothing."""
+        if self._started_pid == os.getpid() or os.environ.get("PREWARM_ENABLED", "1") == "0":
+            return
+        from gemini_async import run_in_background
+
+        # A forked worker needs its own owner id and its own loop.
+        self._started_pid, self._owner = os.getpid(), f"{os.getpid()}:{uuid.uuid4().hex}"
+        run_in_background(self.run_forever())
+
+    def stats(self) -> dict:
+        return {
+            **self._counts,
+            "leader": self.is_leader,
+            "per_tick": self.per_tick,
+            "interval_seconds": self.interval,
+            "top": list((self._scores.get("scores") or {}).get("scores", {}))[:self.top],
+        }
+
+
+def get_prewarm_stats() -> dict:
+    """Per-worker refresh counters and the current most popular keys of every prewarmer."""
+    return {name: prewarmer.stats() for name, prewarmer in _prewarmers.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep popular weather locations warm in the cache.")
+    parser.add_argument("--once", action="store_true", help="run one tick and exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app import app  # noqa: F401 registers the blueprints and their caches
+    from routes.climate import weather_prewarmer
+
+    if args.once:
+        print(f"Refreshed {asyncio.run(weather_prewarmer.tick())} locations")
+        return 0
+    asyncio.run(weather_prewarmer.run_forever())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
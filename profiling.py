@@ -0,0 +1,270 @@
+"""Per-request timing breakdown with a Server-Timing header.
+
+Each request collects time spent in SQL statements, template rendering, AI
+provider calls and JSON serialization. Totals are sent back as a
+``Server-Timing`` header, which browser dev tools show under the request's
+Timing tab, and written to the log as one JSON line per request.
+
+With ``PROFILING_SAMPLE_RATE`` above 0, that fraction of requests also runs
+under a profiler. A profile is kept only when the request took longer than
+``PROFILING_SLOW_MS``. cProfile ``.prof`` files (or pyinstrument HTML with
+``PROFILING_ENGINE=pyinstrument``) are written to ``PROFILING_DIR``.
+
+Profilers follow one thread, so an ``async def`` view is profiled on the
+thread that runs its coroutine; provider calls on the AI loop show up as the
+await they block on. One request per worker is profiled at a time. Sampled
+requests that arrive meanwhile are served without a profile.
+"""
+import contextvars
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "1") == "1"
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_SLOW_MS = float(os.environ.get("PROFILING_SLOW_MS", 1000))
+PROFILING_ENGINE = os.environ.get("PROFILING_ENGINE", "cprofile")
+PROFILING_DIR = os.environ.get("PROFILING_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "instance", "profiles"
+))
+
+_current = contextvars.ContextVar("request_timings", default=None)
+# Held while a sampled request is being profiled.
+_profiler_slot = threading.Lock()
+
+
+class RequestTimings:
+    """Accumulated duration and call count per phase for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, dict] = {}
+        self.providers: dict[str, int] = {}
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            entry = self.phases.setdefault(phase, {"seconds": 0.0, "count": 0})
+            entry["seconds"] += seconds
+            entry["count"] += 1
+
+    def add_provider_call(self, provider: str, seconds: float, retry: bool):
+        self.add("ai", seconds)
+        with self._lock:
+            self.providers[provider] = self.providers.get(provider, 0) + 1
+            if retry:
+                self.retries += 1
+
+    def header(self) -> str:
+        parts = []
+        with self._lock:
+            for phase, entry in self.phases.items():
+                desc = f"{entry['count']} call{'s' if entry['count'] != 1 else ''}"
+                if phase == "ai" and self.providers:
+                    desc = ", ".join(f"{name} x{count}" for name, count in self.providers.items())
+                    if self.retries:
+                        desc += f", {self.retries} retr{'ies' if self.retries != 1 else 'y'}"
+                parts.append(f'{phase};dur={entry["seconds"] * 1000:.1f};desc="{desc}"')
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                phase: {"ms": round(entry["seconds"] * 1000, 1), "count": entry["count"]}
+                for phase, entry in self.phases.items()
+            }
+
+
+def record(phase: str, seconds: float):
+    """Add ``seconds`` to ``phase`` for the current request, if any."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+def record_provider_call(provider: str, seconds: float, retry: bool = False):
+    """Record one AI provider attempt for the current request, if any."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add_provider_call(provider, seconds, retry)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            record("json", time.perf_counter() - started)
+
+
+def _start_profiler():
+    """Profile the calling thread, or return None when another profile is running."""
+    if not _profiler_slot.acquire(blocking=False):
+        return None
+    try:
+        if PROFILING_ENGINE == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logging.warning("pyinstrument is not installed; falling back to cProfile")
+            else:
+                profiler = Profiler(async_mode="disabled")
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    except (ValueError, RuntimeError) as exc:
+        # Python 3.12+ allows one active profiler per process (a debugger or coverage counts).
+        _profiler_slot.release()
+        logging.warning("Skipping request profile: %s", exc)
+        return None
+
+
+def _save_profile(profiler, elapsed_ms: float):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", request.path).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{slug}-{elapsed_ms:.0f}ms"
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    if isinstance(profiler, cProfile.Profile):
+        profiler.dump_stats(os.path.join(PROFILING_DIR, f"{name}.prof"))
+    else:
+        with open(os.path.join(PROFILING_DIR, f"{name}.html"), "w") as handle:
+            handle.write(profiler.output_html())
+
+
+def _stop_profiler(profiler):
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+    finally:
+        _profiler_slot.release()
+
+
+def init_app(app, db):
+    """Install the timing hooks on ``app`` and ``db``'s engine."""
+    if not PROFILING_ENABLED:
+        return
+
+    app.json = TimedJSONProvider(app)
+
+    ensure_sync = app.ensure_sync
+
+    def profiled_ensure_sync(func):
+        # asgiref runs an async view's coroutine on another thread; profile it there.
+        if (inspect.iscoroutinefunction(func) and has_request_context()
+                and func is app.view_functions.get(request.endpoint) and g.pop("profile_view", False)):
+            @functools.wraps(func)
+            async def profiled(*args, **kwargs):
+                profiler = _start_profiler()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    if profiler is not None:
+                        _stop_profiler(profiler)
+                        g.finished_profiler = profiler
+
+            return ensure_sync(profiled)
+        return ensure_sync(func)
+
+    app.ensure_sync = profiled_ensure_sync
+
+    with app.app_context():
+        engine = db.engine
+
+    # The start time lives on the statement's execution context, so a failed
+    # statement (which never reaches after_cursor_execute) leaves nothing behind.
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._profiling_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profiling_started", None)
+        if started is not None:
+            record("db", time.perf_counter() - started)
+
+    def on_before_render(sender, template, context, **extra):
+        g.setdefault("template_started", []).append(time.perf_counter())
+
+    def on_rendered(sender, template, context, **extra):
+        started = g.get("template_started")
+        if started:
+            record("tpl", time.perf_counter() - started.pop())
+
+    # Local functions, so keep strong references.
+    before_render_template.connect(on_before_render, app, weak=False)
+    template_rendered.connect(on_rendered, app, weak=False)
+
+    @app.before_request
+    def start_timing():
+        g.request_timings = RequestTimings()
+        g.timings_token = _current.set(g.request_timings)
+        if PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE:
+            if inspect.iscoroutinefunction(app.view_functions.get(request.endpoint)):
+                g.profile_view = True
+            else:
+                g.profiler = _start_profiler()
+
+    @app.after_request
+    def emit_timing(response):
+        timings = g.get("request_timings")
+        if timings is None:
+            return response
+        elapsed_ms = timings.elapsed() * 1000
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            _stop_profiler(profiler)
+        else:
+            profiler = g.pop("finished_profiler", None)
+        if profiler is not None and elapsed_ms >= PROFILING_SLOW_MS:
+            try:
+                _save_profile(profiler, elapsed_ms)
+            except OSError as exc:
+                logging.warning("Could not save request profile: %s", exc)
+        response.headers["Server-Timing"] = timings.header()
+        logging.info(json.dumps({
+            "event": "request_timing",
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "total_ms": round(elapsed_ms, 1),
+            "phases": timings.summary(),
+            "providers": timings.providers,
+            "retries": timings.retries,
+        }))
+        return response
+
+    @app.teardown_request
+    def stop_timing(exc):
+        token = g.pop("timings_token", None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # Reset from a different context (e.g. a streamed response).
+                _current.set(None)
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            _stop_profiler(profiler)
@@ -0,0 +1,304 @@
+"""Circuit breakers, retry backoff and latency tracking for AI providers.
+
+Each provider gets a breaker that opens after ``AI_BREAKER_FAILURES``
+consecutive failures. While open, the provider is skipped for
+``AI_BREAKER_COOLDOWN_SECONDS``. After the cool-down a single half-open probe
+is let through; it closes the breaker on success and re-opens it on failure.
+Recent latencies are kept per provider so routing can move a degraded
+primary behind a healthier fallback. State is per worker process.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import metrics
+import profiling
+
+
+BREAKER_FAILURES = int(os.environ.get("AI_BREAKER_FAILURES", 3))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("AI_BREAKER_COOLDOWN_SECONDS", 30))
+MAX_RETRIES = int(os.environ.get("AI_PROVIDER_RETRIES", 1))
+RETRY_BASE_SECONDS = float(os.environ.get("AI_RETRY_BASE_SECONDS", 0.5))
+RETRY_MAX_SECONDS = float(os.environ.get("AI_RETRY_MAX_SECONDS", 8))
+LATENCY_WINDOW = 50
+MIN_LATENCY_SAMPLES = 5
+# Samples older than this are ignored, so a demoted primary that receives no
+# traffic drops back to its configured priority and gets re-measured.
+LATENCY_HORIZON_SECONDS = float(os.environ.get("AI_LATENCY_HORIZON_SECONDS", 300))
+# A lower-priority provider is only promoted when the primary's p95 is this
+# many times slower, so ordinary jitter does not flip routing back and forth.
+LATENCY_PREFERENCE_RATIO = float(os.environ.get("AI_LATENCY_PREFERENCE_RATIO", 1.5))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES,
+                 cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return True when a request may be sent to the provider now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def is_available(self) -> bool:
+        """Like ``allow`` but without claiming the half-open probe."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return self.state == CLOSED or not self._probe_in_flight
+
+    def release_probe(self):
+        """Give back a half-open probe that ended without a verdict."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info("AI provider circuit closed after successful probe")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class ProviderHealth:
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            self.requests += 1
+            self.latencies.append((time.monotonic(), seconds))
+        self.breaker.record_success()
+
+    def record_failure(self, exc: Exception | None = None):
+        """Count a failed attempt; only transient errors count toward the breaker.
+
+        A 400, a bad key or a prompt too long is the request's fault, not the
+        provider's, so ``exc`` that ``is_retryable`` rejects only gives back
+        a half-open probe.
+        """
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+        if exc is None or is_retryable(exc):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def percentile(self, fraction: float) -> float | None:
+        cutoff = time.monotonic() - LATENCY_HORIZON_SECONDS
+        with self._lock:
+            samples = sorted(seconds for at, seconds in self.latencies if at >= cutoff)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+        return samples[index]
+
+    def stats(self) -> dict:
+        p95 = self.percentile(0.95)
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retries,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+_health: dict[str, ProviderHealth] = {}
+_health_lock = threading.Lock()
+
+
+def get_health(name: str) -> ProviderHealth:
+    with _health_lock:
+        health = _health.get(name)
+        if health is None:
+            health = _health[name] = ProviderHealth(name)
+        return health
+
+
+def route(priority: list[str] | tuple[str, ...]) -> list[str]:
+    """Order providers for the next request.
+
+    Providers whose breaker is open go last. Among the rest, the configured
+    priority is kept unless a later provider's recent p95 is clearly better.
+    """
+    available = [name for name in priority if get_health(name).breaker.is_available()]
+    tripped = [name for name in priority if name not in available]
+
+    def latency_rank(name):
+        p95 = get_health(name).percentile(0.95)
+        return p95 if p95 is not None else float("inf")
+
+    if len(available) > 1:
+        primary = available[0]
+        primary_p95 = latency_rank(primary)
+        best = min(available[1:], key=latency_rank)
+        best_p95 = latency_rank(best)
+        if primary_p95 != float("inf") and best_p95 * LATENCY_PREFERENCE_RATIO < primary_p95:
+            available.remove(best)
+            available.insert(0, best)
+    return available + tripped
+
+
+def _status_code(exc: Exception) -> int | None:
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def _retry_after(exc: Exception) -> float | None:
+    """Read a Retry-After header (seconds or HTTP date) from an SDK error."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value is None:
+        value = getattr(exc, "retry_after", None)
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def retry_delay(attempt: int, exc: Exception) -> float | None:
+    """Seconds to wait before retrying, or None when a retry is pointless.
+
+    Uses full-jitter exponential backoff, honouring Retry-After on 429s. A
+    Retry-After longer than ``RETRY_MAX_SECONDS`` skips the retry so the next
+    provider can be tried instead.
+    """
+    if not is_retryable(exc):
+        return None
+    if _status_code(exc) == 429:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return retry_after if retry_after <= RETRY_MAX_SECONDS else None
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def observe_attempt(name: str, seconds: float, ok: bool, retry: bool = False):
+    """Report one provider attempt to the request profile and to metrics."""
+    profiling.record_provider_call(name, seconds, retry=retry)
+    metrics.observe_provider_call(name, seconds, ok)
+
+
+def call_with_retries(name: str, generate, retries: int = MAX_RETRIES):
+    """Run ``generate`` against one provider, recording health and retrying.
+
+    The caller must already have been granted the request by the provider's
+    breaker; retries re-check the breaker before each attempt.
+    """
+    health = get_health(name)
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            result = generate()
+        except Exception as exc:
+            observe_attempt(name, time.monotonic() - started, ok=False, retry=attempt > 0)
+            health.record_failure(exc)
+            delay = retry_delay(attempt, exc) if attempt < retries else None
+            if delay is None or not health.breaker.allow():
+                raise
+            attempt += 1
+            with health._lock:
+                health.retries += 1
+            logging.info("Retrying AI provider %s in %.2fs after: %s", name, delay, exc)
+            time.sleep(delay)
+            continue
+        elapsed = time.monotonic() - started
+        observe_attempt(name, elapsed, ok=True, retry=attempt > 0)
+        health.record_success(elapsed)
+        return result
+
+
+async def acall_with_retries(name: str, generate, retries: int = MAX_RETRIES):
+    """Asyncio variant of ``call_with_retries``; ``generate`` returns a coroutine."""
+    health = get_health(name)
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            result = await generate()
+        except asyncio.CancelledError:
+            # A cancelled hedge says nothing about the provider's health.
+            health.breaker.release_probe()
+            raise
+        except Exception as exc:
+            observe_attempt(name, time.monotonic() - started, ok=False, retry=attempt > 0)
+            health.record_failure(exc)
+            delay = retry_delay(attempt, exc) if attempt < retries else None
+            if delay is None or not health.breaker.allow():
+                raise
+            attempt += 1
+            with health._lock:
+                health.retries += 1
+            logging.info("Retrying AI provider %s in %.2fs after: %s", name, delay, exc)
+            await asyncio.sleep(delay)
+            continue
+        elapsed = time.monotonic() - started
+        observe_attempt(name, elapsed, ok=True, retry=attempt > 0)
+        health.record_success(elapsed)
+        return result
+
+
+def get_provider_stats() -> dict:
+    with _health_lock:
+        providers = list(_health.values())
+    return {health.name: health.stats() for health in providers}
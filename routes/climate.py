@@ -5,17 +5,28 @@ import logging
 import time
 from models import WeatherAlert, DisasterPreparednessAssessment
 from app import db
-from gemini import (
-    assess_disaster_preparedness,
-    get_climate_advice,
-    get_india_weather,
-    get_last_provider,
-)
+from bulkhead import bulkhead
+from gemini import get_climate_advice
+from gemini_async import aassess_disaster_preparedness, aget_india_weather
+from gazetteer import gazetteer
+from live_updates import Overloaded, hub
+from prewarm import Prewarmer
+from streaming import sse_response
+from swr_cache import SWRCache
 import json
 
 climate_bp = Blueprint('climate', __name__)
-WEATHER_CACHE_TTL_SECONDS = 15 * 60
-weather_cache = {}
+MAX_LIVE_LOCATIONS = 5
+# Weather is fresh for 15 minutes, then served stale for up to 6 hours while
+# one background refresh replaces it. Every new forecast is pushed to the
+# dashboards subscribed to its location.
+weather_cache = SWRCache(
+    'climate_weather',
+    fresh_ttl=int(os.environ.get('WEATHER_CACHE_FRESH_SECONDS', 15 * 60)),
+    stale_ttl=int(os.environ.get('WEATHER_CACHE_STALE_SECONDS', 6 * 60 * 60)),
+    max_entries=int(os.environ.get('WEATHER_CACHE_MAX_ENTRIES', 500)),
+    on_store=lambda place_id, payload: hub.publish(f'weather:{place_id}', 'weather', payload),
+)
 
 @climate_bp.route('/')
 def index():
@@ -28,36 +39,59 @@ def alerts():
     active_alerts = WeatherAlert.query.filter_by(is_active=True).order_by(WeatherAlert.created_at.desc()).all()
     return render_template('climate/alerts.html', alerts=active_alerts)
 
-@climate_bp.route('/api/weather/<location>')
-def get_weather(location):
-    """Get weather data for India using the configured AI provider."""
-    try:
-        # The provider layer tries Groq first and Gemini second.
-        india_location = f"{location}" if "india" in location.lower() else f"{location}, India"
-        cache_key = india_location.lower()
-        cached = weather_cache.get(cache_key)
-        if cached and time.time() - cached['timestamp'] < WEATHER_CACHE_TTL_SECONDS:
-            return jsonify(cached['payload'])
+async def _fetch_weather(place):
+    # The provider layer tries Groq first and Gemini second.
+    # weather_cache is the cache here; an AI response cache hit would re-stamp old data as fresh.
+    weather_advice = await aget_india_weather(place.display_name, cache=False)
+    return {
+        'success': True,
+        'source': weather_advice.source,
+        'fallback': weather_advice.is_fallback,
+        'weather': {
+            'location': place.display_name,
+            'place_id': place.id,
+            'conditions': weather_advice.current_conditions,
+            'temperature': weather_advice.temperature,
+            'humidity': weather_advice.humidity,
+            'wind_speed': weather_advice.wind_speed,
+            'precipitation': weather_advice.precipitation,
+            'pressure': weather_advice.pressure
+        },
+        'advice': weather_advice.recommendations,
+        'warnings': weather_advice.warnings,
+        'forecast': [day.model_dump() for day in weather_advice.forecast]
+    }
 
-        weather_advice = get_india_weather(india_location)
+def _is_real_forecast(payload):
+    # Keep serving the last real forecast rather than caching a fallback.
+    return not payload['fallback']
 
-        payload = {
-            'success': True,
-            'source': get_last_provider() or 'fallback',
-            'weather': {
-                'location': india_location,
-                'conditions': weather_advice.current_conditions,
-                'temperature': weather_advice.temperature,
-                'humidity': weather_advice.humidity,
-                'wind_speed': weather_advice.wind_speed,
-                'precipitation': weather_advice.precipitation,
-                'pressure': weather_advice.pressure
-            },
-            'advice': weather_advice.recommendations,
-            'warnings': weather_advice.warnings,
-            'forecast': [day.model_dump() for day in weather_advice.forecast]
-        }
-        weather_cache[cache_key] = {'timestamp': time.time(), 'payload': payload}
+# Refreshes the most requested locations before they go stale.
+weather_prewarmer = Prewarmer(
+    weather_cache,
+    lambda place_id: _fetch_weather(gazetteer.get(place_id)),
+    cacheable=_is_real_forecast,
+)
+
+@climate_bp.route('/api/weather/<location>')
+@bulkhead('climate')
+async def get_weather(location):
+    """Get weather data for India using the configured AI provider.
+
+    ``location`` is a place name or "lat,lng". Every spelling of a place
+    shares one cache entry, and unknown places never reach the provider.
+    """
+    place = gazetteer.resolve(location)
+    if place is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown location in India: {location}'
+        }), 400
+    weather_prewarmer.start()
+    try:
+        payload = await weather_cache.aget(
+            place.id, lambda: _fetch_weather(place), cacheable=_is_real_forecast
+        )
         return jsonify(payload)
     except Exception as e:
         logging.error(f"Weather API error: {e}")
@@ -66,6 +100,63 @@ def get_weather(location):
             'error': 'Unable to fetch weather data for India'
         }), 500
 
+@climate_bp.route('/api/live')
+def live_updates():
+    """Server-Sent Events with new forecasts for ``locations`` and new alerts.
+
+    ``locations`` is a comma-separated list of up to five places, by default
+    Delhi. Cached forecasts are sent first as ``weather`` events. A stream
+    holds its thread, so single-threaded (sync) workers answer 503 and the
+    page keeps polling.
+    """
+    if not request.environ.get('wsgi.multithread'):
+        return jsonify({
+            'success': False,
+            'error': 'Live updates need a threaded worker, poll /climate/api/weather instead'
+        }), 503
+    names = [name.strip() for name in request.args.get('locations', 'Delhi').split(',') if name.strip()]
+    if not names or len(names) > MAX_LIVE_LOCATIONS:
+        return jsonify({
+            'success': False,
+            'error': f'Provide between 1 and {MAX_LIVE_LOCATIONS} locations'
+        }), 400
+    place_ids = []
+    for name in names:
+        place = gazetteer.resolve(name)
+        if place is None:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown location in India: {name}'
+            }), 400
+        if place.id not in place_ids:
+            place_ids.append(place.id)
+
+    last_demand = [0.0]
+
+    def keep_warm():
+        # An open dashboard counts once per fresh period, like the poll it
+        # replaces, so the prewarmer keeps refreshing (and pushing) its locations.
+        if time.monotonic() - last_demand[0] >= weather_cache.fresh_ttl:
+            last_demand[0] = time.monotonic()
+            for place_id in place_ids:
+                weather_cache.record_demand(place_id)
+
+    keep_warm()
+    weather_prewarmer.start()
+    cached = [weather_cache.peek(place_id) for place_id in place_ids]
+    try:
+        events = hub.stream(
+            ['alerts'] + [f'weather:{place_id}' for place_id in place_ids],
+            initial=[('weather', payload) for payload in cached if payload is not None],
+            on_heartbeat=keep_warm,
+        )
+    except Overloaded:
+        return jsonify({
+            'success': False,
+            'error': 'Too many live connections, poll /climate/api/weather instead'
+        }), 503
+    return sse_response(events)
+
 @climate_bp.route('/api/alerts', methods=['POST'])
 def create_alert():
     """Create a new weather alert"""
@@ -82,6 +173,15 @@ def create_alert():
         
         db.session.add(alert)
         db.session.commit()
+        hub.publish('alerts', 'alert', {
+            'id': alert.id,
+            'location': alert.location,
+            'alert_type': alert.alert_type,
+            'severity': alert.severity,
+            'message': alert.message,
+            'created_at': alert.created_at,
+            'expires_at': alert.expires_at
+        })
         
         return jsonify({
             'success': True,
@@ -134,7 +234,8 @@ def climate_monitoring():
     return render_template('climate/climate_monitoring.html')
 
 @climate_bp.route('/api/disaster-assessment', methods=['POST'])
-def submit_disaster_assessment():
+@bulkhead('climate')
+async def submit_disaster_assessment():
     """Submit disaster preparedness assessment"""
     try:
         data = request.get_json()
@@ -144,7 +245,7 @@ def submit_disaster_assessment():
         session_id = data.get('session_id', 'default')
         
         # Get AI assessment
-        assessment = assess_disaster_preparedness(disaster_type, responses, location)
+        assessment = await aassess_disaster_preparedness(disaster_type, responses, location)
         
         # Save to database
         db_assessment = DisasterPreparednessAssessment(
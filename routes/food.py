@@ -1,12 +1,34 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 import logging
+import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from models import FoodListing, MarketplaceProduct
 from app import db
-from gemini import get_nutrition_advice, general_chat_response
+from bulkhead import bulkhead
+from gazetteer import gazetteer
+from gemini import general_chat_stream
+from gemini_async import aget_agricultural_weather, aget_nutrition_advice, ageneral_chat_response
+from pagination import PaginationError, keyset_page, page_size, parse_fields
+from streaming import stream_text
+from swr_cache import SWRCache
 
 food_bp = Blueprint('food', __name__)
+LISTING_CATEGORIES = ('marketplace', 'sharing', 'surplus')
+LISTING_FIELDS = ('id', 'title', 'description', 'category', 'price', 'quantity',
+                  'location', 'contact_info', 'is_available', 'created_at')
+LISTING_ORDER = (FoodListing.created_at, FoodListing.id)
+MARKETPLACE_PAGE_SIZE = 24
+FORECAST_DAYS = (1, 7)
+IST = timezone(timedelta(hours=5, minutes=30))
+# Keyed on place, forecast length and the Indian calendar date, so "Today" in
+# a cached forecast is never yesterday.
+agricultural_weather_cache = SWRCache(
+    'agricultural_weather_forecast',
+    fresh_ttl=int(os.environ.get('AGRI_WEATHER_CACHE_FRESH_SECONDS', 30 * 60)),
+    stale_ttl=int(os.environ.get('AGRI_WEATHER_CACHE_STALE_SECONDS', 3 * 60 * 60)),
+    max_entries=int(os.environ.get('AGRI_WEATHER_CACHE_MAX_ENTRIES', 500)),
+)
 
 @food_bp.route('/')
 def index():
@@ -17,26 +39,60 @@ def index():
 @food_bp.route('/marketplace')
 def marketplace():
     """Farmer-to-consumer marketplace"""
-    marketplace_items = FoodListing.query.filter_by(category='marketplace', is_available=True).all()
-    sharing_items = FoodListing.query.filter_by(category='sharing', is_available=True).all()
-    surplus_items = FoodListing.query.filter_by(category='surplus', is_available=True).all()
+    # Each category section pages independently with its own <category>_cursor.
+    pages = {}
+    for category in LISTING_CATEGORIES:
+        try:
+            pages[category] = keyset_page(
+                FoodListing.query.filter_by(category=category, is_available=True),
+                LISTING_ORDER, request.args.get(f'{category}_cursor'), MARKETPLACE_PAGE_SIZE,
+            )
+        except PaginationError:
+            return redirect(url_for('food.marketplace'))
+    category_counts = dict(
+        db.session.query(FoodListing.category, db.func.count(FoodListing.id))
+        .filter_by(is_available=True).group_by(FoodListing.category).all()
+    )
     external_products = MarketplaceProduct.query.filter_by(is_available=True).order_by(
         MarketplaceProduct.product_type, MarketplaceProduct.name
     ).all()
     
     return render_template('food/marketplace.html', 
-                         marketplace_items=marketplace_items,
-                         sharing_items=sharing_items,
-                          surplus_items=surplus_items,
+                         marketplace_items=pages['marketplace'].items,
+                         sharing_items=pages['sharing'].items,
+                          surplus_items=pages['surplus'].items,
+                          next_cursors={c: page.next_cursor for c, page in pages.items()},
+                          category_counts=category_counts,
                           external_products=external_products)
 
+@food_bp.route('/api/listings')
+def api_listings():
+    """Newest available food listings, one keyset page at a time (``category``, ``cursor``, ``limit``, ``fields``)"""
+    category = request.args.get('category')
+    if category and category not in LISTING_CATEGORIES:
+        return jsonify({'success': False, 'error': f"category must be one of {', '.join(LISTING_CATEGORIES)}"}), 400
+    query = FoodListing.query.filter_by(is_available=True)
+    if category:
+        query = query.filter_by(category=category)
+    try:
+        fields = parse_fields(request.args.get('fields'), LISTING_FIELDS)
+        page = keyset_page(
+            query, LISTING_ORDER, request.args.get('cursor'),
+            page_size(request.args.get('limit')),
+            columns=[getattr(FoodListing, field) for field in fields],
+        )
+    except PaginationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'listings': page.items, 'next_cursor': page.next_cursor})
+
 @food_bp.route('/nutrition')
 def nutrition():
     """Nutrition guidance and meal planning"""
     return render_template('food/nutrition.html')
 
 @food_bp.route('/api/nutrition-advice', methods=['POST'])
-def nutrition_advice():
+@bulkhead('food')
+async def nutrition_advice():
     """Get AI-powered nutrition advice"""
     try:
         data = request.get_json()
@@ -51,7 +107,7 @@ def nutrition_advice():
             }), 400
         
         # Get AI nutrition advice
-        nutrition_plan = get_nutrition_advice(dietary_preferences, health_conditions, budget)
+        nutrition_plan = await aget_nutrition_advice(dietary_preferences, health_conditions, budget)
         
         return jsonify({
             'success': True,
@@ -202,7 +258,8 @@ def government_schemes():
     return render_template('food/schemes.html')
 
 @food_bp.route('/api/agricultural-chat', methods=['POST'])
-def agricultural_chat_api():
+@bulkhead('food')
+async def agricultural_chat_api():
     """AI-powered agricultural chat assistant"""
     try:
         data = request.get_json()
@@ -214,8 +271,43 @@ def agricultural_chat_api():
                 'error': 'Message is required'
             }), 400
         
-        # Create agricultural context prompt
-        prompt = f"""
+        prompt = _agricultural_chat_prompt(message)
+        
+        # Get AI response
+        ai_response = await ageneral_chat_response(prompt, "Agricultural advisory")
+        
+        return jsonify({
+            'success': True,
+            'response': ai_response,
+            'session_id': str(uuid.uuid4())
+        })
+        
+    except Exception as e:
+        logging.error(f"Agricultural chat error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Agricultural chat service unavailable'
+        }), 500
+
+@food_bp.route('/api/agricultural-chat/stream', methods=['POST'])
+@bulkhead('food')
+def agricultural_chat_stream():
+    """Streaming agricultural chat assistant using Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '')
+    
+    if not message:
+        return jsonify({
+            'success': False,
+            'error': 'Message is required'
+        }), 400
+    
+    chunks = general_chat_stream(_agricultural_chat_prompt(message), "Agricultural advisory")
+    return stream_text(chunks, session_id=str(uuid.uuid4()))
+
+def _agricultural_chat_prompt(message):
+    """Build the agricultural advisory prompt shared by the chat endpoints"""
+    return f"""
         You are an expert agricultural advisor helping farmers and food producers. 
         Provide practical, actionable advice for:
         
@@ -232,40 +324,42 @@ def agricultural_chat_api():
         
         Keep responses practical and suitable for small to medium scale farmers.
         """
-        
-        # Get AI response
-        ai_response = general_chat_response(prompt, "Agricultural advisory")
-        
-        return jsonify({
-            'success': True,
-            'response': ai_response,
-            'session_id': str(uuid.uuid4())
-        })
-        
-    except Exception as e:
-        logging.error(f"Agricultural chat error: {e}")
-        return jsonify({
-            'success': False,
-            'error': 'Agricultural chat service unavailable'
-        }), 500
 
 @food_bp.route('/api/agricultural-weather', methods=['POST'])
-def agricultural_weather_api():
+@bulkhead('food')
+async def agricultural_weather_api():
     """Agricultural weather forecast API using the shared AI provider layer."""
     try:
         data = request.get_json()
         region = data.get('region', 'Central India')
         days = data.get('days', 3)
         
-        if not region:
+        if not region or not isinstance(region, str):
             return jsonify({
                 'success': False,
                 'error': 'Region is required'
             }), 400
         
+        place = gazetteer.resolve(region)
+        if place is None:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown region in India: {region}'
+            }), 400
+        
+        if not isinstance(days, int) or not FORECAST_DAYS[0] <= days <= FORECAST_DAYS[1]:
+            return jsonify({
+                'success': False,
+                'error': f'days must be between {FORECAST_DAYS[0]} and {FORECAST_DAYS[1]}'
+            }), 400
+        
         # Get dynamic weather data using Groq first, with Gemini as fallback.
-        from gemini import get_agricultural_weather
-        weather_response = get_agricultural_weather(region)
+        # Identical concurrent requests share one provider call.
+        weather_response = await agricultural_weather_cache.aget(
+            f"{place.id}:{days}:{datetime.now(IST).date().isoformat()}",
+            lambda: aget_agricultural_weather(place.display_name, days, cache=False),
+            cacheable=lambda response: not response.get('fallback'),
+        )
         
         # Extract weather data and agricultural advice from AI response
         weather_data = {
@@ -276,7 +370,7 @@ def agricultural_weather_api():
             'humidity': weather_response.get('humidity', 65),
             'precipitation': weather_response.get('precipitation', 2),
             'feels_like': weather_response.get('feels_like', 31),
-            'forecast': weather_response.get('forecast', [])
+            'forecast': weather_response.get('forecast', [])[:days]
         }
         
         agricultural_advice = {
@@ -287,6 +381,7 @@ def agricultural_weather_api():
         
         return jsonify({
             'success': True,
+            'place': place.to_dict(),
             'weather': weather_data,
             'agricultural_advice': agricultural_advice
         })
@@ -299,7 +394,8 @@ def agricultural_weather_api():
         }), 500
 
 @food_bp.route('/api/water-management', methods=['POST'])
-def water_management_api():
+@bulkhead('food')
+async def water_management_api():
     """Water management planning API"""
     try:
         data = request.get_json()
@@ -315,8 +411,47 @@ def water_management_api():
                 'error': 'Crop, soil type, and field size are required'
             }), 400
         
-        # Create water management prompt
-        prompt = f"""
+        prompt = _water_plan_prompt(crop, soil_type, field_size, season, location)
+        
+        # Get AI response
+        plan = await ageneral_chat_response(prompt, "Water management planning")
+        
+        return jsonify({
+            'success': True,
+            'plan': {
+                'recommendations': plan
+            }
+        })
+        
+    except Exception as e:
+        logging.error(f"Water management error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Water management service unavailable'
+        }), 500
+
+@food_bp.route('/api/water-management/stream', methods=['POST'])
+@bulkhead('food')
+def water_management_stream():
+    """Streaming water management planning using Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    crop = data.get('crop', '')
+    soil_type = data.get('soil_type', '')
+    field_size = data.get('field_size', '')
+    
+    if not all([crop, soil_type, field_size]):
+        return jsonify({
+            'success': False,
+            'error': 'Crop, soil type, and field size are required'
+        }), 400
+    
+    prompt = _water_plan_prompt(crop, soil_type, field_size,
+                                data.get('season', ''), data.get('location', ''))
+    return stream_text(general_chat_stream(prompt, "Water management planning"))
+
+def _water_plan_prompt(crop, soil_type, field_size, season, location):
+    """Build the water management planning prompt"""
+    return f"""
         Create a comprehensive water management plan for:
         
         Crop: {crop}
@@ -334,23 +469,6 @@ def water_management_api():
         
         Focus on practical, cost-effective solutions.
         """
-        
-        # Get AI response
-        plan = general_chat_response(prompt, "Water management planning")
-        
-        return jsonify({
-            'success': True,
-            'plan': {
-                'recommendations': plan
-            }
-        })
-        
-    except Exception as e:
-        logging.error(f"Water management error: {e}")
-        return jsonify({
-            'success': False,
-            'error': 'Water management service unavailable'
-        }), 500
 
 @food_bp.route('/api/crop-prices', methods=['POST'])
 def crop_prices_api():
@@ -418,7 +536,8 @@ def crop_prices_api():
         }), 500
 
 @food_bp.route('/api/government-schemes', methods=['POST'])
-def government_schemes_api():
+@bulkhead('food')
+async def government_schemes_api():
     """Government schemes finder API"""
     try:
         data = request.get_json()
@@ -454,7 +573,7 @@ def government_schemes_api():
         """
         
         # Get AI response
-        schemes_info = general_chat_response(prompt, "Government schemes search")
+        schemes_info = await ageneral_chat_response(prompt, "Government schemes search")
         
         return jsonify({
             'success': True,
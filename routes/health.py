@@ -1,13 +1,21 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
 import logging
 import uuid
-import math
 from datetime import datetime, date
 from models import HealthService, ChatSession, MentalHealthScreening, SleepWellnessData, TelemedicineSession
 from app import db
-from gemini import get_health_advice, general_chat_response
+from bulkhead import bulkhead
+from geo import bounding_box, nearest, within_radius
+from osm_proxy import OSMUpstreamError, geocode, osm_facilities
+from gemini import get_health_advice, general_chat_stream, urgent_chat_response
+from gemini_async import aget_health_advice, ageneral_chat_response, aurgent_chat_response
+from pagination import PaginationError, keyset_page, page_size, parse_fields
+from streaming import deferred, stream_text
 
 health_bp = Blueprint('health', __name__)
+URGENT_CHAT_TYPES = {'telemedicine', 'emergency'}
+SERVICE_FIELDS = ('id', 'name', 'service_type', 'address', 'latitude', 'longitude',
+                  'contact_info', 'hours', 'services_offered')
 
 @health_bp.route('/')
 def index():
@@ -65,13 +73,14 @@ def services():
     return render_template('health/medical_finder.html')
 
 @health_bp.route('/api/health-chat', methods=['POST'])
-def health_chat():
+@bulkhead('health')
+async def health_chat():
     """AI health chatbot endpoint"""
     try:
         data = request.get_json(silent=True) or {}
         message = data.get('message', '')
         session_id = data.get('session_id', str(uuid.uuid4()))
-        chat_type = data.get('type', 'general')  # general, symptoms, mental_health, nutrition
+        chat_type = data.get('type', 'general')  # general, symptoms, mental_health, nutrition, telemedicine
         
         if not isinstance(message, str) or not message.strip():
             return jsonify({
@@ -85,27 +94,19 @@ def health_chat():
             gender = data.get('gender')
             
             # Get AI health advice
-            health_advice = get_health_advice(message.strip(), age, gender)
-            
-            response_text = f"Based on your symptoms, here's my advice:\n\n"
-            response_text += f"**Advice:** {health_advice.advice}\n\n"
-            response_text += f"**Urgency Level:** {health_advice.urgency_level}\n\n"
-            response_text += "**Recommended Actions:**\n"
-            for action in health_advice.recommended_actions:
-                response_text += f"• {action}\n"
+            health_advice = await aget_health_advice(message.strip(), age, gender)
+            response_text = _format_health_advice(health_advice)
+        elif chat_type in URGENT_CHAT_TYPES:
+            # Telemedicine support is latency-critical, so the provider layer
+            # hedges slow requests across Groq and Gemini.
+            context = f"Health and wellness chat - Type: {chat_type}"
+            response_text = await aurgent_chat_response(message.strip(), context)
         else:
             # General health chat
             context = f"Health and wellness chat - Type: {chat_type}"
-            response_text = general_chat_response(message.strip(), context)
-        
-        # Save chat session
-        chat_session = ChatSession()
-        chat_session.session_id = session_id
-        chat_session.module = 'health'
-        chat_session.message = message
-        chat_session.response = response_text
-        db.session.add(chat_session)
-        db.session.commit()
+            response_text = await ageneral_chat_response(message.strip(), context)
+        
+        _save_chat_session(session_id, message, response_text)
         
         return jsonify({
             'success': True,
@@ -119,30 +120,78 @@ def health_chat():
             'error': 'Health chat service unavailable'
         }), 500
 
+@health_bp.route('/api/health-chat/stream', methods=['POST'])
+@bulkhead('health')
+def health_chat_stream():
+    """Streaming health chatbot endpoint using Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '')
+    session_id = data.get('session_id', str(uuid.uuid4()))
+    chat_type = data.get('type', 'general')
+    
+    if not isinstance(message, str) or not message.strip():
+        return jsonify({
+            'success': False,
+            'error': 'Message is required'
+        }), 400
+    
+    context = f"Health and wellness chat - Type: {chat_type}"
+    if chat_type == 'symptoms':
+        # Structured advice cannot be streamed token by token, so it is sent
+        # as a single chunk once the provider answers.
+        chunks = deferred(lambda: _format_health_advice(
+            get_health_advice(message.strip(), data.get('age'), data.get('gender'))
+        ))
+    elif chat_type in URGENT_CHAT_TYPES:
+        chunks = deferred(lambda: urgent_chat_response(message.strip(), context))
+    else:
+        chunks = general_chat_stream(message.strip(), context)
+    
+    return stream_text(
+        chunks,
+        on_complete=lambda text: _save_chat_session(session_id, message, text),
+        session_id=session_id
+    )
+
+def _format_health_advice(health_advice):
+    response_text = f"Based on your symptoms, here's my advice:\n\n"
+    response_text += f"**Advice:** {health_advice.advice}\n\n"
+    response_text += f"**Urgency Level:** {health_advice.urgency_level}\n\n"
+    response_text += "**Recommended Actions:**\n"
+    for action in health_advice.recommended_actions:
+        response_text += f"• {action}\n"
+    return response_text
+
+def _save_chat_session(session_id, message, response_text):
+    chat_session = ChatSession()
+    chat_session.session_id = session_id
+    chat_session.module = 'health'
+    chat_session.message = message
+    chat_session.response = response_text
+    db.session.add(chat_session)
+    db.session.commit()
+
 @health_bp.route('/api/health-services')
 def get_health_services():
-    """Get health services for mapping"""
+    """Get health services for mapping, one keyset page at a time (``cursor``, ``limit``, ``fields``)
+
+    Facilities have no creation time, so pages follow ``id``.
+    """
     try:
-        services = HealthService.query.filter_by(is_active=True).all()
-        services_data = []
-        
-        for service in services:
-            services_data.append({
-                'id': service.id,
-                'name': service.name,
-                'service_type': service.service_type,
-                'address': service.address,
-                'latitude': service.latitude,
-                'longitude': service.longitude,
-                'contact_info': service.contact_info,
-                'hours': service.hours,
-                'services_offered': service.services_offered
-            })
+        fields = parse_fields(request.args.get('fields'), SERVICE_FIELDS)
+        page = keyset_page(
+            HealthService.query.filter_by(is_active=True), (HealthService.id,),
+            request.args.get('cursor'), page_size(request.args.get('limit'), default=100, maximum=500),
+            descending=False, columns=[getattr(HealthService, field) for field in fields],
+        )
         
         return jsonify({
             'success': True,
-            'services': services_data
+            'services': page.items,
+            'next_cursor': page.next_cursor
         })
+    except PaginationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Health services error: {e}")
         return jsonify({
@@ -152,11 +201,17 @@ def get_health_services():
 
 @health_bp.route('/api/nearby-facilities')
 def get_nearby_facilities():
-    """Get nearby medical facilities for mapping with location filtering"""
+    """Get nearby medical facilities for mapping with location filtering.
+
+    With ``lat``/``lng``, only facilities within ``radius`` km are returned,
+    nearest first. Adding ``k`` returns the k nearest facilities within
+    ``radius`` (up to 100 km when no radius is given).
+    """
     try:
         lat = request.args.get('lat', type=float)
         lng = request.args.get('lng', type=float)
-        radius = request.args.get('radius', type=float, default=5)
+        k = request.args.get('k', type=int)
+        radius = request.args.get('radius', type=float, default=100 if k else 5)
         radius = min(max(radius, 1), 100)
         facility_type = request.args.get('type', default='all')
         
@@ -167,32 +222,26 @@ def get_nearby_facilities():
         if facility_type and facility_type != 'all':
             query = query.filter(HealthService.service_type.ilike(f'%{facility_type}%'))
         
-        services = query.all()
-        facilities_data = []
-        
-        # Convert services to the expected format for the map
-        for service in services:
+        if lat is not None and lng is not None:
+            def fetch_box(min_lat, max_lat, min_lng, max_lng):
+                # Bounding-box prefilter served by the (is_active, latitude,
+                # longitude) index; exact distances are computed afterwards.
+                box = query.filter(HealthService.latitude.between(min_lat, max_lat))
+                if min_lng is not None:
+                    box = box.filter(HealthService.longitude.between(min_lng, max_lng))
+                return box.all()
+
+            if k:
+                matches = nearest(fetch_box, lat, lng, min(max(k, 1), 200), radius)
+            else:
+                matches = within_radius(fetch_box(*bounding_box(lat, lng, radius)), lat, lng, radius)
+        else:
             # Skip if no location data
-            if not service.latitude or not service.longitude:
-                continue
-                
-            # Calculate distance if lat/lng provided (basic calculation)
-            if lat is not None and lng is not None:
-                # Haversine distance in kilometres.
-                earth_radius_km = 6371
-                lat1, lat2 = math.radians(lat), math.radians(service.latitude)
-                delta_lat = math.radians(service.latitude - lat)
-                delta_lng = math.radians(service.longitude - lng)
-                haversine = (
-                    math.sin(delta_lat / 2) ** 2
-                    + math.cos(lat1) * math.cos(lat2) * math.sin(delta_lng / 2) ** 2
-                )
-                distance = 2 * earth_radius_km * math.asin(math.sqrt(haversine))
-                
-                # Skip if outside radius
-                if distance > radius:
-                    continue
-            
+            matches = [(service, None) for service in query.all()
+                       if service.latitude and service.longitude]
+        
+        facilities_data = []
+        for service, distance in matches:
             # Format phone number
             phone = service.contact_info if service.contact_info else 'Not available'
             
@@ -206,7 +255,7 @@ def get_nearby_facilities():
                 'phone': phone,
                 'hours': service.hours if service.hours else 'Hours not available',
                 'services': service.services_offered if service.services_offered else 'General medical services'
-                , 'distance_km': round(distance, 1) if lat is not None and lng is not None else None
+                , 'distance_km': round(distance, 1) if distance is not None else None
             })
         
         return jsonify({
@@ -220,6 +269,37 @@ def get_nearby_facilities():
             'error': 'Unable to load nearby facilities'
         }), 500
 
+@health_bp.route('/api/geocode')
+def geocode_location():
+    """Geocode a place or facility name through the cached Nominatim proxy"""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'Query parameter q is required'}), 400
+    try:
+        results = geocode(query[:200], request.args.get('limit', type=int, default=5))
+        return jsonify({'success': True, 'results': results})
+    except OSMUpstreamError as e:
+        logging.error(f"Geocoding error: {e}")
+        return jsonify({'success': False, 'error': 'Geocoding service unavailable'}), 502
+
+@health_bp.route('/api/osm-facilities')
+def get_osm_facilities():
+    """OpenStreetMap medical facilities near a point, through the cached Overpass proxy"""
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({'success': False, 'error': 'Valid lat and lng are required'}), 400
+    try:
+        facilities = osm_facilities(
+            lat, lng,
+            request.args.get('radius', type=float, default=5),
+            request.args.get('type') or None,
+        )
+        return jsonify({'success': True, 'facilities': facilities})
+    except OSMUpstreamError as e:
+        logging.error(f"Overpass lookup error: {e}")
+        return jsonify({'success': False, 'error': 'Map data service unavailable'}), 502
+
 @health_bp.route('/self-assessment')
 def self_assessment():
     """Health self-assessment tools"""
@@ -1,5 +1,15 @@
 from flask import Blueprint, render_template, request, jsonify
 import logging
+from bulkhead import get_bulkhead_stats
+from metrics import metrics_response
+from gemini import get_cache_stats, get_hedge_stats, get_inflight_stats, get_provider_stats
+from app import db
+from course_index import course_index
+from job_index import job_index
+from live_updates import hub as live_updates_hub
+from prewarm import get_prewarm_stats
+from swr_cache import get_swr_stats
+from search import SOURCES, search
 
 main_bp = Blueprint('main', __name__)
 
@@ -54,3 +64,65 @@ def speech_to_text():
             'success': False,
             'error': 'Speech recognition failed'
         }), 500
+
+def _flag(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+@main_bp.route('/api/search')
+def search_api():
+    """Full-text search across jobs, skill listings, courses and food listings
+
+    ``q`` is required; ``type`` (comma-separated: job, skill, course, food),
+    ``category``, ``location``, ``is_remote``, ``is_free`` and ``limit`` filter it.
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'Query parameter q is required'}), 400
+    kinds = [kind for kind in (request.args.get('type') or '').split(',') if kind]
+    unknown = [kind for kind in kinds if kind not in SOURCES]
+    if unknown:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown type: {', '.join(unknown)}. Available: {', '.join(SOURCES)}"
+        }), 400
+    try:
+        is_remote, is_free = _flag('is_remote'), _flag('is_free')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    results = search(
+        db.session.connection(), query[:200], kinds,
+        category=request.args.get('category'), location=request.args.get('location'),
+        is_remote=is_remote, is_free=is_free,
+        limit=request.args.get('limit', type=int, default=20),
+    )
+    return jsonify({'success': True, 'results': results})
+
+@main_bp.route('/api/ai/stats')
+def ai_stats():
+    """Operational counters for the shared AI provider layer"""
+    return jsonify({
+        'success': True,
+        'cache': get_cache_stats(),
+        'in_flight': get_inflight_stats(),
+        'providers': get_provider_stats(),
+        'hedging': get_hedge_stats(),
+        'bulkheads': get_bulkhead_stats(),
+        'job_index': job_index.stats(),
+        'course_index': course_index.stats(),
+        'swr_caches': get_swr_stats(),
+        'prewarm': get_prewarm_stats(),
+        'live_updates': live_updates_hub.stats()
+    })
+
+@main_bp.route('/metrics')
+def metrics():
+    """Prometheus metrics, aggregated across gunicorn workers"""
+    return metrics_response()
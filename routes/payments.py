@@ -3,6 +3,7 @@ import stripe
 import os
 import logging
 from models import FoodListing
+from metrics import time_stripe
 
 payments_bp = Blueprint('payments', __name__)
 
@@ -62,34 +63,35 @@ def create_checkout_session():
         amount = int(round(float(listing.price) * 100))
         return_url = data.get('return_url', '/food/marketplace')
 
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[
-                {
-                    'price_data': {
-                        'currency': 'usd',
-                        'product_data': {
-                            'name': listing.title,
-                            'description': listing.description[:500],
+        with time_stripe('checkout_session_create'):
+            checkout_session = stripe.checkout.Session.create(
+                payment_method_types=['card'],
+                line_items=[
+                    {
+                        'price_data': {
+                            'currency': 'usd',
+                            'product_data': {
+                                'name': listing.title,
+                                'description': listing.description[:500],
+                            },
+                            'unit_amount': amount,
                         },
-                        'unit_amount': amount,
+                        'quantity': 1,
                     },
-                    'quantity': 1,
-                },
-            ],
-            mode='payment',
-            success_url=_absolute_url(
-                'payments.payment_success',
-                session_id='{CHECKOUT_SESSION_ID}'
-            ),
-            cancel_url=_absolute_url('payments.payment_cancel'),
-            client_reference_id=f'food_listing:{listing.id}',
-            metadata={
-                'return_url': return_url,
-                'food_listing_id': str(listing.id),
-                'item_name': listing.title,
-            }
-        )
+                ],
+                mode='payment',
+                success_url=_absolute_url(
+                    'payments.payment_success',
+                    session_id='{CHECKOUT_SESSION_ID}'
+                ),
+                cancel_url=_absolute_url('payments.payment_cancel'),
+                client_reference_id=f'food_listing:{listing.id}',
+                metadata={
+                    'return_url': return_url,
+                    'food_listing_id': str(listing.id),
+                    'item_name': listing.title,
+                }
+            )
 
         if request.is_json:
             return jsonify({
@@ -139,7 +141,8 @@ def payment_success():
                                    return_url='/food/marketplace',
                                    error='Stripe checkout is not configured yet.')
         if session_id:
-            session = stripe.checkout.Session.retrieve(session_id)
+            with time_stripe('checkout_session_retrieve'):
+                session = stripe.checkout.Session.retrieve(session_id)
             return_url = session.metadata.get('return_url', '/dashboard')
 
             return render_template('payments/success.html', 
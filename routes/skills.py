@@ -4,9 +4,22 @@ import uuid
 from datetime import datetime
 from models import SkillListing, JobListing, CourseListing
 from app import db
-from gemini import match_job_to_skills, general_chat_response
+from bulkhead import bulkhead
+from course_index import course_index
+from gemini import general_chat_stream
+from gemini_async import amatch_job_to_skills, amatch_jobs_to_skills, ageneral_chat_response
+from job_index import job_index
+from pagination import PaginationError, keyset_page, page_size, parse_fields
+from streaming import stream_text
 
 skills_bp = Blueprint('skills', __name__)
+JOB_FIELDS = ('id', 'title', 'description', 'company', 'location', 'is_remote',
+              'skills_required', 'salary_range', 'contact_info', 'created_at')
+JOB_ORDER = (JobListing.created_at, JobListing.id)
+MAX_AI_MATCHES = 10
+MAX_COMPARED_JOBS = 20
+MAX_COURSES_PER_GAP = 5
+MAX_SKILL_GAPS = 10
 
 @skills_bp.route('/')
 def index():
@@ -19,8 +32,25 @@ def index():
 @skills_bp.route('/jobs')
 def jobs():
     """Job listings and matching"""
-    all_jobs = JobListing.query.order_by(JobListing.created_at.desc()).all()
-    return render_template('skills/jobs.html', jobs=all_jobs)
+    try:
+        page = keyset_page(JobListing.query, JOB_ORDER, request.args.get('cursor'))
+    except PaginationError:
+        return redirect(url_for('skills.jobs'))
+    return render_template('skills/jobs.html', jobs=page.items, next_cursor=page.next_cursor)
+
+@skills_bp.route('/api/jobs')
+def api_jobs():
+    """Newest job listings, one keyset page at a time (``cursor``, ``limit``, ``fields``)"""
+    try:
+        fields = parse_fields(request.args.get('fields'), JOB_FIELDS)
+        page = keyset_page(
+            JobListing.query, JOB_ORDER, request.args.get('cursor'),
+            page_size(request.args.get('limit')),
+            columns=[getattr(JobListing, field) for field in fields],
+        )
+    except PaginationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'jobs': page.items, 'next_cursor': page.next_cursor})
 
 @skills_bp.route('/learning')
 def learning():
@@ -82,21 +112,35 @@ def tutorials():
     return render_template('skills/tutorials.html')
 
 @skills_bp.route('/api/job-match', methods=['POST'])
-def job_match():
-    """AI-powered job matching"""
+@bulkhead('skills')
+async def job_match():
+    """AI-powered job matching; ``job_descriptions`` compares several jobs in batched calls"""
     try:
         data = request.get_json()
         job_description = data.get('job_description', '')
+        job_descriptions = data.get('job_descriptions')
         user_skills = data.get('skills', [])
         
-        if not job_description or not user_skills:
+        if not (job_description or job_descriptions) or not user_skills:
             return jsonify({
                 'success': False,
                 'error': 'Job description and skills are required'
             }), 400
         
+        if job_descriptions:
+            if not isinstance(job_descriptions, list) or len(job_descriptions) > MAX_COMPARED_JOBS:
+                return jsonify({
+                    'success': False,
+                    'error': f'job_descriptions must be a list of at most {MAX_COMPARED_JOBS} jobs'
+                }), 400
+            results = await amatch_jobs_to_skills([str(job) for job in job_descriptions], user_skills)
+            return jsonify({
+                'success': True,
+                'matches': [result.model_dump() for result in results]
+            })
+        
         # The shared AI provider layer tries Groq first, then Gemini.
-        match_result = match_job_to_skills(job_description, user_skills)
+        match_result = await amatch_job_to_skills(job_description, user_skills)
         
         return jsonify({
             'success': True,
@@ -112,6 +156,104 @@ def job_match():
             'error': 'Job matching service unavailable'
         }), 500
 
+def _job_match_prompt(job):
+    prompt = f"{job.title} at {job.company}\n{job.description}"
+    if job.skills_required:
+        prompt += f"\nRequired skills: {job.skills_required}"
+    return prompt
+
+@skills_bp.route('/api/job-match/batch', methods=['POST'])
+@bulkhead('skills')
+async def job_match_batch():
+    """Rank every job against the user's skills locally, then AI-evaluate the top ``top_k``"""
+    data = request.get_json(silent=True) or {}
+    user_skills = data.get('skills', [])
+    if isinstance(user_skills, str):
+        user_skills = [skill.strip() for skill in user_skills.split(',')]
+    user_skills = [str(skill) for skill in user_skills if str(skill).strip()]
+    if not user_skills:
+        return jsonify({
+            'success': False,
+            'error': 'Skills are required'
+        }), 400
+    try:
+        top_k = min(max(int(data.get('top_k', 5)), 1), MAX_AI_MATCHES)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'top_k must be an integer'}), 400
+
+    try:
+        ranked = job_index.rank(user_skills, top_k)
+        jobs = {job.id: job for job in JobListing.query.filter(
+            JobListing.id.in_([job_id for job_id, _ in ranked])
+        )}
+        ranked = [(jobs[job_id], score) for job_id, score in ranked if job_id in jobs]
+        results = await amatch_jobs_to_skills([_job_match_prompt(job) for job, _ in ranked], user_skills)
+
+        matches = [{
+            'job_id': job.id,
+            'title': job.title,
+            'company': job.company,
+            'location': job.location,
+            'is_remote': job.is_remote,
+            'lexical_score': score,
+            'match_score': result.match_score,
+            'reasons': result.reasons,
+            'skill_gaps': result.skill_gaps,
+            'recommendations': result.recommendations
+        } for (job, score), result in zip(ranked, results)]
+        matches.sort(key=lambda match: match['match_score'], reverse=True)
+        return jsonify({'success': True, 'matches': matches})
+    except Exception as e:
+        logging.error(f"Batch job matching error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Job matching service unavailable'
+        }), 500
+
+@skills_bp.route('/api/recommend-courses', methods=['POST'])
+def recommend_courses():
+    """Closest courses for each skill gap from the offline course index"""
+    data = request.get_json(silent=True) or {}
+    skill_gaps = data.get('skill_gaps', [])
+    if isinstance(skill_gaps, str):
+        skill_gaps = [gap.strip() for gap in skill_gaps.split(',')]
+    skill_gaps = list(dict.fromkeys(str(gap).strip() for gap in skill_gaps if str(gap).strip()))
+    if not skill_gaps:
+        return jsonify({
+            'success': False,
+            'error': 'Skill gaps are required'
+        }), 400
+    try:
+        limit = min(max(int(data.get('limit', 3)), 1), MAX_COURSES_PER_GAP)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+
+    # Later gaps skip courses already recommended for an earlier one.
+    ranked, seen = [], set()
+    for gap in skill_gaps[:MAX_SKILL_GAPS]:
+        matches = course_index.search(gap, limit, exclude=seen)
+        seen.update(course_id for course_id, _ in matches)
+        ranked.append((gap, matches))
+    courses = {course.id: course for course in CourseListing.query.filter(CourseListing.id.in_(seen))}
+
+    return jsonify({
+        'success': True,
+        'recommendations': [{
+            'skill_gap': gap,
+            'courses': [{
+                'id': course_id,
+                'title': courses[course_id].title,
+                'provider': courses[course_id].provider,
+                'category': courses[course_id].category,
+                'difficulty_level': courses[course_id].difficulty_level,
+                'duration': courses[course_id].duration,
+                'is_free': courses[course_id].is_free,
+                'course_url': courses[course_id].course_url,
+                'similarity': score
+            } for course_id, score in matches if course_id in courses]
+        } for gap, matches in ranked]
+    })
+
 @skills_bp.route('/post-job', methods=['GET', 'POST'])
 def post_job():
     """Post a new job listing"""
@@ -224,7 +366,8 @@ def volunteer_opportunities():
     return render_template('skills/index.html', volunteer_opportunities=opportunities)
 
 @skills_bp.route('/api/career-plan', methods=['POST'])
-def generate_career_plan():
+@bulkhead('skills')
+async def generate_career_plan():
     """Generate AI-powered career development plan"""
     try:
         data = request.form
@@ -239,27 +382,10 @@ def generate_career_plan():
                 'error': 'Career goal and current level are required'
             }), 400
         
-        # Create prompt for AI career planning
-        prompt = f"""
-        Create a comprehensive career development plan for someone with the following details:
-        
-        Career Goal: {career_goal}
-        Current Level: {current_level}
-        Timeline: {timeframe}
-        Current Skills: {current_skills}
-        
-        Please provide:
-        1. A clear learning pathway with specific steps
-        2. Skill development priorities
-        3. Resources and opportunities to pursue
-        4. Realistic milestones and timelines
-        5. Potential challenges and how to overcome them
-        
-        Focus on practical, actionable advice for someone in an underserved community.
-        """
+        prompt = _career_plan_prompt(career_goal, current_level, timeframe, current_skills)
         
         # Get AI response
-        ai_response = general_chat_response(prompt, "Career development planning")
+        ai_response = await ageneral_chat_response(prompt, "Career development planning")
         
         return jsonify({
             'success': True,
@@ -275,8 +401,47 @@ def generate_career_plan():
             'error': 'Career planning service unavailable'
         }), 500
 
+@skills_bp.route('/api/career-plan/stream', methods=['POST'])
+@bulkhead('skills')
+def career_plan_stream():
+    """Streaming career development plan using Server-Sent Events"""
+    data = request.form
+    career_goal = data.get('careerGoal', '')
+    current_level = data.get('currentLevel', '')
+    
+    if not career_goal or not current_level:
+        return jsonify({
+            'success': False,
+            'error': 'Career goal and current level are required'
+        }), 400
+    
+    prompt = _career_plan_prompt(career_goal, current_level,
+                                 data.get('timeframe', ''), data.get('currentSkills', ''))
+    return stream_text(general_chat_stream(prompt, "Career development planning"))
+
+def _career_plan_prompt(career_goal, current_level, timeframe, current_skills):
+    """Build the career development planning prompt"""
+    return f"""
+        Create a comprehensive career development plan for someone with the following details:
+        
+        Career Goal: {career_goal}
+        Current Level: {current_level}
+        Timeline: {timeframe}
+        Current Skills: {current_skills}
+        
+        Please provide:
+        1. A clear learning pathway with specific steps
+        2. Skill development priorities
+        3. Resources and opportunities to pursue
+        4. Realistic milestones and timelines
+        5. Potential challenges and how to overcome them
+        
+        Focus on practical, actionable advice for someone in an underserved community.
+        """
+
 @skills_bp.route('/api/skill-assessment', methods=['POST'])
-def skill_assessment():
+@bulkhead('skills')
+async def skill_assessment():
     """AI-powered skill assessment"""
     try:
         data = request.get_json()
@@ -306,7 +471,7 @@ def skill_assessment():
         Focus on practical, community-relevant skills development.
         """
         
-        ai_response = general_chat_response(prompt, "Skill assessment")
+        ai_response = await ageneral_chat_response(prompt, "Skill assessment")
         
         return jsonify({
             'success': True,
@@ -325,7 +490,8 @@ def skill_assessment():
         }), 500
 
 @skills_bp.route('/api/learning-feedback', methods=['POST'])
-def learning_feedback():
+@bulkhead('skills')
+async def learning_feedback():
     """Provide AI feedback on learning exercises"""
     try:
         data = request.get_json()
@@ -355,7 +521,7 @@ def learning_feedback():
         Keep feedback encouraging and focused on practical application.
         """
         
-        ai_feedback = general_chat_response(prompt, "Learning feedback")
+        ai_feedback = await ageneral_chat_response(prompt, "Learning feedback")
         
         return jsonify({
             'success': True,
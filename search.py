@@ -0,0 +1,303 @@
+"""Full-text search across jobs, skill listings, courses and food listings.
+
+Searchable rows are copied into one ``search_documents`` table, and the
+configured database's own full-text engine indexes it:
+
+* SQLite: an external-content FTS5 table over title, skills and body, kept
+  current by triggers and ranked with BM25.
+* PostgreSQL: a weighted, generated ``tsvector`` column with a GIN index,
+  ranked with ``ts_rank_cd`` (PostgreSQL has no built-in BM25).
+
+Other databases, and SQLite builds without FTS5, fall back to LIKE matching.
+ORM events update a row's document in the same transaction as the insert,
+update or delete that changed it. Bulk ``Query.update``/``delete`` calls skip
+ORM events; run ``python search.py --rebuild`` after those. Migration 4
+creates the index and fills it from existing rows.
+"""
+import argparse
+import logging
+import re
+import sys
+from dataclasses import dataclass
+
+from sqlalchemy import (Boolean, Column, Integer, MetaData, String, Table, Text,
+                        UniqueConstraint, event, select, text)
+
+from models import CourseListing, FoodListing, JobListing, SkillListing
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MAX_TERMS = 8
+MAX_RANKED_CANDIDATES = 1000
+SUMMARY_CHARS = 200
+
+_metadata = MetaData()
+search_documents = Table(
+    "search_documents", _metadata,
+    Column("id", Integer, primary_key=True),
+    Column("kind", String(20), nullable=False),
+    Column("ref_id", Integer, nullable=False),
+    Column("title", Text, nullable=False),
+    Column("skills", Text, nullable=False, default=""),
+    Column("body", Text, nullable=False, default=""),
+    Column("category", String(100)),
+    Column("location", String(120)),
+    Column("is_remote", Boolean),
+    Column("is_free", Boolean),
+    UniqueConstraint("kind", "ref_id", name="uq_search_documents_kind_ref"),
+)
+
+_SQLITE_FTS = [
+    # prefix='2 3' keeps short prefix queries on the index.
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+        title, skills, body, content='search_documents', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')""",
+    # Title matches count most, then skills/category, then the description.
+    "INSERT INTO search_fts(search_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_fts(rowid, title, skills, body) VALUES (new.id, new.title, new.skills, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, skills, body)
+        VALUES ('delete', old.id, old.title, old.skills, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, skills, body)
+        VALUES ('delete', old.id, old.title, old.skills, old.body);
+        INSERT INTO search_fts(rowid, title, skills, body) VALUES (new.id, new.title, new.skills, new.body);
+    END""",
+]
+
+_POSTGRES_FTS = [
+    """ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS tsv tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', title), 'A') ||
+        setweight(to_tsvector('english', skills), 'B') ||
+        setweight(to_tsvector('english', body), 'C')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents USING GIN (tsv)",
+]
+
+
+@dataclass(frozen=True)
+class Source:
+    kind: str
+    model: type
+    document: object  # row -> dict of search fields, or None to drop it
+
+
+def _job(row):
+    return {
+        "title": row.title, "skills": row.skills_required or "",
+        "body": f"{row.company}. {row.description}",
+        "category": None, "location": row.location, "is_remote": bool(row.is_remote), "is_free": None,
+    }
+
+
+def _skill(row):
+    return {
+        "title": row.title, "skills": f"{row.skill_category} {row.difficulty_level}",
+        "body": row.description,
+        "category": row.skill_category, "location": row.location,
+        "is_remote": bool(row.is_remote), "is_free": None,
+    }
+
+
+def _course(row):
+    return {
+        "title": row.title, "skills": f"{row.category} {row.difficulty_level}",
+        "body": f"{row.provider}. {row.description}",
+        "category": row.category, "location": None, "is_remote": True, "is_free": bool(row.is_free),
+    }
+
+
+def _food(row):
+    if row.is_available is False:
+        return None
+    return {
+        "title": row.title, "skills": row.category, "body": row.description,
+        "category": row.category, "location": row.location,
+        "is_remote": None, "is_free": not row.price,
+    }
+
+
+SOURCES = {
+    source.kind: source for source in (
+        Source("job", JobListing, _job),
+        Source("skill", SkillListing, _skill),
+        Source("course", CourseListing, _course),
+        Source("food", FoodListing, _food),
+    )
+}
+
+_UPSERT = text(
+    "INSERT INTO search_documents (kind, ref_id, title, skills, body, category, location, is_remote, is_free) "
+    "VALUES (:kind, :ref_id, :title, :skills, :body, :category, :location, :is_remote, :is_free) "
+    "ON CONFLICT (kind, ref_id) DO UPDATE SET title = excluded.title, skills = excluded.skills, "
+    "body = excluded.body, category = excluded.category, location = excluded.location, "
+    "is_remote = excluded.is_remote, is_free = excluded.is_free"
+)
+_DELETE = text("DELETE FROM search_documents WHERE kind = :kind AND ref_id = :ref_id")
+
+# Engine URL -> "fts5", "tsvector" or "like"
+_backends: dict[str, str] = {}
+
+
+def install(conn):
+    """Create the documents table and the full-text index for ``conn``'s database."""
+    search_documents.create(conn, checkfirst=True)
+    if conn.dialect.name == "sqlite":
+        try:
+            for statement in _SQLITE_FTS:
+                conn.exec_driver_sql(statement)
+        except Exception as exc:
+            logging.warning("SQLite FTS5 unavailable, search falls back to LIKE: %s", exc)
+    elif conn.dialect.name == "postgresql":
+        for statement in _POSTGRES_FTS:
+            conn.exec_driver_sql(statement)
+    _backends.pop(str(conn.engine.url), None)
+
+
+def rebuild(conn, batch_size: int = 1000) -> int:
+    """Re-index every searchable row and return the number of documents."""
+    conn.execute(search_documents.delete())
+    total = 0
+    for source in SOURCES.values():
+        result = conn.execution_options(yield_per=batch_size).execute(select(source.model.__table__))
+        for rows in result.partitions():
+            documents = [
+                {"kind": source.kind, "ref_id": row.id, **document}
+                for row in rows if (document := source.document(row)) is not None
+            ]
+            if documents:
+                conn.execute(_UPSERT, documents)
+                total += len(documents)
+    if _backend(conn) == "fts5":
+        conn.exec_driver_sql("INSERT INTO search_fts(search_fts) VALUES ('optimize')")
+    return total
+
+
+def _sync(mapper, connection, target):
+    source = SOURCES[target.__search_kind__]
+    document = source.document(target)
+    if document is None:
+        connection.execute(_DELETE, {"kind": source.kind, "ref_id": target.id})
+    else:
+        connection.execute(_UPSERT, {"kind": source.kind, "ref_id": target.id, **document})
+
+
+def _unsync(mapper, connection, target):
+    connection.execute(_DELETE, {"kind": target.__search_kind__, "ref_id": target.id})
+
+
+for _source in SOURCES.values():
+    _source.model.__search_kind__ = _source.kind
+    event.listen(_source.model, "after_insert", _sync)
+    event.listen(_source.model, "after_update", _sync)
+    event.listen(_source.model, "after_delete", _unsync)
+
+
+def _backend(conn) -> str:
+    key = str(conn.engine.url)
+    backend = _backends.get(key)
+    if backend is None:
+        if conn.dialect.name == "postgresql":
+            backend = "tsvector"
+        elif conn.dialect.name == "sqlite" and conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = 'search_fts'").first():
+            backend = "fts5"
+        else:
+            backend = "like"
+        _backends[key] = backend
+    return backend
+
+
+def search(conn, query: str, kinds=None, category: str | None = None, location: str | None = None,
+           is_remote: bool | None = None, is_free: bool | None = None,
+           limit: int = DEFAULT_LIMIT) -> list[dict]:
+    """Rank documents matching every word of ``query``; the last word may be a prefix.
+
+    Only the newest ``MAX_RANKED_CANDIDATES`` matches are ranked. Scoring every
+    match of a common word costs hundreds of milliseconds at a million rows,
+    while selective queries have fewer matches than that and rank exactly.
+    """
+    terms = re.findall(r"\w+", query.casefold())[:MAX_TERMS]
+    if not terms:
+        return []
+
+    filters, params = [], {"limit": min(max(limit, 1), MAX_LIMIT), "candidates": MAX_RANKED_CANDIDATES}
+    if kinds:
+        names = [f"kind_{i}" for i in range(len(kinds))]
+        filters.append(f"d.kind IN ({', '.join(':' + name for name in names)})")
+        params.update(zip(names, kinds))
+    if category:
+        filters.append("lower(d.category) = :category")
+        params["category"] = category.casefold()
+    if location:
+        filters.append("lower(d.location) LIKE :location")
+        params["location"] = f"%{location.casefold()}%"
+    if is_remote is not None:
+        filters.append("d.is_remote = :is_remote")
+        params["is_remote"] = is_remote
+    if is_free is not None:
+        filters.append("d.is_free = :is_free")
+        params["is_free"] = is_free
+    where = "".join(f" AND {condition}" for condition in filters)
+
+    columns = "d.kind, d.ref_id, d.title, d.body, d.category, d.location, d.is_remote, d.is_free"
+    backend = _backend(conn)
+    if backend == "fts5":
+        *words, last = terms
+        params["match"] = " ".join([f'"{word}"' for word in words] + [f'"{last}"*'])
+        join = " JOIN search_documents d ON d.id = search_fts.rowid" if filters else ""
+        sql = (
+            f"SELECT {columns}, -c.rank AS score FROM ("
+            f"SELECT search_fts.rowid AS id, search_fts.rank AS rank FROM search_fts{join} "
+            f"WHERE search_fts MATCH :match{where} ORDER BY search_fts.rowid DESC LIMIT :candidates"
+            ") c JOIN search_documents d ON d.id = c.id ORDER BY c.rank LIMIT :limit"
+        )
+    elif backend == "tsvector":
+        params["match"] = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        sql = (
+            f"SELECT {columns}, ts_rank_cd(d.tsv, q) AS score FROM ("
+            "SELECT d.id FROM search_documents d "
+            f"WHERE d.tsv @@ to_tsquery('english', :match){where} ORDER BY d.id DESC LIMIT :candidates"
+            ") c JOIN search_documents d ON d.id = c.id, to_tsquery('english', :match) q "
+            "ORDER BY score DESC LIMIT :limit"
+        )
+    else:
+        likes = []
+        for i, term in enumerate(terms):
+            params[f"term_{i}"] = f"%{term}%"
+            likes.append(f"(lower(d.title) LIKE :term_{i} OR lower(d.skills) LIKE :term_{i} "
+                         f"OR lower(d.body) LIKE :term_{i})")
+        sql = (f"SELECT {columns}, 0 AS score FROM search_documents d "
+               f"WHERE {' AND '.join(likes)}{where} ORDER BY d.id DESC LIMIT :limit")
+
+    return [
+        {
+            "kind": row.kind, "id": row.ref_id, "title": row.title,
+            "summary": row.body[:SUMMARY_CHARS], "category": row.category, "location": row.location,
+            "is_remote": row.is_remote, "is_free": row.is_free, "score": round(float(row.score), 4),
+        }
+        for row in conn.execute(text(sql), params)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the full-text search index.")
+    parser.add_argument("--rebuild", action="store_true", help="re-index every searchable row")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    from app import app, db
+
+    with app.app_context(), db.engine.begin() as conn:
+        install(conn)
+        print(f"Indexed {rebuild(conn)} documents")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -694,5 +694,48 @@ window.utils = {
                 setTimeout(() => inThrottle = false, limit);
             }
         };
+    },
+    
+    // POST to a Server-Sent Events endpoint and dispatch each event.
+    // EventSource only supports GET, so the stream is read with fetch.
+    // handlers: { onToken(text), onDone(payload), onError(payload) }
+    streamEvents: async function(url, options, handlers) {
+        const response = await fetch(url, options);
+        if (!response.ok || !response.body) {
+            throw new Error(`Stream request failed with status ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let event = 'message';
+                let data = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                if (!data) continue;
+                
+                const payload = JSON.parse(data);
+                if (event === 'done') {
+                    handlers.onDone && handlers.onDone(payload);
+                } else if (event === 'error') {
+                    handlers.onError && handlers.onError(payload);
+                } else if (payload.token !== undefined) {
+                    handlers.onToken && handlers.onToken(payload.token);
+                }
+            }
+        }
     }
 };
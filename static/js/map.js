@@ -161,33 +161,36 @@ function searchManualLocation() {
     locationStatus.classList.remove('d-none');
     locationText.textContent = 'Searching for location...';
     
-    // First, try to search for hospitals with this name in India
-    const hospitalSearchUrl = `https://nominatim.openstreetmap.org/search?format=json&q=${encodeURIComponent(searchQuery + ' India')}&limit=10&addressdetails=1&countrycodes=in`;
-    
-    fetch(hospitalSearchUrl)
+    // One cached server-side lookup covers both hospital names and addresses
+    fetch(`/health/api/geocode?q=${encodeURIComponent(searchQuery)}&limit=5`)
         .then(response => response.json())
-        .then(hospitalData => {
+        .then(data => {
             searchBtn.disabled = false;
             searchBtn.innerHTML = '<i class="fas fa-search"></i>';
             
-            if (hospitalData && hospitalData.length > 0) {
-                // Found hospital(s) - use the first one
-                const hospital = hospitalData[0];
+            if (!data.success) {
+                throw new Error(data.error || 'Geocoding failed');
+            }
+            
+            if (data.results && data.results.length > 0) {
+                // Prefer a hospital match, otherwise use the best match
+                const hospital = data.results.find(result => result.type === 'hospital');
+                const result = hospital || data.results[0];
                 userLocation = {
-                    lat: parseFloat(hospital.lat),
-                    lng: parseFloat(hospital.lon)
+                    lat: result.lat,
+                    lng: result.lng
                 };
                 
                 // Update map center
-                map.setView([userLocation.lat, userLocation.lng], 16);
+                map.setView([userLocation.lat, userLocation.lng], hospital ? 16 : 15);
                 
                 // Clear existing markers
                 clearMarkers();
                 
-                // Add hospital location marker
+                // Add location marker (green for a hospital, blue for a place)
                 userMarker = L.marker([userLocation.lat, userLocation.lng], {
                     icon: L.divIcon({
-                        html: '<div style="background-color: #28a745; width: 20px; height: 20px; border-radius: 50%; border: 3px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3);"></div>',
+                        html: `<div style="background-color: ${hospital ? '#28a745' : '#007bff'}; width: 20px; height: 20px; border-radius: 50%; border: 3px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3);"></div>`,
                         iconSize: [20, 20],
                         iconAnchor: [10, 10],
                         className: 'user-location-marker'
@@ -199,64 +202,19 @@ function searchManualLocation() {
                 
                 locationStatus.className = 'alert alert-success';
                 locationStatus.classList.remove('d-none');
-                locationText.textContent = `Hospital found: ${hospital.display_name}`;
+                locationText.textContent = `${hospital ? 'Hospital' : 'Location'} found: ${result.display_name}`;
                 
                 // Auto-search for nearby facilities
                 searchNearbyFacilities();
                 
             } else {
-                // No hospital found, try general location search in India
-                const geocodeUrl = `https://nominatim.openstreetmap.org/search?format=json&q=${encodeURIComponent(searchQuery + ' India')}&limit=1&addressdetails=1&countrycodes=in`;
-                
-                fetch(geocodeUrl)
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data && data.length > 0) {
-                            const result = data[0];
-                            userLocation = {
-                                lat: parseFloat(result.lat),
-                                lng: parseFloat(result.lon)
-                            };
-                            
-                            // Update map center
-                            map.setView([userLocation.lat, userLocation.lng], 15);
-                            
-                            // Clear existing markers
-                            clearMarkers();
-                            
-                            // Add user location marker
-                            userMarker = L.marker([userLocation.lat, userLocation.lng], {
-                                icon: L.divIcon({
-                                    html: '<div style="background-color: #007bff; width: 20px; height: 20px; border-radius: 50%; border: 3px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.3);"></div>',
-                                    iconSize: [20, 20],
-                                    iconAnchor: [10, 10],
-                                    className: 'user-location-marker'
-                                })
-                            }).addTo(map);
-                            
-                            // Enable search button
-                            document.getElementById('search-facilities-btn').disabled = false;
-                            
-                            locationStatus.className = 'alert alert-success';
-                            locationStatus.classList.remove('d-none');
-                            locationText.textContent = `Location found: ${result.display_name}`;
-                            
-                        } else {
-                            locationStatus.className = 'alert alert-warning';
-                            locationStatus.classList.remove('d-none');
-                            locationText.textContent = 'Location not found. Please try a different address or hospital name.';
-                        }
-                    })
-                    .catch(error => {
-                        console.error('Geocoding error:', error);
-                        locationStatus.className = 'alert alert-danger';
-                        locationStatus.classList.remove('d-none');
-                        locationText.textContent = 'Error searching for location. Please try again.';
-                    });
+                locationStatus.className = 'alert alert-warning';
+                locationStatus.classList.remove('d-none');
+                locationText.textContent = 'Location not found. Please try a different address or hospital name.';
             }
         })
         .catch(error => {
-            console.error('Hospital search error:', error);
+            console.error('Geocoding error:', error);
             searchBtn.disabled = false;
             searchBtn.innerHTML = '<i class="fas fa-search"></i>';
             
@@ -330,93 +288,27 @@ function searchOSMFacilities() {
     
     loadingSpinner.style.display = 'block';
     
-    // Define Overpass query based on facility type
-    let amenityQuery = '';
-    switch(facilityType) {
-        case 'hospital':
-            amenityQuery = 'amenity=hospital';
-            break;
-        case 'clinic':
-            amenityQuery = 'amenity=clinic';
-            break;
-        case 'pharmacy':
-            amenityQuery = 'amenity=pharmacy';
-            break;
-        case 'dentist':
-            amenityQuery = 'amenity=dentist';
-            break;
-        case 'doctors':
-            amenityQuery = 'amenity=doctors';
-            break;
-        default:
-            amenityQuery = 'amenity~"^(hospital|clinic|doctors|pharmacy|dentist)$"';
-    }
-    
-    // Overpass API query - focused on India
-    const overpassQuery = `
-        [out:json][timeout:25];
-        (
-          node["${amenityQuery}"](around:${radius * 1609.34},${userLocation.lat},${userLocation.lng});
-          way["${amenityQuery}"](around:${radius * 1609.34},${userLocation.lat},${userLocation.lng});
-          relation["${amenityQuery}"](around:${radius * 1609.34},${userLocation.lat},${userLocation.lng});
-        );
-        out center meta;
-    `;
-    
-    const overpassUrl = 'https://overpass-api.de/api/interpreter';
-    
-    fetch(overpassUrl, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/x-www-form-urlencoded',
-        },
-        body: `data=${encodeURIComponent(overpassQuery)}`
-    })
+    // OpenStreetMap data through the cached server-side Overpass proxy
+    fetch(`/health/api/osm-facilities?lat=${userLocation.lat}&lng=${userLocation.lng}&radius=${radius}&type=${facilityType}`)
     .then(response => response.json())
     .then(data => {
         loadingSpinner.style.display = 'none';
         
-        if (data.elements && data.elements.length > 0) {
-            const facilities = data.elements.map(element => {
-                // Get coordinates (handle different OSM element types)
-                let lat, lon;
-                if (element.lat && element.lon) {
-                    lat = element.lat;
-                    lon = element.lon;
-                } else if (element.center) {
-                    lat = element.center.lat;
-                    lon = element.center.lon;
-                } else {
-                    return null;
-                }
-                
-                return {
-                    id: element.id,
-                    name: element.tags?.name || 'Medical Facility',
-                    type: element.tags?.amenity || facilityType,
-                    address: formatAddress(element.tags),
-                    lat: lat,
-                    lng: lon,
-                    phone: element.tags?.phone || 'Not available',
-                    website: element.tags?.website || '',
-                    opening_hours: element.tags?.opening_hours || 'Hours not specified',
-                    wheelchair: element.tags?.wheelchair || 'Unknown'
-                };
-            }).filter(facility => facility !== null);
-            
-            if (facilities.length > 0) {
-                displayFacilities(facilities);
-                updateFacilitiesList(facilities);
-                updateResultsInfo(facilities.length);
-            } else {
-                showNoResultsMessage();
-            }
+        if (!data.success) {
+            throw new Error(data.error || 'Map data lookup failed');
+        }
+        
+        const facilities = data.facilities || [];
+        if (facilities.length > 0) {
+            displayFacilities(facilities);
+            updateFacilitiesList(facilities);
+            updateResultsInfo(facilities.length);
         } else {
             showNoResultsMessage();
         }
     })
     .catch(error => {
-        console.error('Overpass API error:', error);
+        console.error('OpenStreetMap lookup error:', error);
         loadingSpinner.style.display = 'none';
         showErrorMessage('Failed to search for facilities. Please try again.');
     });
@@ -0,0 +1,56 @@
+"""Server-Sent Events helpers shared by the streaming endpoints."""
+import json
+import logging
+
+from flask import Response, stream_with_context
+
+
+def sse_event(data, event: str | None = None) -> str:
+    """Format one SSE frame with a JSON payload."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_response(events) -> Response:
+    """Wrap an iterator of pre-formatted SSE frames in a streaming response."""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx-style proxies from buffering the stream.
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def deferred(produce):
+    """Yield ``produce()`` as a single chunk, computed once streaming starts.
+
+    Used for non-streaming helpers so the response headers go out first.
+    """
+    yield produce()
+
+
+def stream_text(chunks, on_complete=None, **done_fields) -> Response:
+    """Stream text chunks as ``token`` events followed by a ``done`` event.
+
+    ``on_complete`` receives the full text once the stream has finished and
+    runs inside the request context, so it may use the database session.
+    Extra keyword arguments are included in the ``done`` payload.
+    """
+    def events():
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event({"token": chunk})
+            text = "".join(parts)
+            if on_complete is not None:
+                on_complete(text)
+            yield sse_event({"response": text, **done_fields}, event="done")
+        except Exception as e:
+            logging.error(f"Streaming response error: {e}")
+            yield sse_event({"error": "Streaming response interrupted"}, event="error")
+
+    return sse_response(events())
@@ -0,0 +1,148 @@
+"""Offline stand-in for the AI providers, for load tests and benchmarks.
+
+Enable it with ``AI_PROVIDERS=stub`` (or list it after the real providers,
+e.g. ``AI_PROVIDERS=groq,stub``). It never touches the network. Structured
+requests get synthetic JSON that validates against the requested pydantic
+schema; free-text requests get a short canned reply. Both depend only on the
+prompt, so repeated runs return identical bodies.
+
+Latency is log-normal around ``AI_STUB_LATENCY_MS`` with spread
+``AI_STUB_LATENCY_SIGMA``. ``AI_STUB_ERROR_RATE`` and ``AI_STUB_RATE_LIMIT_RATE``
+(0-1) inject 500 and 429 errors so the retry, breaker and fallback paths can be
+exercised. Latency and failures are drawn from one RNG seeded with
+``AI_STUB_SEED``, so a single-threaded run is fully reproducible.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+
+from pydantic import BaseModel
+
+
+STUB_LATENCY_MS = float(os.environ.get("AI_STUB_LATENCY_MS", 200))
+STUB_LATENCY_SIGMA = float(os.environ.get("AI_STUB_LATENCY_SIGMA", 0.5))
+STUB_ERROR_RATE = float(os.environ.get("AI_STUB_ERROR_RATE", 0))
+STUB_RATE_LIMIT_RATE = float(os.environ.get("AI_STUB_RATE_LIMIT_RATE", 0))
+STUB_RETRY_AFTER_SECONDS = float(os.environ.get("AI_STUB_RETRY_AFTER_SECONDS", 1))
+STUB_SEED = int(os.environ.get("AI_STUB_SEED", 0))
+
+_rng = random.Random(STUB_SEED)
+_rng_lock = threading.Lock()
+
+_WORDS = (
+    "community", "water", "health", "local", "support", "training", "crops",
+    "clinic", "season", "savings", "safety", "market", "rain", "nutrition",
+)
+# String fields the frontends switch on get values they recognise.
+_FIELD_CHOICES = {
+    "urgency_level": ("low", "medium", "high"),
+    "risk_level": ("low", "medium", "high"),
+    "icon": ("sunny", "cloudy", "rainy", "storm"),
+}
+_CHAT_REPLY = (
+    "Here is some practical guidance. Start with the resources available in your "
+    "community, keep a simple record of progress, and reach out to local health "
+    "workers, extension officers or mentors for support. Small steady steps work best."
+)
+
+
+class StubProviderError(Exception):
+    """Injected provider failure, shaped like the SDK errors we retry on."""
+
+    def __init__(self, status_code: int, retry_after: float | None = None):
+        super().__init__(f"Stub provider returned HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def reseed(seed: int = STUB_SEED):
+    """Reset the latency and failure sequence, e.g. between benchmark runs."""
+    with _rng_lock:
+        _rng.seed(seed)
+
+
+def _draw() -> tuple[float, StubProviderError | None]:
+    with _rng_lock:
+        latency = STUB_LATENCY_MS * math.exp(_rng.gauss(0, STUB_LATENCY_SIGMA)) / 1000
+        roll = _rng.random()
+    if roll < STUB_RATE_LIMIT_RATE:
+        return latency, StubProviderError(429, STUB_RETRY_AFTER_SECONDS)
+    if roll < STUB_RATE_LIMIT_RATE + STUB_ERROR_RATE:
+        return latency, StubProviderError(500)
+    return latency, None
+
+
+def _prompt_rng(system_prompt: str, user_prompt: str) -> random.Random:
+    digest = hashlib.sha256(f"{system_prompt}\0{user_prompt}".encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _synthesize(schema: dict, defs: dict, rng: random.Random, field: str = ""):
+    if "$ref" in schema:
+        return _synthesize(defs[schema["$ref"].split("/")[-1]], defs, rng, field)
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            name: _synthesize(prop, defs, rng, name)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        count = max(3, schema.get("minItems", 0))
+        count = min(count, schema.get("maxItems", count))
+        return [_synthesize(schema.get("items", {}), defs, rng, field) for _ in range(count)]
+    if kind == "integer":
+        return rng.randint(0, 100)
+    if kind == "number":
+        return round(rng.uniform(0, 100), 1)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if field in _FIELD_CHOICES:
+        return rng.choice(_FIELD_CHOICES[field])
+    words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 8)))
+    return f"{field.replace('_', ' ')}: {words}" if field else words
+
+
+def _respond(system_prompt: str, user_prompt: str,
+             response_schema: type[BaseModel] | None, json_mode: bool) -> str:
+    rng = _prompt_rng(system_prompt, user_prompt)
+    if response_schema is not None:
+        schema = response_schema.model_json_schema()
+        return json.dumps(_synthesize(schema, schema.get("$defs", {}), rng))
+    if json_mode:
+        return json.dumps({"response": _CHAT_REPLY})
+    return _CHAT_REPLY
+
+
+def generate(system_prompt: str, user_prompt: str,
+             response_schema: type[BaseModel] | None = None, json_mode: bool = False) -> str:
+    latency, error = _draw()
+    time.sleep(latency)
+    if error is not None:
+        raise error
+    return _respond(system_prompt, user_prompt, response_schema, json_mode)
+
+
+async def agenerate(system_prompt: str, user_prompt: str,
+                    response_schema: type[BaseModel] | None = None, json_mode: bool = False) -> str:
+    latency, error = _draw()
+    await asyncio.sleep(latency)
+    if error is not None:
+        raise error
+    return _respond(system_prompt, user_prompt, response_schema, json_mode)
+
+
+def stream(system_prompt: str, user_prompt: str):
+    """Yield the free-text reply word by word, spreading the latency across chunks."""
+    latency, error = _draw()
+    if error is not None:
+        time.sleep(latency)
+        raise error
+    words = _respond(system_prompt, user_prompt, None, False).split(" ")
+    for index, word in enumerate(words):
+        time.sleep(latency / len(words))
+        yield word if index == 0 else f" {word}"
@@ -0,0 +1,319 @@
+"""Bounded, shared caches that serve stale entries while refreshing them.
+
+An entry is fresh for ``fresh_ttl`` seconds after it was fetched. For the
+next ``stale_ttl`` seconds it is stale: callers still get it immediately,
+and one background refresh (one per key across all workers) replaces it.
+Only a missing entry makes the caller wait for the fetch, and concurrent
+misses for the same key share one fetch.
+
+Entries live in a pluggable backend chosen with ``SWR_CACHE_BACKEND``:
+
+* ``shared`` (default): the SQLite shared cache in ``instance/``, used by every
+  worker on the host.
+* ``redis``: a Redis-compatible server at ``REDIS_URL``, shared across hosts.
+  Requires the optional ``redis`` package.
+* ``memory``: an in-process LRU. It is not shared between workers, and it is
+  the local stand-in for tests and single-process development.
+
+Every backend evicts the least recently used entries beyond ``max_entries``.
+Requests per key are counted so ``prewarm.py`` can keep popular keys fresh.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+import metrics
+from cache_store import shared_cache
+from coalesce import get_group
+
+
+REFRESH_LEASE_SECONDS = 60
+_caches: dict[str, "SWRCache"] = {}
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, namespace: str, max_entries: int):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._leases: dict[str, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        with self._lock:
+            held = self._leases.get(name)
+            if held and held[1] > time.time() and held[0] != owner:
+                return False
+            self._leases[name] = (owner, time.time() + ttl)
+            return True
+
+    def release_lease(self, name: str, owner: str):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SharedCacheBackend:
+    """Entries in one namespace of the SQLite shared cache."""
+
+    def __init__(self, namespace: str, max_entries: int):
+        self.namespace = namespace
+        self.max_entries = max_entries
+
+    def get(self, key: str):
+        return shared_cache.get(self.namespace, key, record=False)
+
+    def set(self, key: str, value, ttl: float):
+        shared_cache.set(self.namespace, key, value, ttl, max_entries=self.max_entries)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return shared_cache.acquire_lease(name, owner, ttl)
+
+    def release_lease(self, name: str, owner: str):
+        shared_cache.release_lease(name, owner)
+
+    def size(self) -> int:
+        return shared_cache.stats().get(self.namespace, {}).get("entries", 0)
+
+
+class RedisBackend:
+    """Entries in a Redis-compatible server, with a sorted set for LRU order.
+
+    Like the shared cache, Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, url: str | None = None):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("SWR_CACHE_BACKEND=redis requires the redis package") from exc
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._client = redis.Redis.from_url(url or os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+        self._errors = redis.RedisError
+        self._lru = f"{namespace}:lru"
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str):
+        try:
+            raw = self._client.get(self._key(key))
+            if raw is None:
+                return None
+            self._client.zadd(self._lru, {key: time.time()})
+            return json.loads(raw)
+        except (self._errors, ValueError) as exc:
+            logging.warning("Redis cache read failed for %s: %s", self.namespace, exc)
+            return None
+
+    def set(self, key: str, value, ttl: float):
+        try:
+            pipe = self._client.pipeline()
+            pipe.set(self._key(key), json.dumps(value, default=str), px=int(ttl * 1000))
+            pipe.zadd(self._lru, {key: time.time()})
+            pipe.zcard(self._lru)
+            overflow = pipe.execute()[-1] - self.max_entries
+            if overflow > 0:
+                evicted = [member.decode() for member, _ in self._client.zpopmin(self._lru, overflow)]
+                self._client.delete(*(self._key(member) for member in evicted))
+        except (self._errors, TypeError, ValueError) as exc:
+            logging.warning("Redis cache write failed for %s: %s", self.namespace, exc)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        try:
+            return bool(self._client.set(f"lease:{name}", owner, nx=True, px=int(ttl * 1000)))
+        except self._errors as exc:
+            logging.warning("Redis lease acquire failed for %s: %s", name, exc)
+            return True
+
+    def release_lease(self, name: str, owner: str):
+        try:
+            if self._client.get(f"lease:{name}") == owner.encode():
+                self._client.delete(f"lease:{name}")
+        except self._errors as exc:
+            logging.warning("Redis lease release failed for %s: %s", name, exc)
+
+    def size(self) -> int:
+        try:
+            return self._client.zcard(self._lru)
+        except self._errors:
+            return 0
+
+
+BACKENDS = {"memory": MemoryBackend, "shared": SharedCacheBackend, "redis": RedisBackend}
+
+
+def make_backend(namespace: str, max_entries: int, kind: str | None = None):
+    kind = kind or os.environ.get("SWR_CACHE_BACKEND", "shared")
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown SWR_CACHE_BACKEND {kind!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[kind](namespace, max_entries)
+
+
+class SWRCache:
+    """Stale-while-revalidate cache over one backend namespace."""
+
+    def __init__(self, name: str, fresh_ttl: float, stale_ttl: float, max_entries: int, backend=None,
+                 on_store=None):
+        """``on_store(key, value)`` is called after every value fetched into the cache."""
+        self.name = name
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.on_store = on_store
+        self.backend = backend or make_backend(f"swr_{name}", max_entries)
+        self._counts = {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "unchanged": 0, "refresh_errors": 0}
+        self._demand = Counter()
+        self._demand_lock = threading.Lock()
+        _caches[name] = self
+
+    def _count(self, outcome: str):
+        self._counts[outcome] += 1
+
+    def _store(self, key: str, value, notify: bool = True):
+        self.backend.set(key, {"fetched_at": time.time(), "value": value}, self.fresh_ttl + self.stale_ttl)
+        if notify and self.on_store is not None:
+            try:
+                self.on_store(key, value)
+            except Exception as exc:
+                logging.warning("on_store hook of %s failed for %r: %s", self.name, key, exc)
+
+    async def aget(self, key: str, fetch, cacheable=None):
+        """Return the cached value for ``key``, calling ``await fetch()`` on a miss.
+
+        ``cacheable(value)`` can reject results that should not be stored,
+        such as fallbacks returned while the provider is down. A rejected
+        refresh keeps serving the stale entry.
+        """
+        self.record_demand(key)
+        entry = self.backend.get(key)
+        if entry is not None:
+            if time.time() - entry["fetched_at"] < self.fresh_ttl:
+                self._count("hits")
+                metrics.record_cache_lookup(self.name, True)
+            else:
+                self._count("stale")
+                metrics.record_cache_lookup(self.name, True, stale=True)
+                self._refresh_in_background(key, fetch, cacheable)
+            return entry["value"]
+
+        self._count("misses")
+        metrics.record_cache_lookup(self.name, False)
+
+        async def fetch_and_store():
+            # Another worker may have stored it while we waited on its lease.
+            entry = self.backend.get(key)
+            if entry is not None:
+                return entry["value"]
+            value = await fetch()
+            if cacheable is None or cacheable(value):
+                self._store(key, value)
+            return value
+
+        return await get_group(f"swr_{self.name}").do_async(key, fetch_and_store, shared=True)
+
+    def peek(self, key: str):
+        """The cached value for ``key``, fresh or stale, without counting or fetching."""
+        entry = self.backend.get(key)
+        return None if entry is None else entry["value"]
+
+    def record_demand(self, key: str):
+        """Count one request for ``key``. ``aget`` counts its own calls."""
+        with self._demand_lock:
+            self._demand[key] += 1
+
+    def age(self, key: str) -> float | None:
+        """Seconds since ``key`` was fetched, or ``None`` when it is not cached."""
+        entry = self.backend.get(key)
+        return None if entry is None else time.time() - entry["fetched_at"]
+
+    def take_demand(self) -> Counter:
+        """Requests per key in this worker since the last call."""
+        with self._demand_lock:
+            demand, self._demand = self._demand, Counter()
+        return demand
+
+    def _refresh_lease(self, key: str) -> tuple[str, str]:
+        return f"swr_{self.name}:refresh:{key}", f"{os.getpid()}:{uuid.uuid4().hex}"
+
+    async def _refresh(self, key: str, fetch, cacheable, lease: str, owner: str) -> bool:
+        # Refreshes run on the AI loop; backend calls (and on_store) block, so they run in threads.
+        try:
+            previous = await asyncio.to_thread(self.backend.get, key)
+            value = await fetch()
+            if cacheable is None or cacheable(value):
+                if previous is not None and previous["value"] == value:
+                    # Still current: restart its fresh period without telling anyone.
+                    await asyncio.to_thread(self._store, key, value, notify=False)
+                    self._count("unchanged")
+                    return False
+                await asyncio.to_thread(self._store, key, value)
+                self._count("refreshes")
+                return True
+            self._count("refresh_errors")
+        except Exception as exc:
+            self._count("refresh_errors")
+            logging.warning("Background refresh of %s %r failed: %s", self.name, key, exc)
+        finally:
+            await asyncio.to_thread(self.backend.release_lease, lease, owner)
+        return False
+
+    async def refresh(self, key: str, fetch, cacheable=None) -> bool:
+        """Fetch and store ``key`` now, unless a refresh of it is already running.
+
+        Returns whether a value different from the cached one was stored.
+        """
+        lease, owner = self._refresh_lease(key)
+        if not await asyncio.to_thread(self.backend.acquire_lease, lease, owner, REFRESH_LEASE_SECONDS):
+            return False
+        return await self._refresh(key, fetch, cacheable, lease, owner)
+
+    def _refresh_in_background(self, key: str, fetch, cacheable):
+        from gemini_async import run_in_background
+
+        lease, owner = self._refresh_lease(key)
+        if not self.backend.acquire_lease(lease, owner, REFRESH_LEASE_SECONDS):
+            return
+        try:
+            run_in_background(self._refresh(key, fetch, cacheable, lease, owner))
+        except Exception:
+            self.backend.release_lease(lease, owner)
+            raise
+
+    def stats(self) -> dict:
+        return {
+            **self._counts,
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "max_entries": self.backend.max_entries,
+        }
+
+
+def get_swr_stats() -> dict:
+    """Per-worker counters, backend and size of every stale-while-revalidate cache."""
+    return {name: cache.stats() for name, cache in _caches.items()}